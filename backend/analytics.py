@@ -0,0 +1,250 @@
+"""
+backend/analytics.py
+--------------------
+Task flow analytics over TaskHistory.
+New history rows are folded incrementally (from a watermark on task_history.id) into the
+task_flow_daily rollup, one row per quest log, task owner and UTC day. Cycle time, lead time,
+throughput and WIP are then answered from the rollup alone, so dashboards never rescan history.
+The refresh is driven by the scheduler through backend/rollups.py, which also owns the other
+daily rollups read here.
+
+Definitions:
+  - started:   a task enters Doing/Waiting from a non-active state.
+  - completed: a task reaches Done.
+  - cycle time: start -> Done.  lead time: Created (or reopened To-Do) -> Done.
+  - WIP:       tasks started but not yet Done; the running sum of wip_delta.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from .models import Task, TaskHistory, TaskFlowDaily, RollupWatermark, UserXPDaily, QLActivityDaily, StoryDaily
+from . import logging_config
+
+TASK_FLOW_WATERMARK = "task_flow_daily"
+ACTIVE_STATUSES = {"Doing", "Waiting"}
+REQUEST_STATUSES = {"Created", "To-Do"}
+
+FlowKey = Tuple[int, Optional[int], date]
+
+def _new_bucket() -> Dict[str, float]:
+    return {"created": 0, "started": 0, "completed": 0, "wip_delta": 0, "cycle_seconds": 0.0, "lead_seconds": 0.0}
+
+def get_watermark(db: Session, name: str) -> int:
+    mark = db.query(RollupWatermark).filter(RollupWatermark.name == name).first()
+    if mark is None:
+        db.add(RollupWatermark(name=name, last_id=0))
+        db.flush()
+        return 0
+    return mark.last_id
+
+def advance_watermark(db: Session, name: str, old_id: int, new_id: int) -> bool:
+    """Compare-and-set the watermark; False means another refresher got there first."""
+    result = db.execute(
+        update(RollupWatermark)
+        .where(RollupWatermark.name == name, RollupWatermark.last_id == old_id)
+        .values(last_id=new_id, updated_at=datetime.utcnow())
+    )
+    return result.rowcount == 1
+
+def fold_task_history(rows: Iterable[tuple], watermark: int) -> Dict[FlowKey, Dict[str, float]]:
+    """
+    Single pass over (history_id, task_id, status, timestamp, quest_log_id, owner_id) rows,
+    ordered by task_id then history_id. Rows at or below the watermark only rebuild the task's
+    state; rows above it emit deltas into per-day buckets.
+    """
+    buckets: Dict[FlowKey, Dict[str, float]] = defaultdict(_new_bucket)
+    current_task = None
+    requested_at = started_at = None
+    active = False
+    for history_id, task_id, status, timestamp, quest_log_id, owner_id in rows:
+        if task_id != current_task:
+            current_task = task_id
+            requested_at = started_at = None
+            active = False
+        emit = history_id > watermark
+        bucket = buckets[(quest_log_id, owner_id, timestamp.date())] if emit else None
+        if status in REQUEST_STATUSES:
+            requested_at, started_at, active = timestamp, None, False
+            if emit and status == "Created":
+                bucket["created"] += 1
+        elif status in ACTIVE_STATUSES:
+            if not active:
+                active, started_at = True, timestamp
+                if emit:
+                    bucket["started"] += 1
+                    bucket["wip_delta"] += 1
+        elif status == "Done":
+            if emit:
+                bucket["completed"] += 1
+                if active:
+                    bucket["wip_delta"] -= 1
+                    bucket["cycle_seconds"] += (timestamp - started_at).total_seconds()
+                origin = requested_at or started_at
+                if origin is not None:
+                    bucket["lead_seconds"] += (timestamp - origin).total_seconds()
+            active = False
+    return {key: value for key, value in buckets.items() if any(value.values())}
+
+def _merge_buckets(db: Session, buckets: Dict[FlowKey, Dict[str, float]]):
+    if not buckets:
+        return
+    quest_log_ids = {key[0] for key in buckets}
+    days = {key[2] for key in buckets}
+    existing = {
+        (row.quest_log_id, row.user_id, row.day): row
+        for row in db.query(TaskFlowDaily).filter(
+            TaskFlowDaily.quest_log_id.in_(quest_log_ids), TaskFlowDaily.day.in_(days)
+        )
+    }
+    for key, delta in buckets.items():
+        row = existing.get(key)
+        if row is None:
+            row = TaskFlowDaily(quest_log_id=key[0], user_id=key[1], day=key[2], **_new_bucket())
+            db.add(row)
+        for column, value in delta.items():
+            setattr(row, column, getattr(row, column) + value)
+
+def refresh_task_flow(db: Session, batch_size: int = 5000) -> int:
+    """
+    Fold task_history rows newer than the watermark into task_flow_daily.
+    task_history uses AUTOINCREMENT, so rows added after the newest ones were deleted (task
+    purges, retention) still get ids above the watermark.
+    Each batch re-reads the full history of only the tasks it touches, so a refresh costs
+    O(new rows) rather than O(table). Returns the number of history rows folded.
+    """
+    folded = 0
+    while True:
+        watermark = get_watermark(db, TASK_FLOW_WATERMARK)
+        batch = db.query(TaskHistory.id, TaskHistory.task_id)\
+            .filter(TaskHistory.id > watermark)\
+            .order_by(TaskHistory.id.asc()).limit(batch_size).all()
+        if not batch:
+            db.commit()
+            return folded
+        high_id = batch[-1].id
+        task_ids = {row.task_id for row in batch}
+        rows = db.query(
+            TaskHistory.id, TaskHistory.task_id, TaskHistory.status, TaskHistory.timestamp,
+            Task.quest_log_id, Task.owner_id
+        ).join(Task, Task.id == TaskHistory.task_id)\
+            .filter(TaskHistory.task_id.in_(task_ids), TaskHistory.id <= high_id)\
+            .order_by(TaskHistory.task_id.asc(), TaskHistory.id.asc()).all()
+        _merge_buckets(db, fold_task_history(rows, watermark))
+        if not advance_watermark(db, TASK_FLOW_WATERMARK, watermark, high_id):
+            db.rollback()
+            logging_config.backend_logger.debug("Task flow rollup advanced concurrently; retrying.")
+            continue
+        db.commit()
+        folded += len(batch)
+        logging_config.backend_logger.debug(f"Folded {len(batch)} task_history rows into task_flow_daily (up to id {high_id}).")
+
+def _flow_query(db: Session, quest_log_id: Optional[int], user_id: Optional[int]):
+    query = db.query(
+        TaskFlowDaily.day,
+        func.sum(TaskFlowDaily.created).label("created"),
+        func.sum(TaskFlowDaily.started).label("started"),
+        func.sum(TaskFlowDaily.completed).label("completed"),
+        func.sum(TaskFlowDaily.wip_delta).label("wip_delta"),
+        func.sum(TaskFlowDaily.cycle_seconds).label("cycle_seconds"),
+        func.sum(TaskFlowDaily.lead_seconds).label("lead_seconds"),
+    )
+    if quest_log_id is not None:
+        query = query.filter(TaskFlowDaily.quest_log_id == quest_log_id)
+    if user_id is not None:
+        query = query.filter(TaskFlowDaily.user_id == user_id)
+    return query
+
+def _hours(seconds: float, count: int) -> Optional[float]:
+    return round(seconds / count / 3600, 2) if count else None
+
+def daily_flow(db: Session, start: date, end: date, quest_log_id: Optional[int] = None,
+               user_id: Optional[int] = None) -> List[dict]:
+    """Per-day created/started/completed counts, average cycle/lead hours and end-of-day WIP."""
+    opening = _flow_query(db, quest_log_id, user_id).filter(TaskFlowDaily.day < start).with_entities(
+        func.coalesce(func.sum(TaskFlowDaily.wip_delta), 0)
+    ).scalar()
+    rows = {
+        row.day: row for row in _flow_query(db, quest_log_id, user_id)
+        .filter(TaskFlowDaily.day >= start, TaskFlowDaily.day <= end)
+        .group_by(TaskFlowDaily.day).all()
+    }
+    series = []
+    wip = opening or 0
+    day = start
+    while day <= end:
+        row = rows.get(day)
+        completed = row.completed if row else 0
+        wip += row.wip_delta if row else 0
+        series.append({
+            "day": day.isoformat(),
+            "created": row.created if row else 0,
+            "started": row.started if row else 0,
+            "completed": completed,
+            "wip": wip,
+            "avg_cycle_hours": _hours(row.cycle_seconds, completed) if row else None,
+            "avg_lead_hours": _hours(row.lead_seconds, completed) if row else None,
+        })
+        day += timedelta(days=1)
+    return series
+
+def throughput(series: List[dict], period: str = "day") -> List[dict]:
+    """Completed tasks per day, or per ISO week (keyed by the Monday) when period == 'week'."""
+    if period == "day":
+        return [{"period": point["day"], "completed": point["completed"]} for point in series]
+    weeks: Dict[str, int] = {}
+    for point in series:
+        day = date.fromisoformat(point["day"])
+        week_start = (day - timedelta(days=day.weekday())).isoformat()
+        weeks[week_start] = weeks.get(week_start, 0) + point["completed"]
+    return [{"period": week, "completed": count} for week, count in weeks.items()]
+
+def flow_summary(db: Session, quest_log_id: Optional[int] = None, user_id: Optional[int] = None) -> dict:
+    """All-time totals with average cycle/lead time and current WIP."""
+    row = _flow_query(db, quest_log_id, user_id).one()
+    completed = row.completed or 0
+    return {
+        "created": row.created or 0,
+        "started": row.started or 0,
+        "completed": completed,
+        "wip": row.wip_delta or 0,
+        "avg_cycle_hours": _hours(row.cycle_seconds or 0.0, completed),
+        "avg_lead_hours": _hours(row.lead_seconds or 0.0, completed),
+    }
+
+def daily_xp(db: Session, start: date, end: date, user_id: int) -> List[dict]:
+    """XP, currency and completions earned by a user per day (days without awards omitted)."""
+    rows = db.query(UserXPDaily).filter(
+        UserXPDaily.user_id == user_id, UserXPDaily.day >= start, UserXPDaily.day <= end
+    ).order_by(UserXPDaily.day.asc()).all()
+    return [
+        {"day": row.day.isoformat(), "completions": row.completions, "xp": row.xp, "currency": row.currency}
+        for row in rows
+    ]
+
+def daily_activity(db: Session, start: date, end: date, quest_log_id: int) -> List[dict]:
+    """Activity counts per day and action for a quest log."""
+    rows = db.query(QLActivityDaily).filter(
+        QLActivityDaily.quest_log_id == quest_log_id, QLActivityDaily.day >= start, QLActivityDaily.day <= end
+    ).order_by(QLActivityDaily.day.asc(), QLActivityDaily.action.asc()).all()
+    return [{"day": row.day.isoformat(), "action": row.action, "count": row.count} for row in rows]
+
+def daily_stories(db: Session, start: date, end: date, quest_log_id: Optional[int] = None,
+                  user_id: Optional[int] = None) -> List[dict]:
+    """Stories generated (and their XP/currency) per day."""
+    query = db.query(
+        StoryDaily.day,
+        func.sum(StoryDaily.stories).label("stories"),
+        func.sum(StoryDaily.xp).label("xp"),
+        func.sum(StoryDaily.currency).label("currency"),
+    ).filter(StoryDaily.day >= start, StoryDaily.day <= end)
+    if quest_log_id is not None:
+        query = query.filter(StoryDaily.quest_log_id == quest_log_id)
+    if user_id is not None:
+        query = query.filter(StoryDaily.user_id == user_id)
+    rows = query.group_by(StoryDaily.day).order_by(StoryDaily.day.asc()).all()
+    return [{"day": row.day.isoformat(), "stories": row.stories, "xp": row.xp, "currency": row.currency} for row in rows]
@@ -0,0 +1,103 @@
+"""
+backend/cache.py
+----------------
+Small in-process caches for hot, rarely changing query results.
+TTLCache keeps up to `max_entries` values for at most `ttl_seconds`, evicting the least
+recently used entry when full; lookups are counted in the cache metrics (hit/miss).
+Writers invalidate the entries they change, and the TTL bounds how stale an entry can get
+when the data is changed outside the API (scripts, another process).
+In a multi-worker deployment, backend/cluster.py installs `channel`: invalidations are then
+published to the other workers, and every cache lookup first applies the ones they published
+(at most every TASKFABLE_INVALIDATION_POLL_SECONDS).
+
+Caches:
+  - roster_cache: the participant roster of each quest log (GET /questlogs/{id}/participants),
+    invalidated whenever a membership of that quest log is added, changed or removed.
+  - webhook_cache: the webhook subscriptions of each quest log, read on every event the
+    routers emit (backend/webhooks.py); invalidated when a subscription is added or removed.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from . import metrics
+
+ROSTER_CACHE_SECONDS = float(os.getenv("TASKFABLE_ROSTER_CACHE_SECONDS", "300"))
+ROSTER_CACHE_SIZE = int(os.getenv("TASKFABLE_ROSTER_CACHE_SIZE", "1024"))
+WEBHOOK_CACHE_SECONDS = float(os.getenv("TASKFABLE_WEBHOOK_CACHE_SECONDS", "60"))
+
+MISSING = object()
+
+# Every cache by name, for invalidations received from other workers.
+CACHES = {}
+
+# The cross-worker invalidation channel (backend/cluster.py), or None in a single process.
+channel = None
+
+class TTLCache:
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024):
+        CACHES[name] = self
+        self.name = name
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        # key -> (expires at, value), least recently used first.
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """The cached value for `key`, or MISSING."""
+        if channel is not None:
+            channel.receive()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                value = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                value = MISSING
+        metrics.record_cache(self.name, value is not MISSING)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+roster_cache = TTLCache("roster", ROSTER_CACHE_SECONDS, ROSTER_CACHE_SIZE)
+
+def roster_key(db, quest_log_id: int) -> tuple:
+    """Keyed by database as well, since tools such as the benchmark run a second database in-process."""
+    return (str(db.get_bind().url), quest_log_id)
+
+def invalidate(cache: TTLCache, db, quest_log_id: int):
+    """Drop a quest log's entry from `cache`, in this worker and (through the channel) all the others."""
+    key = roster_key(db, quest_log_id)
+    cache.invalidate(key)
+    if channel is not None:
+        channel.publish(db, cache.name, key)
+
+def invalidate_roster(db, quest_log_id: int):
+    invalidate(roster_cache, db, quest_log_id)
+
+webhook_cache = TTLCache("webhooks", WEBHOOK_CACHE_SECONDS, ROSTER_CACHE_SIZE)
+
+def invalidate_webhooks(db, quest_log_id: int):
+    invalidate(webhook_cache, db, quest_log_id)
@@ -0,0 +1,205 @@
+"""
+backend/cluster.py
+------------------
+Multi-worker deployment on one host.
+`python -m backend.cluster` serves the API with TASKFABLE_WORKERS uvicorn worker processes
+(default: one per core), without reload. The workers share only the database, which also
+carries what they must agree on:
+  - Leader election: every worker runs the scheduler loop (backend/scheduler.py) in a
+    background thread, but only the holder of the "scheduler" lease runs its jobs. The lease
+    is a row in `leases` that the leader renews every tick, before each job and, from a
+    heartbeat thread, every third of LEASE_SECONDS while a job runs, so a job longer than the
+    lease (a VACUUM, a rollup backlog) keeps it. If the leader dies, its lease expires after
+    LEASE_SECONDS (TASKFABLE_LEASE_SECONDS) and the next worker to try takes over.
+    A standalone `python -m backend.scheduler` takes part in the same election, so running
+    one next to the workers never runs a job twice.
+  - Cache invalidation: the caches in backend/cache.py live in each process. Every
+    invalidation is also written to `cache_invalidations`, and before a cache lookup each
+    worker applies the rows written since its last look (at most every
+    INVALIDATION_POLL_SECONDS). A change made through one worker thus shows in the others
+    within that time rather than the cache TTL. The leader prunes rows older than
+    INVALIDATION_RETENTION_SECONDS, which must stay longer than any cache TTL.
+The development server (python -m backend.main) remains a single reloading process.
+
+Usage (from the project root):
+    TASKFABLE_WORKERS=4 python -m backend.cluster --port 8000
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session
+
+from . import cache, logging_config
+from .db import engine
+from .models import CacheInvalidation, Lease, ensure_schema
+
+# Set (by main() below) in the environment of the worker processes.
+ENABLED = os.getenv("TASKFABLE_CLUSTER") == "1"
+WORKERS = int(os.getenv("TASKFABLE_WORKERS", str(os.cpu_count() or 1)))
+LEASE_SECONDS = int(os.getenv("TASKFABLE_LEASE_SECONDS", "30"))
+INVALIDATION_POLL_SECONDS = float(os.getenv("TASKFABLE_INVALIDATION_POLL_SECONDS", "1"))
+INVALIDATION_RETENTION_SECONDS = 3600
+
+class Leader:
+    """Election through a named lease: acquire() takes or renews it, and says whether we hold it."""
+
+    def __init__(self, name: str = "scheduler", bind=None, lease_seconds: int = LEASE_SECONDS):
+        self.name = name
+        self.bind = bind or engine
+        self.lease_seconds = lease_seconds
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+    def acquire(self, now: Optional[datetime] = None) -> bool:
+        now = now or datetime.utcnow()
+        values = {"holder": self.holder, "expires_at": now + timedelta(seconds=self.lease_seconds)}
+        try:
+            with self.bind.begin() as conn:
+                # Renew our lease or take over an expired one; else create it if nobody has yet.
+                held = conn.execute(
+                    update(Lease)
+                    .where(Lease.name == self.name, or_(Lease.holder == self.holder, Lease.expires_at < now))
+                    .values(**values)
+                ).rowcount == 1
+                if not held:
+                    conn.execute(insert(Lease).values(name=self.name, **values))
+                    held = True
+        except IntegrityError:
+            held = False  # Held by another process.
+        except OperationalError as e:
+            # E.g. the database stayed locked: step down rather than risk two leaders.
+            logging_config.backend_logger.warning(f"Could not renew the '{self.name}' lease: {e}")
+            held = False
+        if held != self.is_leader:
+            logging_config.backend_logger.info(
+                f"{self.holder} {'became' if held else 'is no longer'} the '{self.name}' leader."
+            )
+        self.is_leader = held
+        return held
+
+    @contextmanager
+    def heartbeat(self, interval: Optional[float] = None):
+        """Keep renewing the lease while the block runs."""
+        stop = threading.Event()
+        interval = interval or self.lease_seconds / 3
+
+        def beat():
+            while not stop.wait(interval):
+                # A failed renewal is logged by acquire(); while a job holds the database's write
+                # lock, no other process can take the lease over either.
+                self.acquire()
+
+        thread = threading.Thread(target=beat, name=f"{self.name}-lease", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self):
+        """Give the lease up (on shutdown), so another process can take over at once."""
+        with self.bind.begin() as conn:
+            conn.execute(delete(Lease).where(Lease.name == self.name, Lease.holder == self.holder))
+        self.is_leader = False
+
+class InvalidationChannel:
+    """Cache invalidations shared through the cache_invalidations table (installed as cache.channel)."""
+
+    def __init__(self, bind=None, poll_seconds: float = INVALIDATION_POLL_SECONDS):
+        self.bind = bind or engine
+        self.url = str(self.bind.url)
+        self.poll_seconds = poll_seconds
+        self._lock = threading.Lock()
+        self._next_poll = 0.0
+        with self.bind.connect() as conn:
+            self.last_id = conn.scalar(select(func.max(CacheInvalidation.id))) or 0
+
+    def publish(self, db: Session, cache_name: str, key: tuple):
+        if key[0] != self.url:
+            return  # A key of another database (e.g. the benchmark's): not shared.
+        db.execute(insert(CacheInvalidation).values(cache=cache_name, key=json.dumps(list(key))))
+        db.commit()
+
+    def receive(self, force: bool = False) -> int:
+        """Apply the invalidations published since the last call. Returns how many were read."""
+        now = time.monotonic()
+        if not force and now < self._next_poll:
+            return 0
+        if not self._lock.acquire(blocking=False):
+            return 0  # Another thread is reading them right now.
+        try:
+            self._next_poll = now + self.poll_seconds
+            with self.bind.connect() as conn:
+                rows = conn.execute(
+                    select(CacheInvalidation.id, CacheInvalidation.cache, CacheInvalidation.key)
+                    .where(CacheInvalidation.id > self.last_id)
+                    .order_by(CacheInvalidation.id)
+                ).all()
+            for _, name, key in rows:
+                target = cache.CACHES.get(name)
+                if target is not None:
+                    target.invalidate(tuple(json.loads(key)))
+            if rows:
+                self.last_id = rows[-1].id
+            return len(rows)
+        finally:
+            self._lock.release()
+
+def prune_invalidations(db: Session, now: Optional[datetime] = None,
+                        retention_seconds: int = INVALIDATION_RETENTION_SECONDS) -> int:
+    cutoff = (now or datetime.utcnow()) - timedelta(seconds=retention_seconds)
+    deleted = db.execute(delete(CacheInvalidation).where(CacheInvalidation.created_at < cutoff)).rowcount
+    db.commit()
+    return deleted
+
+# -------------------------------
+# Worker lifecycle (called from the app's lifespan)
+# -------------------------------
+_stop = threading.Event()
+_scheduler_thread: Optional[threading.Thread] = None
+
+def start_worker():
+    """Share cache invalidations with the other workers, and stand for the scheduler's election."""
+    global _scheduler_thread
+    from . import scheduler  # scheduler.py imports Leader from here.
+    cache.channel = InvalidationChannel()
+    _stop.clear()
+    _scheduler_thread = threading.Thread(
+        target=scheduler.schedule_tasks, kwargs={"stop": _stop}, name="scheduler", daemon=True
+    )
+    _scheduler_thread.start()
+    logging_config.backend_logger.info(f"Cluster worker {os.getpid()} started.")
+
+def stop_worker():
+    """Stop the scheduler loop, which gives up the lease if it holds it."""
+    _stop.set()
+    if _scheduler_thread is not None:
+        _scheduler_thread.join(timeout=30)
+    cache.channel = None
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Serve TaskFable with several worker processes.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    # Once, here, rather than racing in every worker's startup.
+    ensure_schema(engine)
+    os.environ["TASKFABLE_CLUSTER"] = "1"
+    uvicorn.run("backend.main:app", host=args.host, port=args.port, workers=args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+backend/compression.py
+----------------------
+Response compression for the API.
+CompressionMiddleware is Starlette's GZipMiddleware with a brotli responder in front of it:
+clients that accept "br" get brotli when the `brotli` package is installed, everyone else
+gets gzip. Responses smaller than COMPRESS_MIN_SIZE are sent as-is, as are responses that
+already have a Content-Encoding (e.g. the precompressed bodies of backend/content_cache.py)
+and Server-Sent Event streams.
+"""
+
+import os
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import brotli
+    from starlette.middleware.gzip import IdentityResponder
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this many bytes are not compressed.
+COMPRESS_MIN_SIZE = int(os.getenv("TASKFABLE_COMPRESS_MIN_SIZE", "1024"))
+# Dynamic responses favour speed over ratio.
+GZIP_LEVEL = int(os.getenv("TASKFABLE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("TASKFABLE_BROTLI_QUALITY", "4"))
+
+if brotli is not None:
+    class BrotliResponder(IdentityResponder):
+        content_encoding = "br"
+
+        def __init__(self, app, minimum_size, quality=BROTLI_QUALITY, **kwargs):
+            super().__init__(app, minimum_size, **kwargs)
+            self.compressor = brotli.Compressor(quality=quality)
+
+        async def apply_compression(self, body, *, more_body):
+            if more_body:
+                return self.compressor.process(body) + self.compressor.flush()
+            return self.compressor.process(body) + self.compressor.finish()
+
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE, compresslevel: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if brotli is not None and scope["type"] == "http" and accepts_brotli(Headers(scope=scope)):
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality,
+                                        exclude_content_types=self.exclude_content_types)
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+def accepts_brotli(headers) -> bool:
+    for part in headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() == "br":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
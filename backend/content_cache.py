@@ -0,0 +1,138 @@
+"""
+backend/content_cache.py
+------------------------
+In-memory cache for files served as-is (CHANGELOG.md, the generated test reports).
+An entry is keyed by path and variant (e.g. the changelog as JSON or as rendered HTML) and
+is valid as long as the file's mtime and size are unchanged, so a repeated view costs one
+stat() instead of a read (and, for JSON or markdown, a parse). Each entry keeps its body
+precompressed with gzip, and brotli when the `brotli` package is installed.
+Responses carry a content-hash ETag and Last-Modified; conditional requests that match get
+an empty 304.
+"""
+
+import os
+import gzip
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from fastapi import Request, Response
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are not worth compressing.
+MIN_COMPRESS_SIZE = 512
+
+@dataclass
+class CachedFile:
+    mtime_ns: int
+    size: int
+    media_type: str
+    etag: str
+    last_modified: str
+    # Content-Encoding ("identity", "gzip", "br") -> body.
+    bodies: Dict[str, bytes] = field(default_factory=dict)
+
+def _compress(body: bytes) -> Dict[str, bytes]:
+    bodies = {"identity": body}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return bodies
+    compressed = gzip.compress(body, compresslevel=9, mtime=0)
+    if len(compressed) < len(body):
+        bodies["gzip"] = compressed
+    if brotli is not None:
+        compressed = brotli.compress(body)
+        if len(compressed) < len(body):
+            bodies["br"] = compressed
+    return bodies
+
+class ContentCache:
+    def __init__(self, name: str = "content"):
+        self.name = name
+        self._entries: Dict[tuple, CachedFile] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, media_type: str, render: Optional[Callable[[bytes], bytes]] = None,
+            variant: str = "raw") -> CachedFile:
+        """
+        The cached entry for `path`, re-read (and passed through `render`) if the file changed.
+        Raises FileNotFoundError if the file does not exist.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), variant)
+        entry = self._entries.get(key)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            metrics.record_cache(self.name, True)
+            return entry
+        metrics.record_cache(self.name, False)
+        with open(path, "rb") as f:
+            raw = f.read()
+        body = render(raw) if render else raw
+        entry = CachedFile(
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            media_type=media_type,
+            etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"',
+            last_modified=formatdate(stat.st_mtime, usegmt=True),
+            bodies=_compress(body),
+        )
+        with self._lock:
+            self._entries[key] = entry
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _not_modified(request: Request, entry: CachedFile) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or entry.etag in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(entry.mtime_ns // 1_000_000_000) <= since
+    return False
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.partition(";")
+        name, _, quality = params.strip().partition("=")
+        try:
+            if name.strip() == "q" and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+def cached_response(request: Request, entry: CachedFile) -> Response:
+    """A 304 if the client's copy is current, otherwise the best precompressed body it accepts."""
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    accepted = _accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if encoding in entry.bodies and encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return Response(entry.bodies[encoding], media_type=entry.media_type, headers=headers)
+    return Response(entry.bodies["identity"], media_type=entry.media_type, headers=headers)
+
+content_cache = ContentCache()
@@ -1,11 +1,36 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 # Get the absolute directory of this file.
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-# Construct the full path to the database file.
-SQLALCHEMY_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'gamified_tasks.db')}"  
+# Construct the full path to the database file; TASKFABLE_DATABASE_URL overrides it
+# (the test suite points each worker at its own database this way).
+DEFAULT_DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'gamified_tasks.db')}"
+SQLALCHEMY_DATABASE_URL = os.getenv("TASKFABLE_DATABASE_URL", DEFAULT_DATABASE_URL)
+# SQLite runs in write-ahead-log mode, so long reads (exports, analytics) and writes don't
+# block each other. Set TASKFABLE_SQLITE_WAL=0 where WAL can't work (e.g. network filesystems).
+SQLITE_WAL = os.getenv("TASKFABLE_SQLITE_WAL", "1") != "0"
+
+connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite") and SQLITE_WAL:
+    @event.listens_for(engine, "connect")
+    def set_sqlite_wal(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def get_db():
+    """
+    Request-scoped session, shared by every router. Override it with
+    app.dependency_overrides[get_db] to point the whole API at another database.
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
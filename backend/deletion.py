@@ -0,0 +1,182 @@
+"""
+backend/deletion.py
+-------------------
+Background deletion of quest logs.
+Deleting a quest log only marks it deleted (quest_logs.deleted_at), which hides it from
+listings, boards and invites, and records a QuestLogDeletion job. The job then removes
+everything under the quest log with set-based DELETEs of at most DELETE_CHUNK_SIZE rows,
+one table at a time in dependency order (children before their parents), committing after
+every chunk so no transaction holds the database for long:
+
+    comments, stories, task_history, task_occurrences -> task_mirrors -> tasks -> memberships, invites,
+    activities, webhook deliveries -> webhook subscriptions -> the quest log's rollup rows
+    -> the quest log itself
+
+The job records the table it is on and the rows deleted so far, which
+GET /questlogs/{id}/deletion reports. Every step can simply be re-run, so a job that was
+interrupted (process restart, error) resumes at its recorded step: the scheduler's
+process_deletions job picks up pending jobs, and running or failed jobs whose heartbeat
+is older than STALE_SECONDS.
+
+Usage (from the project root), to run pending deletions by hand:
+    python -m backend.deletion
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, engine
+from .models import (
+    Comment, QLActivity, QLActivityDaily, QuestLog, QuestLogDeletion, QuestLogInvite, QuestLogMembership,
+    Story, StoryDaily, Task, TaskFlowDaily, TaskHistory, TaskMirror, TaskOccurrence, WebhookDelivery,
+    WebhookSubscription, ensure_schema
+)
+from . import logging_config
+
+DELETE_CHUNK_SIZE = int(os.getenv("TASKFABLE_DELETE_CHUNK_SIZE", "1000"))
+STALE_SECONDS = 300
+
+def deletion_plan(quest_log_id: int) -> List[Tuple[str, object, object]]:
+    """(table, model, condition) for every table holding rows of the quest log, in deletion order."""
+    tasks = select(Task.id).where(Task.quest_log_id == quest_log_id)
+    subscriptions = select(WebhookSubscription.id).where(WebhookSubscription.quest_log_id == quest_log_id)
+    return [
+        ("comments", Comment, Comment.task_id.in_(tasks)),
+        ("stories", Story, Story.task_id.in_(tasks)),
+        ("task_history", TaskHistory, TaskHistory.task_id.in_(tasks)),
+        ("task_occurrences", TaskOccurrence, TaskOccurrence.task_id.in_(tasks)),
+        # Mirrors shown on this board, and mirrors of this board's tasks on other boards.
+        ("task_mirrors", TaskMirror, or_(TaskMirror.quest_log_id == quest_log_id, TaskMirror.task_id.in_(tasks))),
+        ("tasks", Task, Task.quest_log_id == quest_log_id),
+        ("quest_log_memberships", QuestLogMembership, QuestLogMembership.quest_log_id == quest_log_id),
+        ("quest_log_invites", QuestLogInvite, QuestLogInvite.quest_log_id == quest_log_id),
+        ("ql_activities", QLActivity, QLActivity.quest_log_id == quest_log_id),
+        ("webhook_deliveries", WebhookDelivery, WebhookDelivery.subscription_id.in_(subscriptions)),
+        ("webhook_subscriptions", WebhookSubscription, WebhookSubscription.quest_log_id == quest_log_id),
+        ("task_flow_daily", TaskFlowDaily, TaskFlowDaily.quest_log_id == quest_log_id),
+        ("ql_activity_daily", QLActivityDaily, QLActivityDaily.quest_log_id == quest_log_id),
+        ("story_daily", StoryDaily, StoryDaily.quest_log_id == quest_log_id),
+        ("quest_logs", QuestLog, QuestLog.id == quest_log_id),
+    ]
+
+STEPS = [table for table, _, _ in deletion_plan(0)]
+
+def request_deletion(db: Session, quest_log: QuestLog, username: str) -> QuestLogDeletion:
+    """Soft-delete the quest log and record its deletion job (reusing an unfinished one)."""
+    job = latest_job(db, quest_log.id)
+    if job is None or job.status == "done":
+        job = QuestLogDeletion(quest_log_id=quest_log.id, requested_by=username)
+        db.add(job)
+    elif job.status == "failed":
+        job.status, job.error = "pending", None
+    quest_log.deleted_at = quest_log.deleted_at or datetime.utcnow()
+    db.commit()
+    db.refresh(job)
+    return job
+
+def latest_job(db: Session, quest_log_id: int):
+    return db.query(QuestLogDeletion).filter(QuestLogDeletion.quest_log_id == quest_log_id)\
+        .order_by(QuestLogDeletion.id.desc()).first()
+
+def job_progress(job: QuestLogDeletion) -> dict:
+    steps_done = len(STEPS) if job.status == "done" else (STEPS.index(job.step) if job.step in STEPS else 0)
+    return {
+        "deletion_id": job.id,
+        "quest_log_id": job.quest_log_id,
+        "status": job.status,
+        "step": job.step,
+        "steps_done": steps_done,
+        "steps_total": len(STEPS),
+        "rows_deleted": job.rows_deleted,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+def _claimable(now: datetime):
+    return or_(
+        QuestLogDeletion.status == "pending",
+        QuestLogDeletion.status.in_(("running", "failed")) & (QuestLogDeletion.updated_at < now - timedelta(seconds=STALE_SECONDS)),
+    )
+
+def claim_job(db: Session, job_id: int) -> bool:
+    """Mark the job running unless another worker already holds it (one conditional UPDATE)."""
+    now = datetime.utcnow()
+    result = db.execute(
+        update(QuestLogDeletion)
+        .where(QuestLogDeletion.id == job_id, _claimable(now))
+        .values(status="running", updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def delete_chunk(db: Session, model, condition, chunk_size: int) -> int:
+    ids = select(model.id).where(condition).limit(chunk_size).scalar_subquery()
+    result = db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+    return result.rowcount
+
+def run_job(db: Session, job: QuestLogDeletion, chunk_size: int = None) -> int:
+    """
+    Run a claimed job to completion from its recorded step. Returns the rows deleted by this
+    run. A failure is recorded on the job (and logged) for a later retry instead of raised.
+    """
+    chunk_size = chunk_size or DELETE_CHUNK_SIZE
+    plan = deletion_plan(job.quest_log_id)
+    start = STEPS.index(job.step) if job.step in STEPS else 0
+    deleted = 0
+    try:
+        for table, model, condition in plan[start:]:
+            job.step, job.updated_at = table, datetime.utcnow()
+            db.commit()
+            while True:
+                count = delete_chunk(db, model, condition, chunk_size)
+                job.rows_deleted += count
+                job.updated_at = datetime.utcnow()
+                db.commit()
+                deleted += count
+                if count < chunk_size:
+                    break
+        job.status, job.error, job.finished_at = "done", None, datetime.utcnow()
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        job.status, job.error, job.updated_at = "failed", str(e), datetime.utcnow()
+        db.commit()
+        logging_config.backend_logger.error(f"Deletion of Quest Log ID {job.quest_log_id} failed at '{job.step}': {e}")
+        return deleted
+    logging_config.backend_logger.info(f"Quest Log ID {job.quest_log_id} deleted ({job.rows_deleted} rows).")
+    return deleted
+
+def run_deletion_job(bind, job_id: int):
+    """Run one job on its own session; the endpoint queues this right after responding."""
+    db = Session(bind=bind)
+    try:
+        if claim_job(db, job_id):
+            run_job(db, db.get(QuestLogDeletion, job_id))
+    finally:
+        db.close()
+
+def process_deletions(db: Session, chunk_size: int = None) -> int:
+    """Run every claimable job. Returns the number of jobs run."""
+    job_ids = [row[0] for row in db.execute(
+        select(QuestLogDeletion.id).where(_claimable(datetime.utcnow())).order_by(QuestLogDeletion.id)
+    )]
+    ran = 0
+    for job_id in job_ids:
+        if claim_job(db, job_id):
+            run_job(db, db.get(QuestLogDeletion, job_id), chunk_size)
+            ran += 1
+    return ran
+
+if __name__ == "__main__":
+    ensure_schema(engine)
+    session = SessionLocal()
+    try:
+        print(f"Ran {process_deletions(session)} quest log deletion job(s).")
+    finally:
+        session.close()
@@ -0,0 +1,229 @@
+"""
+backend/export.py
+-----------------
+Streaming export of tasks, task history and stories for offline analysis.
+
+An export is one SELECT read through a server-side cursor (yield_per), EXPORT_CHUNK_SIZE
+rows at a time, and written out chunk by chunk as it is read, so memory use does not grow
+with the number of rows exported. Formats:
+
+    csv      text/csv, with a header row
+    arrow    Arrow IPC stream, one record batch per chunk
+    parquet  Parquet, one row group per chunk
+
+Exports through the API are made for a viewer, who only gets the quest logs they belong
+to, with other users' private tasks masked (see export_query); the command line exports
+everything. Arrow and Parquet need the optional `pyarrow` package. The export reads a single snapshot
+of the database; on SQLite the engine runs in WAL mode (see db.py), so writers are not
+blocked while a long export is read.
+
+Usage (from the project root):
+    python -m backend.export task_history --quest-log-id 3 --format parquet --output history.parquet
+"""
+
+import argparse
+import csv
+import enum
+import io
+import os
+import sys
+from typing import Iterable, Iterator, List, Optional
+
+from sqlalchemy import Boolean, DateTime, Float, Integer, case, literal, select
+from sqlalchemy.orm import Session
+
+from .models import MASKED_TEXT, Story, Task, TaskHistory
+from .search import member_boards, readable_condition
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_CHUNK_SIZE = int(os.getenv("TASKFABLE_EXPORT_CHUNK_SIZE", "5000"))
+
+TABLES = ("tasks", "task_history", "stories")
+FORMATS = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+def _masked(column, readable, masked_value=MASKED_TEXT):
+    """`column`, or `masked_value` on rows the viewer may not read."""
+    return case((readable, column), else_=literal(masked_value, column.type)).label(column.key)
+
+def export_query(table: str, quest_log_id: Optional[int] = None, viewer_id: Optional[int] = None):
+    """
+    The SELECT behind an export of `table`, on one quest log or all of them. Rows come in id
+    order; history and stories of one quest log come by task, then id, the order their
+    task_id indexes are read in, so the database never has to sort the export.
+    With a viewer, only the quest logs they are a member of are exported, and private tasks
+    of other users are masked as on their boards: MASKED_TEXT for the title, description and
+    story text, no co-owners. Without one (the command line), everything is exported as is.
+    """
+    readable = readable_condition(viewer_id) if viewer_id is not None else None
+    if table == "tasks":
+        text_columns = [Task.title, Task.description]
+        co_owners = Task.co_owner_ids
+        if readable is not None:
+            text_columns = [_masked(column, readable) for column in text_columns]
+            co_owners = _masked(Task.co_owner_ids, readable, "")
+        stmt = select(
+            Task.id, Task.quest_log_id, *text_columns, Task.color, Task.status,
+            Task.scheduled_time, Task.repeat_interval, Task.is_private, Task.locked, Task.owner_id,
+            co_owners, Task.created_at,
+        )
+        order = [Task.id]
+    elif table == "task_history":
+        stmt = (
+            select(TaskHistory.id, TaskHistory.task_id, Task.quest_log_id, TaskHistory.status, TaskHistory.timestamp)
+            .outerjoin(Task, Task.id == TaskHistory.task_id)
+        )
+        order = [Task.id, TaskHistory.id] if quest_log_id is not None else [TaskHistory.id]
+    elif table == "stories":
+        stmt = (
+            select(Story.id, Story.task_id, Task.quest_log_id, Story.owner_id, Story.xp, Story.currency,
+                   Story.created_at,
+                   _masked(Story.story_text, readable) if readable is not None else Story.story_text)
+            .outerjoin(Task, Task.id == Story.task_id)
+        )
+        order = [Task.id, Story.id] if quest_log_id is not None else [Story.id]
+    else:
+        raise ValueError(f"Unknown export table '{table}'")
+    if quest_log_id is not None:
+        stmt = stmt.where(Task.quest_log_id == quest_log_id)
+    if viewer_id is not None:
+        stmt = stmt.where(Task.quest_log_id.in_(member_boards(viewer_id)))
+    return stmt.order_by(*order)
+
+def format_available(fmt: str) -> bool:
+    return fmt == "csv" or (fmt in FORMATS and pyarrow is not None)
+
+def iter_chunks(db: Session, stmt, chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """Rows of `stmt` in lists of at most chunk_size, read through a server-side cursor."""
+    result = db.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        for rows in result.partitions():
+            yield [tuple(plain(value) for value in row) for row in rows]
+    finally:
+        result.close()
+
+def plain(value):
+    # TaskStatus is a str Enum; export its value, not "TaskStatus.todo".
+    return value.value if isinstance(value, enum.Enum) else value
+
+def write_csv(columns: List[str], chunks: Iterable[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # No rows: the header alone.
+        yield buffer.getvalue().encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what pyarrow writes until the next drain()."""
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+def arrow_type(sql_type):
+    if isinstance(sql_type, Boolean):
+        return pyarrow.bool_()
+    if isinstance(sql_type, Integer):
+        return pyarrow.int64()
+    if isinstance(sql_type, Float):
+        return pyarrow.float64()
+    if isinstance(sql_type, DateTime):
+        return pyarrow.timestamp("us")
+    return pyarrow.string()
+
+def write_arrow(stmt, chunks: Iterable[List[tuple]], fmt: str) -> Iterator[bytes]:
+    """Arrow IPC stream or Parquet file of the chunks, one record batch / row group each."""
+    schema = pyarrow.schema([(col.name, arrow_type(col.type)) for col in stmt.selected_columns])
+    sink = _ChunkSink()
+    writer = pyarrow.ipc.new_stream(sink, schema) if fmt == "arrow" else pyarrow.parquet.ParquetWriter(sink, schema)
+    for rows in chunks:
+        columns = list(zip(*rows))
+        writer.write_batch(pyarrow.record_batch(
+            [pyarrow.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema
+        ))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+def export_table(db: Session, table: str, fmt: str = "csv", quest_log_id: Optional[int] = None,
+                 chunk_size: int = EXPORT_CHUNK_SIZE, viewer_id: Optional[int] = None) -> Iterator[bytes]:
+    """The export of `table` in `fmt` (as `viewer_id` may see it), as a stream of byte chunks."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'")
+    if not format_available(fmt):
+        raise RuntimeError(f"Exporting {fmt} needs the pyarrow package")
+    stmt = export_query(table, quest_log_id, viewer_id)
+    chunks = iter_chunks(db, stmt, chunk_size)
+    if fmt == "csv":
+        return write_csv([col.name for col in stmt.selected_columns], chunks)
+    return write_arrow(stmt, chunks, fmt)
+
+def stream_export(bind, table: str, fmt: str = "csv", quest_log_id: Optional[int] = None,
+                  chunk_size: int = EXPORT_CHUNK_SIZE, viewer_id: Optional[int] = None) -> Iterator[bytes]:
+    """
+    export_table() on a session of its own, closed when the stream ends, so a response can
+    keep reading after the request's session is gone.
+    """
+    db = Session(bind=bind)
+    try:
+        yield from export_table(db, table, fmt, quest_log_id, chunk_size, viewer_id)
+    finally:
+        db.close()
+
+def main():
+    from .db import engine
+    from .models import ensure_schema
+    parser = argparse.ArgumentParser(description="Export TaskFable tasks, task history or stories.")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--quest-log-id", type=int, default=None)
+    parser.add_argument("--output", help="File to write (default: standard output)")
+    parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+    args = parser.parse_args()
+    if not format_available(args.format):
+        parser.error(f"--format {args.format} needs the pyarrow package")
+    ensure_schema(engine)
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for data in stream_export(engine, args.table, args.format, args.quest_log_id, args.chunk_size):
+            out.write(data)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
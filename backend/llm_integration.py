@@ -1,6 +1,8 @@
 from transformers import pipeline
 from .models import Task
+from . import metrics
 import re
+import time
 from typing import Tuple
 
 # Initialize the self-hosted LLM (using a sample GPT-2 model; replace with your own model)
@@ -17,7 +19,9 @@ def generate_story_for_task(task: Task, db) -> Tuple[str, int, int]:
         f"Task Details: Title: {task.title}\nDescription: {task.description or 'N/A'}\n"
         "Write a mini-story that connects with previous events, and at the end, output XP and Currency values in the format: XP:<number>, Currency:<number>."
     )
+    start = time.perf_counter()
     result = llm(prompt, max_length=150, num_return_sequences=1, truncation=True)
+    metrics.LLM_GENERATION.observe(time.perf_counter() - start)
     generated_text = result[0]['generated_text']
     xp, currency = parse_xp_currency(generated_text)
     return generated_text, xp, currency
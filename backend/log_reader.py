@@ -0,0 +1,242 @@
+"""
+backend/log_reader.py
+---------------------
+Bounded-memory readers for the log files under logs/.
+  - tail(): the last N lines of a file, read in blocks backwards from the end (or from a
+    byte-offset cursor, to page further back). Memory is O(N lines), not O(file).
+  - LogFollower/follow(): lines appended after an offset, surviving daily rotation.
+  - search(): substring search across a log and its rotated (gzip) backups, streamed
+    line by line, newest file first.
+  - query(): the same walk over JSON-lines logs, matching fields exactly (route, user,
+    quest_log_id, ...) and latency_ms by range. Lines are prefiltered on the raw bytes of
+    each "field": value pair, so only candidate lines are JSON-decoded.
+Rotated backups are gzip files (see logging_config); they cannot be read backwards, so they
+are streamed forward while only the last N matching lines are kept.
+"""
+
+import gzip
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BLOCK_SIZE = 64 * 1024
+
+def is_compressed(path: str) -> bool:
+    return path.endswith(".gz")
+
+def iter_lines_reverse(path: str, before: Optional[int] = None, block_size: int = BLOCK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    Yield (offset, line) pairs from the end of a plain file (or from byte offset `before`)
+    towards its start. `offset` is where the line begins, so it can serve as a paging cursor.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell() if before is None else min(before, f.tell())
+        position = end
+        remainder = b""
+        first_block = True
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size) + remainder
+            if first_block:
+                first_block = False
+                if chunk.endswith(b"\n"):
+                    chunk = chunk[:-1]  # The newline terminating the last line.
+            lines = chunk.split(b"\n")
+            # The first piece may be a partial line; carry it into the next block.
+            remainder = lines.pop(0)
+            offset = position + len(remainder) + 1
+            located = []
+            for line in lines:
+                located.append((offset, line))
+                offset += len(line) + 1
+            yield from reversed(located)
+        if end > 0:
+            yield 0, remainder
+
+def _iter_lines_forward(path: str) -> Iterator[Tuple[int, bytes]]:
+    opener = gzip.open if is_compressed(path) else open
+    offset = 0
+    with opener(path, "rb") as f:
+        for line in f:
+            yield offset, line.rstrip(b"\n")
+            offset += len(line)
+
+def tail(path: str, num_lines: int = 100, before: Optional[int] = None) -> Tuple[List[str], Optional[int]]:
+    """
+    Return up to `num_lines` lines, newest first, that end before byte offset `before`
+    (default: end of file), plus the cursor to pass as `before` for the next older page
+    (None once the start of the file is reached).
+    For gzip backups offsets refer to the decompressed stream.
+    """
+    if num_lines <= 0:
+        return [], before
+    if is_compressed(path):
+        window = deque(maxlen=num_lines)
+        for offset, line in _iter_lines_forward(path):
+            if before is not None and offset >= before:
+                break
+            window.append((offset, line))
+        picked = list(reversed(window))
+    else:
+        picked = []
+        for offset, line in iter_lines_reverse(path, before):
+            picked.append((offset, line))
+            if len(picked) >= num_lines:
+                break
+    cursor = picked[-1][0] if picked and picked[-1][0] > 0 else None
+    return [line.decode("utf-8", errors="replace") for _, line in picked], cursor
+
+class LogFollower:
+    """
+    Non-blocking reader for lines appended to a live log after a byte offset (default: the
+    current end of file). Reopens the file from the start when it is rotated or truncated.
+    """
+    def __init__(self, path: str, offset: Optional[int] = None):
+        self.path = path
+        self._open(offset)
+
+    def _open(self, offset: Optional[int]):
+        self.file = open(self.path, "rb")
+        self.file.seek(0, os.SEEK_END)
+        if offset is not None and offset <= self.file.tell():
+            self.file.seek(offset)
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.pending = b""
+
+    def poll(self) -> List[Tuple[int, str]]:
+        """Return (offset after line, line) for each complete line written since the last poll."""
+        lines = []
+        while True:
+            chunk = self.file.readline()
+            if not chunk:
+                break
+            self.pending += chunk
+            if self.pending.endswith(b"\n"):
+                lines.append((self.file.tell(), self.pending.rstrip(b"\n").decode("utf-8", errors="replace")))
+                self.pending = b""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return lines
+        if stat.st_ino != self.inode or stat.st_size < self.file.tell():
+            self.file.close()
+            self._open(0)
+            lines.extend(self.poll())
+        return lines
+
+    def close(self):
+        self.file.close()
+
+def follow(path: str, offset: Optional[int] = None, poll_interval: float = 1.0,
+           max_idle: Optional[float] = None) -> Iterator[Tuple[int, str]]:
+    """Blocking generator over LogFollower; stops after `max_idle` seconds without new lines, if given."""
+    follower = LogFollower(path, offset)
+    try:
+        idle_since = time.monotonic()
+        while True:
+            lines = follower.poll()
+            if lines:
+                idle_since = time.monotonic()
+                yield from lines
+            elif max_idle is not None and time.monotonic() - idle_since >= max_idle:
+                return
+            time.sleep(poll_interval)
+    finally:
+        follower.close()
+
+def rotated_files(log_dir: str, base_name: str) -> List[str]:
+    """The live log followed by its rotated backups, newest first."""
+    backups = sorted(
+        (name for name in os.listdir(log_dir) if name.startswith(base_name + ".")),
+        reverse=True,
+    )
+    live = [base_name] if os.path.exists(os.path.join(log_dir, base_name)) else []
+    return live + backups
+
+def search(log_dir: str, base_name: str, query: str, limit: int = 200) -> List[dict]:
+    """
+    Case-insensitive substring search over a log and its rotated backups, newest matches
+    first, returning at most `limit` matches. Each file is streamed, never loaded whole.
+    """
+    needle = query.lower().encode("utf-8")
+    matches: List[dict] = []
+    for name in rotated_files(log_dir, base_name):
+        path = os.path.join(log_dir, name)
+        remaining = limit - len(matches)
+        if remaining <= 0:
+            break
+        if is_compressed(path):
+            found = deque(maxlen=remaining)
+            for offset, line in _iter_lines_forward(path):
+                if needle in line.lower():
+                    found.append((offset, line))
+            found = list(reversed(found))
+        else:
+            found = []
+            for offset, line in iter_lines_reverse(path):
+                if needle in line.lower():
+                    found.append((offset, line))
+                    if len(found) >= remaining:
+                        break
+        matches.extend(
+            {"filename": name, "offset": offset, "line": line.decode("utf-8", errors="replace")}
+            for offset, line in found
+        )
+    return matches
+
+def _field_needles(fields: Dict[str, str]) -> List[bytes]:
+    # Same separators as json.dumps in logging_config.JsonFormatter.
+    return [json.dumps({key: value})[1:-1].encode("utf-8") for key, value in fields.items()]
+
+def query(log_dir: str, base_name: str, fields: Dict[str, str], min_latency_ms: Optional[float] = None,
+          limit: int = 200) -> List[dict]:
+    """
+    Structured entries whose `fields` all match exactly (and whose latency_ms is at least
+    `min_latency_ms`, if given), newest first, across a log and its rotated backups.
+    Lines that are not JSON (older plain-text logs) are skipped.
+    """
+    needles = _field_needles(fields)
+    if min_latency_ms is not None:
+        needles.append(b'"latency_ms": ')
+
+    def matches(line: bytes) -> Optional[dict]:
+        if not all(needle in line for needle in needles):
+            return None
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(entry, dict) or any(entry.get(key) != value for key, value in fields.items()):
+            return None
+        if min_latency_ms is not None and not (entry.get("latency_ms") or 0) >= min_latency_ms:
+            return None
+        return entry
+
+    results: List[dict] = []
+    for name in rotated_files(log_dir, base_name):
+        path = os.path.join(log_dir, name)
+        remaining = limit - len(results)
+        if remaining <= 0:
+            break
+        if is_compressed(path):
+            found = deque(maxlen=remaining)
+            for offset, line in _iter_lines_forward(path):
+                entry = matches(line)
+                if entry is not None:
+                    found.append((offset, entry))
+            found = list(reversed(found))
+        else:
+            found = []
+            for offset, line in iter_lines_reverse(path):
+                entry = matches(line)
+                if entry is not None:
+                    found.append((offset, entry))
+                    if len(found) >= remaining:
+                        break
+        results.extend({"filename": name, "offset": offset, "entry": entry} for offset, entry in found)
+    return results
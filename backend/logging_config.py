@@ -1,40 +1,299 @@
+"""
+backend/logging_config.py
+-------------------------
+Backend and frontend loggers.
+Records are written as one JSON object per line (TASKFABLE_LOG_FORMAT=text restores the
+plain "time - level - message" format). While a request is being handled, every record
+carries that request's context (request_id, method, path, route, user, quest_log_id),
+bound by the request middleware in main.py; extra={...} fields are included as well.
+DEBUG records can be sampled per route prefix with TASKFABLE_LOG_SAMPLING, e.g.
+"/logs=0,/tasks=0.1,*=1": the keep/drop decision is made once per request, so a sampled
+request keeps all of its DEBUG lines.
+Request threads never touch the log files: each logger only has a QueueHandler that puts
+records on a bounded in-memory queue, and a background QueueListener thread writes them
+to the daily-rotated files in batches, flushing once per batch instead of once per line.
+When the queue is full, records below WARNING are dropped (and counted); WARNING and
+above wait briefly for space so errors are not lost.
+"""
+
 import os
+import gzip
+import json
+import queue
+import atexit
+import random
+import shutil
 import logging
-from logging.handlers import TimedRotatingFileHandler
+import threading
+import contextvars
+from datetime import datetime, timezone
+from logging.handlers import TimedRotatingFileHandler, QueueHandler, QueueListener
 
 # Ensure log directories exist
 os.makedirs("logs/backend", exist_ok=True)
 os.makedirs("logs/frontend", exist_ok=True)
 
-def setup_backend_logger():
-    logger = logging.getLogger("backend-logger")
-    logger.setLevel(logging.DEBUG)
-    handler = TimedRotatingFileHandler(
-        filename="logs/backend/backend.log",
+# Number of daily rotated files kept per log (older ones are deleted on rollover).
+LOG_BACKUP_DAYS = int(os.getenv("TASKFABLE_LOG_BACKUP_DAYS", "7"))
+# Records buffered per logger before the overflow policy applies.
+LOG_QUEUE_SIZE = int(os.getenv("TASKFABLE_LOG_QUEUE_SIZE", "10000"))
+# Maximum records written between two flushes.
+LOG_BATCH_SIZE = int(os.getenv("TASKFABLE_LOG_BATCH_SIZE", "256"))
+# How long WARNING+ records wait for queue space before being dropped.
+LOG_OVERFLOW_BLOCK_SECONDS = 0.5
+# "json" (default) or "text".
+LOG_FORMAT = os.getenv("TASKFABLE_LOG_FORMAT", "json").lower()
+
+def parse_sampling(spec):
+    """Parse "prefix=rate,..." into (prefix, rate) pairs, longest prefix first. "*" is the default."""
+    rules = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        prefix, _, rate = part.partition("=")
+        rules.append((prefix.strip() if prefix.strip() != "*" else "", min(max(float(rate), 0.0), 1.0)))
+    return sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+DEBUG_SAMPLING = parse_sampling(os.getenv("TASKFABLE_LOG_SAMPLING", ""))
+
+def debug_sample_rate(path):
+    for prefix, rate in DEBUG_SAMPLING:
+        if path.startswith(prefix):
+            return rate
+    return 1.0
+
+# Context of the request being handled (a dict; see bind_request_context).
+request_context = contextvars.ContextVar("request_context", default=None)
+
+def bind_request_context(**fields):
+    """
+    Start a request context for the current task; returns the token for reset_request_context.
+    The dict is shared with code running for the same request, so later updates are visible.
+    """
+    context = {key: value for key, value in fields.items() if value is not None}
+    context["debug_sampled"] = random.random() < debug_sample_rate(fields.get("path") or "")
+    return request_context.set(context)
+
+def update_request_context(**fields):
+    context = request_context.get()
+    if context is not None:
+        context.update({key: value for key, value in fields.items() if value is not None})
+
+def reset_request_context(token):
+    request_context.reset(token)
+
+# Context keys copied onto log records.
+CONTEXT_FIELDS = ("request_id", "method", "path", "route", "user", "quest_log_id")
+
+def route_template(scope):
+    """The matched route's path template (e.g. /tasks/{task_id}/status), or None before routing."""
+    route = scope.get("route")
+    if route is None:
+        return None
+    # Routes of included routers may carry only their own part of the path (without the
+    # router prefix); the prefix is the leading segments of the request path.
+    segments = scope["path"].split("/")
+    own_segments = len(route.path.split("/")) - 1
+    return "/".join(segments[:len(segments) - own_segments]) + route.path
+
+def _resolve_route(context):
+    """Fill in the route template and path parameters once routing has matched (ASGI scope)."""
+    scope = context.get("scope")
+    route = route_template(scope) if scope else None
+    if route is None:
+        return
+    context["route"] = route
+    params = scope.get("path_params") or {}
+    for key, param in (("user", "username"), ("quest_log_id", "quest_log_id")):
+        if key not in context and params.get(param) is not None:
+            context[key] = str(params[param])
+
+class RequestContextFilter(logging.Filter):
+    """
+    Copies the current request context onto each record and applies DEBUG sampling.
+    Attached to the queue handlers, so it runs on the thread that logged the record.
+    """
+    def filter(self, record):
+        context = request_context.get()
+        if context is None:
+            return True
+        if record.levelno <= logging.DEBUG and not context.get("debug_sampled", True):
+            return False
+        if "route" not in context:
+            _resolve_route(context)
+        for key in CONTEXT_FIELDS:
+            if key in context and not hasattr(record, key):
+                setattr(record, key, context[key])
+        return True
+
+# Attributes every LogRecord has; anything else on a record came from extra= or the context filter.
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, context/extra fields, and exc if any."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def make_formatter():
+    if LOG_FORMAT == "text":
+        return logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    return JsonFormatter()
+
+def gzip_namer(name):
+    return name + ".gz"
+
+def gzip_rotator(source, dest):
+    """Compress the rotated file instead of keeping it as plain text."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+class BatchFlushingFileHandler(TimedRotatingFileHandler):
+    """Rotating file handler whose per-record flush is deferred to flush_batch()."""
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler with a drop policy for a full queue; counts what it drops."""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+
+    def prepare(self, record):
+        """
+        Like QueueHandler.prepare, but keeps the formatted traceback in exc_text rather
+        than folding it into msg, so the writer's formatter decides how to render it.
+        """
+        message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(vars(record))
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            if record.levelno >= logging.WARNING:
+                self.queue.put(record, timeout=LOG_OVERFLOW_BLOCK_SECONDS)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += 1
+
+class BatchingQueueListener(QueueListener):
+    """Drains up to LOG_BATCH_SIZE records at a time and flushes the handlers once per batch."""
+    def __init__(self, log_queue, *handlers, overflow_handler=None):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.overflow_handler = overflow_handler
+        self._reported_drops = 0
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+    def _report_drops(self):
+        if self.overflow_handler is None:
+            return
+        dropped = self.overflow_handler.dropped
+        if dropped > self._reported_drops:
+            record = logging.makeLogRecord({
+                "name": "logging", "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": f"Log queue full: dropped {dropped - self._reported_drops} records",
+            })
+            self._reported_drops = dropped
+            self.handle(record)
+
+    def _flush(self):
+        for handler in self.handlers:
+            if hasattr(handler, "flush_batch"):
+                handler.flush_batch()
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            batch = [self.dequeue(True)]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    self.handle(record)
+                q.task_done()
+            self._report_drops()
+            self._flush()
+            if stop:
+                break
+
+def make_rotating_handler(filename):
+    handler = BatchFlushingFileHandler(
+        filename=filename,
         when="midnight",
-        backupCount=7,
+        backupCount=LOG_BACKUP_DAYS,
         encoding="utf-8"
     )
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    handler.namer = gzip_namer
+    handler.rotator = gzip_rotator
+    return handler
+
+def attach_queued_file_handler(logger, filename, formatter):
+    """Route `logger` through a bounded queue to a batching writer thread for `filename`."""
+    file_handler = make_rotating_handler(filename)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = BoundedQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    listener = BatchingQueueListener(log_queue, file_handler, overflow_handler=queue_handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return queue_handler, listener
+
+def setup_backend_logger():
+    logger = logging.getLogger("backend-logger")
+    logger.setLevel(logging.DEBUG)
+    attach_queued_file_handler(logger, "logs/backend/backend.log", make_formatter())
     return logger
 
 def setup_frontend_logger():
     logger = logging.getLogger("frontend-logger")
     logger.setLevel(logging.DEBUG)
-    handler = TimedRotatingFileHandler(
-        filename="logs/frontend/frontend.log",
-        when="midnight",
-        backupCount=7,
-        encoding="utf-8"
-    )
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    logger.addHandler(handler)
+    attach_queued_file_handler(logger, "logs/frontend/frontend.log", make_formatter())
     return logger
 
+def dropped_records():
+    """Records dropped because a log queue was full, per logger name."""
+    return {
+        name: sum(h.dropped for h in logging.getLogger(name).handlers if isinstance(h, BoundedQueueHandler))
+        for name in ("backend-logger", "frontend-logger")
+    }
+
 backend_logger = setup_backend_logger()
 frontend_logger = setup_frontend_logger()
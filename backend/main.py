@@ -3,31 +3,55 @@ backend/main.py
 ---------------
 Main application entry point for TaskFable.
 This file configures the FastAPI application, including CORS, exception handling,
-and includes all routers (users, tasks, stories, logs, changelog, and questlogs).
-It also provides a simple endpoint to retrieve the server's local timezone.
+and includes all routers (users, tasks, stories, logs, changelog, questlogs, analytics, search and export).
+It also provides a simple endpoint to retrieve the server's local timezone, and a
+middleware that gives every request an id (X-Request-ID) and binds it, with the route,
+user and quest log, to all log records written while the request is handled. The same
+middleware records request metrics, served in the Prometheus text format at /metrics, and
+profiles requests that ask for it (X-Profile header or __profile query flag; see profiling.py).
+Responses of COMPRESS_MIN_SIZE bytes or more are gzip/brotli compressed (see compression.py).
 Note: This file uses relative imports. To run it, execute from the project root:
     python -m backend.main
+This is the single-process development server (with reload); production deployments with
+several worker processes use `python -m backend.cluster`.
 """
 
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from .routers import tasks, stories, users, logs, changelog, questlogs
-from . import logging_config
+from fastapi.responses import JSONResponse, PlainTextResponse
+from .routers import tasks, stories, users, logs, changelog, questlogs, analytics, search, export
+from . import logging_config, metrics, profiling, cluster
+from .compression import CompressionMiddleware
+from .db import engine
+from .models import ensure_schema
 from datetime import datetime
+import time
+import uuid
 from tzlocal import get_localzone
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup code
+    if cluster.ENABLED:
+        # One of several workers (python -m backend.cluster), which has set up the schema.
+        cluster.start_worker()
+    else:
+        # Create any tables and indexes added since the database was initialized.
+        ensure_schema(engine)
     logging_config.backend_logger.info("Application startup complete.")
     yield
     # Shutdown code
+    if cluster.ENABLED:
+        cluster.stop_worker()
     logging_config.backend_logger.info("Application shutdown complete.")
 
 app = FastAPI(lifespan=lifespan, title="TaskFable API", version="0.2.6", docs_url="/")
+metrics.instrument_engine(engine)
+# Added before the request middleware below so it wraps the endpoint's response directly:
+# the request middleware re-streams bodies, which would hide their size from it.
+app.add_middleware(CompressionMiddleware)
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
@@ -36,6 +60,47 @@ async def general_exception_handler(request: Request, exc: Exception):
         content={"detail": "Internal Server Error"},
     )
 
+@app.middleware("http")
+async def request_context_middleware(request: Request, call_next):
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex[:16]
+    token = logging_config.bind_request_context(
+        request_id=request_id,
+        method=request.method,
+        path=request.url.path,
+        user=request.query_params.get("username") or request.query_params.get("viewer_username"),
+        quest_log_id=request.query_params.get("quest_log_id"),
+        scope=request.scope,
+    )
+    stats_token, stats = metrics.begin_request()
+    profile_format = profiling.requested_format(request.headers, request.query_params)
+    profiler = profiling.start_request_profile(request.scope, profile_format) if profile_format else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        logging_config.backend_logger.info("Request completed", extra={
+            "status": status, "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "db_queries": stats.queries, "db_ms": round(stats.query_seconds * 1000, 2),
+        })
+    except Exception:
+        logging_config.backend_logger.exception("Request failed", extra={
+            "status": status, "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+            "db_queries": stats.queries, "db_ms": round(stats.query_seconds * 1000, 2),
+        })
+        raise
+    finally:
+        route = logging_config.route_template(request.scope) or "unmatched"
+        metrics.end_request(stats_token, request.method, route, status, time.perf_counter() - start, stats)
+        if profiler is not None:
+            profile_file = profiling.save_profile(profiler, request.method, route, request_id)
+            logging_config.backend_logger.info("Request profiled", extra={"profile": profile_file})
+        logging_config.reset_request_context(token)
+    if profiler is not None:
+        response.headers["X-Profile-File"] = profile_file
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 # Configure CORS (if needed)
 from fastapi.middleware.cors import CORSMiddleware
 app.add_middleware(
@@ -53,6 +118,9 @@ app.include_router(stories.router, prefix="/stories")
 app.include_router(logs.router, prefix="/logs")
 app.include_router(changelog.router, prefix="/other")
 app.include_router(questlogs.router, prefix="/questlogs")
+app.include_router(analytics.router, prefix="/analytics")
+app.include_router(search.router, prefix="/search")
+app.include_router(export.router, prefix="/export")
 
 @app.get("/server/timezone")
 def get_server_timezone():
@@ -67,6 +135,11 @@ def get_server_timezone():
     offset_str = f"UTC{sign}{hours:02d}:{minutes:02d}"
     return {"server_timezone": offset_str}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Request, database, LLM, cache, scheduler and logging metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.render_all(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("backend.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+backend/metrics.py
+------------------
+In-process metrics for TaskFable, exposed in the Prometheus text format at /metrics.
+  - HTTP: request count and latency histogram per method and route template.
+  - Database: query count and duration (SQLAlchemy cursor events), and queries per request,
+    which makes N+1 patterns visible per route.
+  - LLM story generation time, cache hits/misses, and dropped log records.
+  - Scheduler job runs and durations. The scheduler is a separate process, so it writes its
+    metrics to a textfile under METRICS_DIR after each tick, and /metrics appends those files.
+Metrics are plain dicts guarded by one lock each; recording costs a dict update and, for
+histograms, a bisect over the bucket bounds.
+"""
+
+import os
+import time
+import bisect
+import threading
+import contextvars
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import event
+
+from . import logging_config
+
+METRICS_DIR = os.getenv("TASKFABLE_METRICS_DIR", "logs/metrics")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+LLM_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.documentation, self.labelnames = name, documentation, labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, labelnames
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [count per bucket (+Inf last), sum]
+        self._values: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def count(self, *labels) -> int:
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+class GaugeFunction:
+    """A gauge read at scrape time from `fn`, which returns {label values: value}."""
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...],
+                 fn: Callable[[], Dict[Tuple, float]]):
+        self.name, self.documentation, self.labelnames, self.fn = name, documentation, labelnames, fn
+
+    def collect(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in sorted(self.fn().items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+HTTP_REQUESTS = Counter("taskfable_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram("taskfable_http_request_duration_seconds", "HTTP request latency.", ("method", "route"))
+DB_QUERIES = Counter("taskfable_db_queries_total", "SQL statements executed.")
+DB_QUERY_LATENCY = Histogram("taskfable_db_query_duration_seconds", "SQL statement execution time.", buckets=QUERY_BUCKETS)
+DB_QUERIES_PER_REQUEST = Histogram("taskfable_db_queries_per_request", "SQL statements executed per HTTP request.",
+                                   ("method", "route"), buckets=COUNT_BUCKETS)
+LLM_GENERATION = Histogram("taskfable_llm_generation_seconds", "Time spent generating a story with the LLM.",
+                           buckets=LLM_BUCKETS)
+CACHE_REQUESTS = Counter("taskfable_cache_requests_total", "Cache lookups by cache and result (hit/miss).",
+                         ("cache", "result"))
+SCHEDULER_RUNS = Counter("taskfable_scheduler_job_runs_total", "Scheduler job runs by outcome.", ("job", "outcome"))
+SCHEDULER_DURATION = Histogram("taskfable_scheduler_job_duration_seconds", "Scheduler job run time.", ("job",),
+                               buckets=(0.01, 0.1, 0.5, 1.0, 5.0, 30.0, 60.0, 300.0))
+LOG_RECORDS_DROPPED = GaugeFunction(
+    "taskfable_log_records_dropped", "Log records dropped because a log queue was full.", ("logger",),
+    lambda: {(name,): count for name, count in logging_config.dropped_records().items()},
+)
+
+REGISTRY = [
+    HTTP_REQUESTS, HTTP_LATENCY, DB_QUERIES, DB_QUERY_LATENCY, DB_QUERIES_PER_REQUEST,
+    LLM_GENERATION, CACHE_REQUESTS, SCHEDULER_RUNS, SCHEDULER_DURATION, LOG_RECORDS_DROPPED,
+]
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+class RequestStats:
+    """Per-request database counters, shared by everything running for that request."""
+    __slots__ = ("queries", "query_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+request_stats = contextvars.ContextVar("request_stats", default=None)
+
+# Callables run at the end of every request with (method, route, status, seconds, stats);
+# the test suite uses this to record queries per endpoint.
+REQUEST_OBSERVERS: List[Callable] = []
+
+def begin_request():
+    stats = RequestStats()
+    return request_stats.set(stats), stats
+
+def end_request(token, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+    request_stats.reset(token)
+    HTTP_REQUESTS.inc(method, route, str(status))
+    HTTP_LATENCY.observe(seconds, method, route)
+    DB_QUERIES_PER_REQUEST.observe(stats.queries, method, route)
+    for observer in REQUEST_OBSERVERS:
+        observer(method, route, status, seconds, stats)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERIES.inc()
+    DB_QUERY_LATENCY.observe(elapsed)
+    stats = request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+def instrument_engine(engine):
+    """Count and time every statement run on `engine`."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+def render(prefix: str = "", exclude: Iterable[str] = ()) -> str:
+    """This process's metrics (those whose name starts with `prefix`) in the Prometheus text format."""
+    lines = []
+    for metric in REGISTRY:
+        if metric.name.startswith(prefix) and metric.name not in exclude:
+            lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+def write_textfile(name: str, prefix: str = ""):
+    """Atomically write this process's metrics to METRICS_DIR/<name>.prom for /metrics to include."""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"{name}.prom")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(render(prefix))
+    os.replace(path + ".tmp", path)
+
+def render_all() -> str:
+    """
+    This process's metrics followed by those written by other processes (e.g. the scheduler).
+    A metric family found in a textfile is taken from there only, so no family appears twice.
+    """
+    textfiles = []
+    if os.path.isdir(METRICS_DIR):
+        for name in sorted(os.listdir(METRICS_DIR)):
+            if name.endswith(".prom"):
+                with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as f:
+                    textfiles.append(f.read())
+    external = {
+        line.split()[2] for text in textfiles for line in text.splitlines() if line.startswith("# TYPE ")
+    }
+    return render(exclude=external) + "".join(textfiles)
@@ -2,11 +2,15 @@
 backend/models.py
 -----------------
 Data models for TaskFable.
-This file defines core models (User, Task, Comment, Story, TaskHistory) and new Quest Log (QL) features.
+This file defines core models (User, Task, Comment, Story, TaskHistory), Quest Log (QL) features,
+quest log deletion jobs, the pre-aggregated analytics rollups, and the leases and cache
+invalidations shared by the workers of a multi-worker deployment.
 """
 
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy import Column, Integer, String, Text, DateTime, Enum, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Date, Float, Enum, Boolean, ForeignKey, UniqueConstraint, Index
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateTable
 from datetime import datetime
 import enum
 import uuid
@@ -20,6 +24,13 @@ class TaskStatus(str, enum.Enum):
     waiting = "Waiting"
     done = "Done"
 
+# Reward split between the owner and commenters when a task reaches Done.
+COMPLETION_XP = 10
+COMPLETION_CURRENCY = 5
+
+# Private tasks of other users are shown (boards, exports) under this title, without their text.
+MASKED_TEXT = "Solo Adventure"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, index=True)
@@ -44,6 +55,9 @@ class QuestLog(Base):
     name = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set when the owner deletes the quest log; the rows are then removed in the background
+    # by backend/deletion.py, and the quest log is hidden in the meantime.
+    deleted_at = Column(DateTime, nullable=True)
     owner = relationship("User", backref="owned_quest_logs")
     tasks = relationship("Task", back_populates="quest_log", cascade="all, delete-orphan")
     memberships = relationship("QuestLogMembership", back_populates="quest_log", cascade="all, delete-orphan")
@@ -53,6 +67,11 @@ class QuestLog(Base):
 
 class QuestLogMembership(Base):
     __tablename__ = "quest_log_memberships"
+    __table_args__ = (
+        # Rosters and membership checks (quest log, then user); a user's boards.
+        Index("ix_quest_log_memberships_roster", "quest_log_id", "user_id"),
+        Index("ix_quest_log_memberships_user", "user_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -63,20 +82,30 @@ class QuestLogMembership(Base):
 
 class QuestLogInvite(Base):
     __tablename__ = "quest_log_invites"
+    __table_args__ = (
+        # Listing a board's live invites, newest first.
+        Index("ix_quest_log_invites_listing", "quest_log_id", "archived_at", "created_at"),
+        # The invite sweeper's scan for expired invites.
+        Index("ix_quest_log_invites_expiry", "archived_at", "expires_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False)
+    # Unique, so token lookups go through its unique index.
     token = Column(String, unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     used = Column(Boolean, default=False)
     revoked = Column(Boolean, default=False)
     expires_at = Column(DateTime, nullable=True)
     is_permanent = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set by the invite sweeper (backend/retention.py) once the invite is revoked, used or expired.
+    archived_at = Column(DateTime, nullable=True)
     quest_log = relationship("QuestLog", back_populates="invites")
 
 class QLActivity(Base):
     __tablename__ = "ql_activities"
+    __table_args__ = {"sqlite_autoincrement": True}  # Read by id watermark: see AUTOINCREMENT_TABLES.
     id = Column(Integer, primary_key=True, index=True)
-    quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False)
+    quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     action = Column(String, nullable=False)
     details = Column(Text, nullable=True)
@@ -85,7 +114,18 @@ class QLActivity(Base):
     user = relationship("User", backref="ql_activities")
 
 class TaskMirror(Base):
+    """
+    An "Oracle Task": a task shown on another quest log's board as well as its own.
+    The row only points at the source task, so boards always show its current state.
+    """
     __tablename__ = "task_mirrors"
+    __table_args__ = (
+        # Per-board index of mirrored task ids: a board load reads only its own entries
+        # (index only), however many boards the same task is mirrored into.
+        Index("ix_task_mirrors_board", "quest_log_id", "task_id", unique=True),
+        # A task's mirrors (listing, deletion of the source task's quest log).
+        Index("ix_task_mirrors_task", "task_id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
     quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False)
@@ -101,34 +141,48 @@ class Task(Base):
     description = Column(Text, nullable=True)
     color = Column(String, default="blue")
     status = Column(Enum(TaskStatus), default=TaskStatus.todo)
-    scheduled_time = Column(DateTime, nullable=True)
+    scheduled_time = Column(DateTime, nullable=True, index=True)
+    # Seconds between occurrences of a recurring task, counted from scheduled_time (see backend/recurrence.py).
     repeat_interval = Column(Integer, nullable=True)
     is_private = Column(Boolean, default=False)
     locked = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
     co_owner_ids = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False)
+    quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False, index=True)
+    # Due time of the first occurrence not yet materialized; NULL for tasks that don't recur.
+    next_occurrence_at = Column(DateTime, nullable=True, index=True)
     owner = relationship("User", back_populates="tasks")
     comments = relationship("Comment", back_populates="task")
     story = relationship("Story", uselist=False, back_populates="task")
     history = relationship("TaskHistory", back_populates="task")
     quest_log = relationship("QuestLog", back_populates="tasks")
 
+def parse_user_ids(co_owner_ids):
+    """User ids from a comma-separated co_owner_ids value, skipping malformed entries."""
+    ids = []
+    for uid in (co_owner_ids or "").split(","):
+        try:
+            ids.append(int(uid.strip()))
+        except ValueError:
+            continue
+    return ids
+
 class Comment(Base):
     __tablename__ = "comments"
     id = Column(Integer, primary_key=True, index=True)
     content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     task = relationship("Task", back_populates="comments")
     owner = relationship("User", back_populates="comments")
 
 class Story(Base):
     __tablename__ = "stories"
+    __table_args__ = {"sqlite_autoincrement": True}  # Read by id watermark: see AUTOINCREMENT_TABLES.
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
     story_text = Column(Text)
     xp = Column(Integer)
@@ -139,8 +193,250 @@ class Story(Base):
 
 class TaskHistory(Base):
     __tablename__ = "task_history"
+    __table_args__ = {"sqlite_autoincrement": True}  # Read by id watermark: see AUTOINCREMENT_TABLES.
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
     status = Column(String, nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     task = relationship("Task", back_populates="history")
+
+class TaskOccurrence(Base):
+    """
+    One due time of a recurring task, materialized ahead of time by backend/recurrence.py.
+    `missed` counts the earlier due times it stands in for after downtime.
+    """
+    __tablename__ = "task_occurrences"
+    __table_args__ = (
+        UniqueConstraint("task_id", "due_at", name="uq_task_occurrences_task_due"),
+        # Occurrences that have come due, oldest first.
+        Index("ix_task_occurrences_due", "status", "due_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
+    due_at = Column(DateTime, nullable=False, index=True)  # Due-date reminders (backend/notifications.py).
+    status = Column(String, nullable=False, default="scheduled")  # "scheduled", "reopened" or "merged"
+    missed = Column(Integer, nullable=False, default=0)
+    processed_at = Column(DateTime, nullable=True)
+
+class Notification(Base):
+    """
+    A notification for one user (backend/notifications.py): the outbox of the delivery
+    sinks and, as is, the user's in-app feed. dedupe_key makes each one unique per event.
+    """
+    __tablename__ = "notifications"
+    __table_args__ = (
+        # The in-app feed, newest first.
+        Index("ix_notifications_user", "user_id", "id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    task_id = Column(Integer, nullable=True)  # No foreign key: notifications outlive their task.
+    kind = Column(String, nullable=False)  # "task_due"
+    dedupe_key = Column(String, nullable=False, unique=True)
+    message = Column(Text, nullable=False)
+    due_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    read_at = Column(DateTime, nullable=True)
+
+class NotificationDelivery(Base):
+    """Delivery of a notification through one external sink (webhook, email), with its retries."""
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        # The outbox in digest order: pending deliveries by sink, then user.
+        Index("ix_notification_deliveries_pending", "status", "sink", "user_id", "id"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    notification_id = Column(Integer, ForeignKey("notifications.id"), nullable=False, index=True)
+    user_id = Column(Integer, nullable=False)
+    sink = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # "pending", "sent" or "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    error = Column(Text, nullable=True)
+
+class WebhookSubscription(Base):
+    """An endpoint notified of a quest log's events (backend/webhooks.py)."""
+    __tablename__ = "webhook_subscriptions"
+    id = Column(Integer, primary_key=True, index=True)
+    quest_log_id = Column(Integer, ForeignKey("quest_logs.id"), nullable=False, index=True)
+    url = Column(String, nullable=False)
+    events = Column(Text, nullable=False, default="*")  # Comma-separated event names, or "*" for all.
+    secret = Column(String, nullable=True)  # Signs each body (X-TaskFable-Signature) when set.
+    created_by = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class WebhookDelivery(Base):
+    """
+    One event for one subscription: the durable outbox of the webhook worker. Rows are written
+    in the same transaction as the change they report, and sent later.
+    """
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        # Deliveries ready to be sent or retried, oldest first.
+        Index("ix_webhook_deliveries_due", "status", "next_attempt_at"),
+    )
+    id = Column(Integer, primary_key=True, index=True)
+    subscription_id = Column(Integer, ForeignKey("webhook_subscriptions.id"), nullable=False, index=True)
+    event = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # The JSON body, as sent.
+    status = Column(String, nullable=False, default="pending")  # "pending", "sent" or "failed"
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    response_status = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
+
+class QuestLogDeletion(Base):
+    """
+    A quest log deletion job, run in chunks by backend/deletion.py.
+    No foreign key to quest_logs: the job outlives the quest log it deletes.
+    """
+    __tablename__ = "quest_log_deletions"
+    id = Column(Integer, primary_key=True, index=True)
+    quest_log_id = Column(Integer, nullable=False, index=True)
+    requested_by = Column(String, nullable=True)
+    status = Column(String, nullable=False, default="pending")  # "pending", "running", "done" or "failed"
+    step = Column(String, nullable=True)  # Table currently being deleted from.
+    rows_deleted = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)  # Heartbeat, refreshed after every chunk.
+    finished_at = Column(DateTime, nullable=True)
+
+class Lease(Base):
+    """A named lease held by one process until expires_at, e.g. the scheduler's leadership (backend/cluster.py)."""
+    __tablename__ = "leases"
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+class CacheInvalidation(Base):
+    """
+    A cache entry invalidated by one worker, replayed by the others (backend/cluster.py).
+    AUTOINCREMENT, so ids keep growing after old rows are pruned: workers read by last id seen.
+    """
+    __tablename__ = "cache_invalidations"
+    __table_args__ = {"sqlite_autoincrement": True}
+    id = Column(Integer, primary_key=True)
+    cache = Column(String, nullable=False)
+    key = Column(Text, nullable=False)  # The cache key, as JSON.
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+def add_missing_columns(bind):
+    """Add nullable columns that a model gained after its table was created."""
+    inspector = inspect(bind)
+    existing = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present or not column.nullable or column.primary_key:
+                continue
+            column_type = column.type.compile(dialect=bind.dialect)
+            with bind.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+# Tables whose ids must never be reused: the rollups (backend/rollups.py) read them by id
+# watermark, so a row that took the id of a deleted newer row would never be counted.
+AUTOINCREMENT_TABLES = ("ql_activities", "stories", "task_history")
+
+def enable_autoincrement(bind):
+    """
+    Rebuild SQLite tables of AUTOINCREMENT_TABLES created without AUTOINCREMENT (which ALTER
+    can't add). Their id sequence starts past every rollup watermark, so ids freed before the
+    rebuild are not handed out again below one.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        for name in AUTOINCREMENT_TABLES:
+            sql = conn.scalar(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name})
+            if sql is None or "AUTOINCREMENT" in sql.upper():
+                continue
+            table = Base.metadata.tables[name]
+            columns = ", ".join(column.name for column in table.columns)
+            create = str(CreateTable(table).compile(dialect=bind.dialect))
+            conn.execute(text(create.replace(f"CREATE TABLE {name} ", f"CREATE TABLE {name}_rebuilt ", 1)))
+            conn.execute(text(f"INSERT INTO {name}_rebuilt ({columns}) SELECT {columns} FROM {name}"))
+            # Dropping the table drops its indexes and search triggers; ensure_schema() recreates them.
+            conn.execute(text(f"DROP TABLE {name}"))
+            conn.execute(text(f"ALTER TABLE {name}_rebuilt RENAME TO {name}"))
+            floor = max(
+                conn.scalar(text(f"SELECT MAX(id) FROM {name}")) or 0,
+                conn.scalar(text("SELECT MAX(last_id) FROM rollup_watermarks")) or 0,
+            )
+            conn.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": name})
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": name, "seq": floor})
+
+def ensure_schema(bind):
+    """
+    Create missing tables, missing nullable columns, missing indexes on tables that already
+    exist, and the full-text search index (backend/search.py).
+    """
+    Base.metadata.create_all(bind=bind)
+    add_missing_columns(bind)
+    enable_autoincrement(bind)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    from .search import ensure_search_index  # search.py imports the models.
+    ensure_search_index(bind)
+
+# Analytics rollups
+class RollupWatermark(Base):
+    """Highest source row id already folded into a rollup table."""
+    __tablename__ = "rollup_watermarks"
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class TaskFlowDaily(Base):
+    """Per quest log, task owner and UTC day counts of task flow events, built from task_history."""
+    __tablename__ = "task_flow_daily"
+    __table_args__ = (UniqueConstraint("quest_log_id", "user_id", "day", name="uq_task_flow_daily"),)
+    id = Column(Integer, primary_key=True, index=True)
+    quest_log_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    created = Column(Integer, nullable=False, default=0)
+    started = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+    wip_delta = Column(Integer, nullable=False, default=0)
+    cycle_seconds = Column(Float, nullable=False, default=0.0)  # Sum over completions, start -> Done.
+    lead_seconds = Column(Float, nullable=False, default=0.0)   # Sum over completions, request -> Done.
+
+class UserXPDaily(Base):
+    """XP/currency earned per user and UTC day from task completions."""
+    __tablename__ = "user_xp_daily"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_user_xp_daily"),)
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    completions = Column(Integer, nullable=False, default=0)
+    xp = Column(Integer, nullable=False, default=0)
+    currency = Column(Integer, nullable=False, default=0)
+
+class QLActivityDaily(Base):
+    """Activity counts per quest log, UTC day and action."""
+    __tablename__ = "ql_activity_daily"
+    __table_args__ = (UniqueConstraint("quest_log_id", "day", "action", name="uq_ql_activity_daily"),)
+    id = Column(Integer, primary_key=True, index=True)
+    quest_log_id = Column(Integer, nullable=False, index=True)
+    day = Column(Date, nullable=False, index=True)
+    action = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+class StoryDaily(Base):
+    """Stories generated per quest log, story owner and UTC day."""
+    __tablename__ = "story_daily"
+    __table_args__ = (UniqueConstraint("quest_log_id", "user_id", "day", name="uq_story_daily"),)
+    id = Column(Integer, primary_key=True, index=True)
+    quest_log_id = Column(Integer, nullable=False, index=True)
+    user_id = Column(Integer, nullable=True, index=True)
+    day = Column(Date, nullable=False, index=True)
+    stories = Column(Integer, nullable=False, default=0)
+    xp = Column(Integer, nullable=False, default=0)
+    currency = Column(Integer, nullable=False, default=0)
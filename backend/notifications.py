@@ -0,0 +1,265 @@
+"""
+backend/notifications.py
+------------------------
+Due-date reminders.
+  - enqueue_due() finds the tasks coming due within REMINDER_LEAD_MINUTES: one-off tasks by
+    their scheduled_time and recurring tasks by their next occurrences (backend/recurrence.py),
+    both read through due-time indexes. Due times already passed by less than
+    CATCH_UP_HOURS are still reminded of after downtime. The owner and co-owners of every such
+    task get a Notification, with the due time written in their own timezone. Each notification
+    is written once (dedupe_key: task, due time and user), so passes can overlap freely.
+  - Notifications are the user's in-app feed (GET /users/{username}/notifications) as soon
+    as they are written. For every external sink in NOTIFY_SINKS they also get a
+    NotificationDelivery row: the outbox.
+  - deliver_pending() sends the outbox, coalesced into one digest per user and sink, so a
+    morning spike of thousands of due tasks costs one message per user. A failed digest is
+    retried with exponential backoff, up to MAX_ATTEMPTS times.
+Sinks: "webhook" POSTs each digest as JSON to TASKFABLE_NOTIFY_WEBHOOK_URL; "email" sends it
+through the SMTP server at TASKFABLE_SMTP_HOST:TASKFABLE_SMTP_PORT (a local stub such as
+`python -m aiosmtpd -n -l localhost:8025` works for development). More can be added
+with register_sink().
+Everything runs in batches of BATCH_SIZE rows with set-based reads and bulk writes. The
+scheduler runs it every minute (send_notifications).
+
+Usage (from the project root), to run one pass by hand:
+    python -m backend.notifications
+"""
+
+import json
+import os
+import re
+import smtplib
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from typing import Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import insert, or_, select, tuple_, union_all, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, engine
+from .models import (
+    Notification, NotificationDelivery, QuestLog, Task, TaskOccurrence, TaskStatus, User, ensure_schema, parse_user_ids
+)
+from . import logging_config
+
+REMINDER_LEAD_MINUTES = int(os.getenv("TASKFABLE_REMINDER_LEAD_MINUTES", "60"))
+CATCH_UP_HOURS = int(os.getenv("TASKFABLE_REMINDER_CATCH_UP_HOURS", "12"))
+NOTIFY_SINKS = [name.strip() for name in os.getenv("TASKFABLE_NOTIFY_SINKS", "").split(",") if name.strip()]
+WEBHOOK_URL = os.getenv("TASKFABLE_NOTIFY_WEBHOOK_URL", "")
+SMTP_HOST = os.getenv("TASKFABLE_SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("TASKFABLE_SMTP_PORT", "8025"))
+SMTP_SENDER = os.getenv("TASKFABLE_SMTP_SENDER", "taskfable@localhost")
+BATCH_SIZE = 1000
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+SINK_TIMEOUT_SECONDS = 10
+# Fixed-offset timezones, as offered by the settings page (frontend/src/config.js).
+FIXED_OFFSET = re.compile(r"^UTC([+-])(\d{2}):(\d{2})$")
+
+class WebhookSink:
+    """POSTs {"username", "notifications": [...]} to one URL; any non-2xx answer is a failure."""
+    name = "webhook"
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or WEBHOOK_URL
+
+    def deliver(self, user, items: List[dict]) -> None:
+        if not self.url:
+            raise RuntimeError("TASKFABLE_NOTIFY_WEBHOOK_URL is not set")
+        body = json.dumps({"username": user.username, "notifications": items}, default=str).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=SINK_TIMEOUT_SECONDS):
+            pass  # urlopen raises on 4xx/5xx.
+
+class EmailSink:
+    """One plain-text email per digest, to the user's address."""
+    name = "email"
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None):
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+
+    def deliver(self, user, items: List[dict]) -> None:
+        message = EmailMessage()
+        message["From"] = SMTP_SENDER
+        message["To"] = user.email
+        message["Subject"] = f"TaskFable: {len(items)} task(s) coming due" if len(items) > 1 else items[0]["message"]
+        message.set_content("\n".join(f"- {item['message']}" for item in items))
+        with smtplib.SMTP(self.host, self.port, timeout=SINK_TIMEOUT_SECONDS) as smtp:
+            smtp.send_message(message)
+
+SINKS: Dict[str, Callable[[], object]] = {"webhook": WebhookSink, "email": EmailSink}
+
+def register_sink(name: str, factory: Callable[[], object]) -> None:
+    """Make a sink available to NOTIFY_SINKS. factory() returns an object with deliver(user, items)."""
+    SINKS[name] = factory
+
+def _zone(name: Optional[str]):
+    """
+    (tzinfo, label) of a user's timezone: a fixed offset such as "UTC+05:00" (what the
+    settings page offers) or an IANA name; UTC when it is neither.
+    """
+    match = FIXED_OFFSET.match(name or "")
+    if match:
+        sign = 1 if match.group(1) == "+" else -1
+        try:
+            return timezone(sign * timedelta(hours=int(match.group(2)), minutes=int(match.group(3)))), name
+        except ValueError:
+            pass  # Offset of a day or more.
+    else:
+        try:
+            zone = ZoneInfo(name or "UTC")
+            return zone, zone.key
+        except (KeyError, ValueError):
+            pass
+    return ZoneInfo("UTC"), "UTC"
+
+def local_time(due_at: datetime, timezone_name: Optional[str]) -> str:
+    """A naive UTC due time in the user's timezone, e.g. "2026-10-19 09:30 (Europe/Paris)"."""
+    zone, label = _zone(timezone_name)
+    return f"{due_at.replace(tzinfo=ZoneInfo('UTC')).astimezone(zone):%Y-%m-%d %H:%M} ({label})"
+
+def due_soon(now: datetime, lead_minutes: int = REMINDER_LEAD_MINUTES, catch_up_hours: int = CATCH_UP_HOURS):
+    """
+    (task_id, due_at, title, owner_id, co_owner_ids) of the open due times in the reminder
+    window: one-off tasks by scheduled_time, recurring tasks by their occurrences (already
+    processed ones too, so a reopening during downtime is still reminded of).
+    """
+    start, end = now - timedelta(hours=catch_up_hours), now + timedelta(minutes=lead_minutes)
+    live = QuestLog.deleted_at.is_(None)
+    one_off = (
+        select(Task.id.label("task_id"), Task.scheduled_time.label("due_at"), Task.title, Task.owner_id, Task.co_owner_ids)
+        .join(QuestLog, QuestLog.id == Task.quest_log_id)
+        .where(Task.scheduled_time > start, Task.scheduled_time <= end, live,
+               or_(Task.repeat_interval.is_(None), Task.repeat_interval <= 0), Task.status != TaskStatus.done)
+    )
+    recurring = (
+        select(Task.id, TaskOccurrence.due_at, Task.title, Task.owner_id, Task.co_owner_ids)
+        .join(Task, Task.id == TaskOccurrence.task_id)
+        .join(QuestLog, QuestLog.id == Task.quest_log_id)
+        .where(TaskOccurrence.due_at > start, TaskOccurrence.due_at <= end, live)
+    )
+    return union_all(one_off, recurring)
+
+def dedupe_key(task_id: int, due_at: datetime, user_id: int) -> str:
+    return f"task_due:{task_id}:{due_at.isoformat()}:{user_id}"
+
+def enqueue_due(db: Session, now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> int:
+    """Write notifications (and their deliveries) for the due times in the window. Returns notifications written."""
+    now = now or datetime.utcnow()
+    due = db.execute(due_soon(now)).all()
+    written = 0
+    for start in range(0, len(due), batch_size):
+        batch = due[start:start + batch_size]
+        wanted = {}
+        for task_id, due_at, title, owner_id, co_owner_ids in batch:
+            recipients = {owner_id, *parse_user_ids(co_owner_ids)}
+            for user_id in recipients - {None}:
+                wanted[dedupe_key(task_id, due_at, user_id)] = (user_id, task_id, due_at, title)
+        existing = set(db.scalars(select(Notification.dedupe_key).where(Notification.dedupe_key.in_(list(wanted)))))
+        new = {key: value for key, value in wanted.items() if key not in existing}
+        if not new:
+            continue
+        zones = dict(db.execute(select(User.id, User.timezone).where(User.id.in_({v[0] for v in new.values()}))).all())
+        rows = [
+            {"user_id": user_id, "task_id": task_id, "kind": "task_due", "dedupe_key": key, "due_at": due_at,
+             "created_at": now,
+             "message": f"'{title}' {'was' if due_at <= now else 'is'} due {local_time(due_at, zones.get(user_id))}"}
+            for key, (user_id, task_id, due_at, title) in new.items() if user_id in zones
+        ]
+        if not rows:
+            continue
+        created = db.execute(insert(Notification).returning(Notification.id, Notification.user_id), rows).all()
+        if NOTIFY_SINKS:
+            db.execute(insert(NotificationDelivery), [
+                {"notification_id": notification_id, "user_id": user_id, "sink": sink, "status": "pending",
+                 "attempts": 0, "next_attempt_at": now}
+                for notification_id, user_id in created for sink in NOTIFY_SINKS
+            ])
+        db.commit()
+        written += len(created)
+    if written:
+        logging_config.backend_logger.info(f"Queued {written} due-date notification(s).")
+    return written
+
+def deliver_pending(db: Session, now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Send pending deliveries as one digest per user and sink. The outbox is read in (sink,
+    user) order, batch_size rows at a time, so a user's digest is only split when it holds
+    more than batch_size notifications. Returns digests sent.
+    """
+    now = now or datetime.utcnow()
+    sent, last = 0, ("", 0, 0)
+    sinks = {}
+    while True:
+        rows = db.execute(
+            select(NotificationDelivery.id, NotificationDelivery.sink, NotificationDelivery.attempts,
+                   NotificationDelivery.user_id, Notification.id.label("notification_id"), Notification.task_id,
+                   Notification.message, Notification.due_at)
+            .join(Notification, Notification.id == NotificationDelivery.notification_id)
+            .where(NotificationDelivery.status == "pending", NotificationDelivery.next_attempt_at <= now,
+                   tuple_(NotificationDelivery.sink, NotificationDelivery.user_id, NotificationDelivery.id) > last)
+            .order_by(NotificationDelivery.sink, NotificationDelivery.user_id, NotificationDelivery.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return sent
+        last = (rows[-1].sink, rows[-1].user_id, rows[-1].id)
+        users = {user.id: user for user in db.execute(
+            select(User.id, User.username, User.email).where(User.id.in_({row.user_id for row in rows}))
+        )}
+        digests = defaultdict(list)
+        for row in rows:
+            digests[row.sink, row.user_id].append(row)
+        delivered, failed = [], []
+        for (sink_name, user_id), items in digests.items():
+            try:
+                if sink_name not in sinks:
+                    sinks[sink_name] = SINKS[sink_name]()
+                sinks[sink_name].deliver(users[user_id], [
+                    {"notification_id": item.notification_id, "task_id": item.task_id,
+                     "message": item.message, "due_at": item.due_at.isoformat() if item.due_at else None}
+                    for item in items
+                ])
+            except Exception as e:
+                failed.extend((item, f"{type(e).__name__}: {e}") for item in items)
+                logging_config.backend_logger.warning(f"Notification digest via '{sink_name}' for user {user_id} failed: {e}")
+                continue
+            delivered.extend(item.id for item in items)
+            sent += 1
+        if delivered:
+            db.execute(update(NotificationDelivery).where(NotificationDelivery.id.in_(delivered))
+                       .values(status="sent", sent_at=now, attempts=NotificationDelivery.attempts + 1)
+                       .execution_options(synchronize_session=False))
+        _record_failures(db, failed, now)
+        db.commit()
+
+def _record_failures(db: Session, failed, now: datetime) -> None:
+    """Schedule the retry of failed deliveries (exponential backoff), or give up after MAX_ATTEMPTS."""
+    groups = defaultdict(list)
+    for item, error in failed:
+        groups[item.attempts + 1, error[:500]].append(item.id)
+    for (attempts, error), ids in groups.items():
+        values = {"attempts": attempts, "error": error}
+        if attempts >= MAX_ATTEMPTS:
+            values["status"] = "failed"
+        else:
+            values["next_attempt_at"] = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+        db.execute(update(NotificationDelivery).where(NotificationDelivery.id.in_(ids)).values(**values)
+                   .execution_options(synchronize_session=False))
+
+def send_notifications(db: Session, now: Optional[datetime] = None) -> dict:
+    """One scheduler pass: queue what is coming due, then send the outbox."""
+    now = now or datetime.utcnow()
+    return {"queued": enqueue_due(db, now), "digests": deliver_pending(db, now)}
+
+if __name__ == "__main__":
+    ensure_schema(engine)
+    session = SessionLocal()
+    try:
+        print(send_notifications(session))
+    finally:
+        session.close()
@@ -0,0 +1,159 @@
+"""
+backend/profiling.py
+--------------------
+Opt-in sampling profiler for single requests.
+A profiled request gets a background thread that samples every thread's stack
+(sys._current_frames) every PROFILE_INTERVAL_MS and keeps the stacks running the request's
+endpoint, from the endpoint frame down. The result is written to logs/profiles as either
+  - collapsed stacks ("frame;frame;frame count" lines, for flamegraph.pl / speedscope), or
+  - speedscope JSON (https://www.speedscope.app).
+A request is profiled when it carries an X-Profile header or a __profile query parameter
+(value "collapsed" or "speedscope", anything else means the default format), or at random
+with probability TASKFABLE_PROFILE_SAMPLE_RATE, so it can stay on at a low rate in
+production. Concurrent requests to the same endpoint land in each other's profiles.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+PROFILE_DIR = os.getenv("TASKFABLE_PROFILE_DIR", "logs/profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("TASKFABLE_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("TASKFABLE_PROFILE_INTERVAL_MS", "5"))
+PROFILE_FORMAT = os.getenv("TASKFABLE_PROFILE_FORMAT", "collapsed")
+# Oldest profiles beyond this count are deleted when a new one is written.
+PROFILE_KEEP = int(os.getenv("TASKFABLE_PROFILE_KEEP", "200"))
+
+FORMATS = {"collapsed": ".collapsed.txt", "speedscope": ".speedscope.json"}
+
+def requested_format(headers, query_params) -> Optional[str]:
+    """The profile format asked for by this request, or None if it should not be profiled."""
+    flag = headers.get("x-profile")
+    if flag is None:
+        flag = query_params.get("__profile")
+    if flag is None:
+        if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            return PROFILE_FORMAT
+        return None
+    return flag if flag in FORMATS else PROFILE_FORMAT
+
+def _frame_label(code) -> str:
+    filename = os.path.relpath(code.co_filename) if code.co_filename.startswith(os.getcwd()) else code.co_filename
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({filename}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples, on a background thread, the stacks that pass through the code object returned
+    by `target()` (read on every sample, since the endpoint is only known once routing has run).
+    """
+    def __init__(self, target, interval_ms: float = None, fmt: str = PROFILE_FORMAT):
+        self.target = target
+        self.format = fmt
+        self.interval = (interval_ms or PROFILE_INTERVAL_MS) / 1000.0
+        self.samples = Counter()
+        self.started = self.stopped = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _run(self):
+        own_thread = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            code = self.target()
+            if code is None:
+                continue
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    if frame.f_code is code:
+                        self.samples[tuple(reversed(stack))] += 1
+                        break
+                    frame = frame.f_back
+
+    def collapsed(self) -> str:
+        lines = (";".join(_frame_label(c) for c in stack) + f" {count}" for stack, count in self.samples.most_common())
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self, name: str) -> dict:
+        frames, index = [], {}
+        samples, weights = [], []
+        for stack, count in self.samples.most_common():
+            sample = []
+            for code in stack:
+                if code not in index:
+                    index[code] = len(frames)
+                    frames.append({"name": getattr(code, "co_qualname", code.co_name),
+                                   "file": code.co_filename, "line": code.co_firstlineno})
+                sample.append(index[code])
+            samples.append(sample)
+            weights.append(count * self.interval * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled", "name": name, "unit": "milliseconds",
+                "startValue": 0, "endValue": sum(weights),
+                "samples": samples, "weights": weights,
+            }],
+            "name": name,
+            "exporter": "taskfable",
+        }
+
+def endpoint_code(scope):
+    """Code object of the endpoint matched for an ASGI scope (None until routing has run)."""
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__code__", None)
+
+def start_request_profile(scope, fmt: str) -> SamplingProfiler:
+    return SamplingProfiler(lambda: endpoint_code(scope), fmt=fmt).start()
+
+def save_profile(profiler: SamplingProfiler, method: str, route: str, request_id: str) -> str:
+    """Stop the profiler, write its profile to PROFILE_DIR and return the file name."""
+    profiler.stop()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = "".join(ch if ch.isalnum() else "_" for ch in route).strip("_") or "root"
+    # The request id may come from a client header; keep only filename-safe characters.
+    safe_id = "".join(ch for ch in request_id if ch.isalnum() or ch in "-_")[:64]
+    filename = f"{datetime.utcnow():%Y%m%dT%H%M%S}_{method}_{slug}_{safe_id}{FORMATS[profiler.format]}"
+    name = f"{method} {route} ({request_id}, {(profiler.stopped - profiler.started) * 1000:.1f} ms)"
+    with open(os.path.join(PROFILE_DIR, filename), "w", encoding="utf-8") as f:
+        if profiler.format == "speedscope":
+            json.dump(profiler.speedscope(name), f)
+        else:
+            f.write(profiler.collapsed())
+    prune_profiles()
+    return filename
+
+def list_profiles():
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(tuple(FORMATS.values())):
+            stat = os.stat(os.path.join(PROFILE_DIR, name))
+            entries.append({"filename": name, "size": stat.st_size,
+                            "modified": datetime.utcfromtimestamp(stat.st_mtime).isoformat()})
+    return sorted(entries, key=lambda e: (e["modified"], e["filename"]), reverse=True)
+
+def prune_profiles():
+    for entry in list_profiles()[PROFILE_KEEP:]:
+        os.remove(os.path.join(PROFILE_DIR, entry["filename"]))
@@ -0,0 +1,190 @@
+"""
+backend/recurrence.py
+---------------------
+Recurring tasks.
+A task recurs when it has a repeat_interval, in seconds (at least MIN_REPEAT_INTERVAL): its
+occurrences are due at scheduled_time, scheduled_time + repeat_interval, and so on (from
+created_at + repeat_interval when it has no scheduled_time).
+
+  - materialize() writes each recurring task's occurrences up to RECURRENCE_HORIZON_HOURS
+    ahead into task_occurrences (at most MAX_AHEAD per task and pass). tasks.next_occurrence_at
+    marks how far a task has been materialized, so a pass only reads the tasks that have
+    something to add, through the index on that column.
+  - open_due() processes the occurrences that have come due, oldest first: a Done task is
+    reopened (To-Do, unlocked, a "To-Do" row in its history, so its next completion is
+    rewarded again); a task still open simply carries on.
+  - After downtime, the due times that were missed collapse into one occurrence (the latest
+    one; `missed` counts the others), so catching up is a single batched pass however long
+    the scheduler was away.
+  - prune_occurrences() deletes processed occurrences older than OCCURRENCE_RETENTION_DAYS;
+    the reopenings stay in task_history.
+All three work in batches of BATCH_SIZE tasks or occurrences, one set-based statement per
+step, committing after every batch. The scheduler runs them every minute (run_recurrence).
+
+Usage (from the project root), to run one pass by hand:
+    python -m backend.recurrence
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, engine
+from .models import QuestLog, Task, TaskHistory, TaskOccurrence, TaskStatus, ensure_schema
+from . import logging_config
+
+RECURRENCE_HORIZON_HOURS = int(os.getenv("TASKFABLE_RECURRENCE_HORIZON_HOURS", "168"))
+OCCURRENCE_RETENTION_DAYS = int(os.getenv("TASKFABLE_OCCURRENCE_RETENTION_DAYS", "30"))
+MAX_AHEAD = 50
+BATCH_SIZE = 1000
+MIN_REPEAT_INTERVAL = 60
+
+def _utc_naive(value: datetime) -> datetime:
+    # Timestamps are stored as naive UTC (datetime.utcnow()).
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+def first_due(scheduled_time: Optional[datetime], created_at: datetime, repeat_interval: Optional[int]) -> Optional[datetime]:
+    """Due time of a task's first occurrence, or None if it does not recur."""
+    if not repeat_interval:
+        return None
+    if scheduled_time is not None:
+        return _utc_naive(scheduled_time)
+    return _utc_naive(created_at) + timedelta(seconds=repeat_interval)
+
+def _prime(db: Session) -> None:
+    """Set next_occurrence_at on recurring tasks that have none yet (tasks created before the engine)."""
+    rows = db.execute(
+        select(Task.id, Task.scheduled_time, Task.created_at, Task.repeat_interval)
+        .where(Task.repeat_interval > 0, Task.next_occurrence_at.is_(None))
+    ).all()
+    if rows:
+        db.execute(update(Task), [
+            {"id": task_id, "next_occurrence_at": first_due(scheduled, created or datetime.utcnow(), interval)}
+            for task_id, scheduled, created, interval in rows
+        ])
+        db.commit()
+
+def materialize(db: Session, now: Optional[datetime] = None, horizon_hours: int = RECURRENCE_HORIZON_HOURS,
+                batch_size: int = BATCH_SIZE) -> int:
+    """Write the occurrences of every recurring task on a live quest log up to the horizon. Returns rows written."""
+    now = now or datetime.utcnow()
+    horizon = now + timedelta(hours=horizon_hours)
+    _prime(db)
+    written, last_id = 0, 0
+    while True:
+        tasks = db.execute(
+            select(Task.id, Task.next_occurrence_at, Task.repeat_interval)
+            .join(QuestLog, QuestLog.id == Task.quest_log_id)
+            .where(Task.next_occurrence_at <= horizon, Task.repeat_interval > 0, Task.id > last_id,
+                   QuestLog.deleted_at.is_(None))
+            .order_by(Task.id)
+            .limit(batch_size)
+        ).all()
+        if not tasks:
+            return written
+        occurrences, advanced = [], []
+        for task_id, due, interval in tasks:
+            step = timedelta(seconds=max(interval, MIN_REPEAT_INTERVAL))
+            missed = 0
+            if due < now:
+                # Downtime: skip to the latest due time that has passed; it stands in for the rest.
+                missed = int((now - due) / step)
+                due += missed * step
+            for _ in range(MAX_AHEAD):
+                if due > horizon:
+                    break
+                occurrences.append({"task_id": task_id, "due_at": due, "status": "scheduled", "missed": missed})
+                missed = 0
+                due += step
+            advanced.append({"id": task_id, "next_occurrence_at": due})
+        if occurrences:
+            db.execute(insert(TaskOccurrence), occurrences)
+        db.execute(update(Task), advanced)
+        db.commit()
+        written += len(occurrences)
+        last_id = tasks[-1].id
+
+def open_due(db: Session, now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> int:
+    """Process the occurrences that are due: reopen their tasks if Done. Returns the tasks reopened."""
+    now = now or datetime.utcnow()
+    reopened_total = 0
+    while True:
+        due = db.execute(
+            select(TaskOccurrence.id, TaskOccurrence.task_id, Task.status)
+            .join(Task, Task.id == TaskOccurrence.task_id)
+            .where(TaskOccurrence.status == "scheduled", TaskOccurrence.due_at <= now)
+            .order_by(TaskOccurrence.due_at)
+            .limit(batch_size)
+        ).all()
+        if not due:
+            return reopened_total
+        done = {task_id for _, task_id, status in due if status == TaskStatus.done}
+        reopened = set()
+        if done:
+            # Conditional on Done, so a task moved since the SELECT is left alone.
+            reopened = set(db.scalars(
+                update(Task)
+                .where(Task.id.in_(done), Task.status == TaskStatus.done)
+                .values(status=TaskStatus.todo, locked=False)
+                .returning(Task.id)
+                .execution_options(synchronize_session=False)
+            ))
+            if reopened:
+                db.execute(insert(TaskHistory), [
+                    {"task_id": task_id, "status": TaskStatus.todo.value, "timestamp": now} for task_id in reopened
+                ])
+        # Each reopened task is reopened by its oldest due occurrence; the others are merged into it.
+        reopening, merged, seen = [], [], set()
+        for occurrence_id, task_id, _ in due:
+            if task_id in reopened and task_id not in seen:
+                reopening.append(occurrence_id)
+                seen.add(task_id)
+            else:
+                merged.append(occurrence_id)
+        for status, ids in (("reopened", reopening), ("merged", merged)):
+            if ids:
+                db.execute(
+                    update(TaskOccurrence).where(TaskOccurrence.id.in_(ids)).values(status=status, processed_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+        db.commit()
+        reopened_total += len(reopened)
+        if reopened:
+            logging_config.backend_logger.info(f"Reopened {len(reopened)} recurring task(s).")
+
+def prune_occurrences(db: Session, now: Optional[datetime] = None, retention_days: int = OCCURRENCE_RETENTION_DAYS,
+                      batch_size: int = BATCH_SIZE) -> int:
+    """Delete processed occurrences older than retention_days (0 keeps them). Returns rows deleted."""
+    if not retention_days:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+    deleted = 0
+    while True:
+        ids = select(TaskOccurrence.id).where(
+            TaskOccurrence.status != "scheduled", TaskOccurrence.due_at < cutoff
+        ).limit(batch_size)
+        count = db.execute(delete(TaskOccurrence).where(TaskOccurrence.id.in_(ids))).rowcount
+        db.commit()
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+def run_recurrence(db: Session, now: Optional[datetime] = None) -> dict:
+    """One scheduler pass: materialize, open what is due, prune."""
+    now = now or datetime.utcnow()
+    return {
+        "materialized": materialize(db, now),
+        "reopened": open_due(db, now),
+        "pruned": prune_occurrences(db, now),
+    }
+
+if __name__ == "__main__":
+    ensure_schema(engine)
+    session = SessionLocal()
+    try:
+        print(run_recurrence(session))
+    finally:
+        session.close()
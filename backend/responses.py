@@ -0,0 +1,50 @@
+"""
+backend/responses.py
+--------------------
+FastJSONResponse: a JSON response for large payloads (boards, stories, activity feeds).
+Endpoints return it directly with plain dicts and lists, which skips FastAPI's response
+validation and jsonable_encoder pass. Bodies are encoded with orjson when it is installed,
+otherwise with the standard json module; both write datetimes as ISO 8601 (the same text
+jsonable_encoder produces), enums by value, and dataclasses (e.g. the slotted board
+views of routers/tasks.py) as objects.
+"""
+
+import json
+import enum
+import dataclasses
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        # Shallow, unlike dataclasses.asdict: nested values go through the encoder as usual.
+        return {f.name: getattr(value, f.name) for f in dataclasses.fields(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
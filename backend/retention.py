@@ -0,0 +1,223 @@
+"""
+backend/retention.py
+--------------------
+Retention, compaction and archive tiering for the append-only tables.
+  - ql_activities rows older than ACTIVITY_RETENTION_DAYS (and activities of deleted
+    quest logs) are moved to gzip-compressed JSON-lines archives, one file per month.
+  - task_history of finished tasks whose last transition is older than
+    HISTORY_RETENTION_DAYS is archived the same way (whole task histories only, so the
+    flow analytics never see a partial history).
+  - Consecutive duplicate states in task_history are compacted away.
+  - Dead quest log invites (revoked, used or expired) are marked archived in bulk by
+    sweep_invites(), which hides them from invite listings; archived invites older than
+    INVITE_RETENTION_DAYS are then moved out to the archive files.
+  - maintain_database() runs ANALYZE, and VACUUM once enough pages are free.
+Rows are only archived once every rollup fed by their table has folded them (id <= the
+lowest of those watermarks: task_flow_daily and user_xp_daily both read task_history), so
+the rollups keep counting them. Archived rows can't be folded again, though: a rollup rebuild
+(backend/rollups.py) replays only the rows left in the tables, and refuses to run once
+task_history or ql_activities has archives (see archived_tables()) unless forced.
+A retention setting of 0 disables that policy.
+
+Archives live under logs/archive/<table>/<YYYY-MM>.jsonl.gz; each run appends a new
+gzip member, which gzip readers treat as one continuous stream.
+
+Usage (from the project root):
+    python -m backend.retention
+"""
+
+import gzip
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import and_, delete, func, or_, select, text, update
+from sqlalchemy.orm import Session, aliased
+
+from .db import SessionLocal, engine
+from .models import QLActivity, QuestLog, QuestLogInvite, Task, TaskHistory, TaskStatus, ensure_schema
+from .analytics import TASK_FLOW_WATERMARK, get_watermark, advance_watermark
+from .rollups import ACTIVITY_WATERMARK, USER_XP_WATERMARK
+from . import logging_config
+
+ACTIVITY_RETENTION_DAYS = int(os.getenv("TASKFABLE_ACTIVITY_RETENTION_DAYS", "180"))
+HISTORY_RETENTION_DAYS = int(os.getenv("TASKFABLE_HISTORY_RETENTION_DAYS", "365"))
+INVITE_RETENTION_DAYS = int(os.getenv("TASKFABLE_INVITE_RETENTION_DAYS", "30"))
+ARCHIVE_DIR = os.getenv("TASKFABLE_ARCHIVE_DIR", "logs/archive")
+VACUUM_FREE_RATIO = float(os.getenv("TASKFABLE_VACUUM_FREE_RATIO", "0.2"))
+CHUNK_SIZE = 2000
+COMPACTION_WATERMARK = "task_history_compaction"
+
+HOT_TABLES = ["tasks", "task_history", "comments", "stories", "ql_activities", "quest_log_invites"]
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def archive_rows(table: str, rows: List[dict], timestamp_key: str = "timestamp") -> int:
+    """Append rows to logs/archive/<table>/<YYYY-MM>.jsonl.gz, grouped by the month of their timestamp."""
+    by_month = defaultdict(list)
+    for row in rows:
+        stamp = row.get(timestamp_key)
+        by_month[stamp.strftime("%Y-%m") if stamp else "undated"].append(row)
+    table_dir = os.path.join(ARCHIVE_DIR, table)
+    os.makedirs(table_dir, exist_ok=True)
+    for month, month_rows in by_month.items():
+        with gzip.open(os.path.join(table_dir, f"{month}.jsonl.gz"), "at", encoding="utf-8") as f:
+            for row in month_rows:
+                f.write(json.dumps({k: _serialize(v) for k, v in row.items()}) + "\n")
+    return len(rows)
+
+def archived_tables(tables=("task_history", "ql_activities")) -> List[str]:
+    """Those of `tables` with rows moved out to archive files."""
+    archived = []
+    for table in tables:
+        table_dir = os.path.join(ARCHIVE_DIR, table)
+        if os.path.isdir(table_dir) and any(name.endswith(".jsonl.gz") for name in os.listdir(table_dir)):
+            archived.append(table)
+    return archived
+
+def _archive_and_delete(db: Session, model, table: str, id_query, timestamp_key: str = "timestamp") -> int:
+    """Archive and delete the rows selected by `id_query` (a select of ids), CHUNK_SIZE at a time."""
+    columns = [c.name for c in model.__table__.columns]
+    total = 0
+    while True:
+        ids = [row[0] for row in db.execute(id_query.limit(CHUNK_SIZE))]
+        if not ids:
+            return total
+        rows = [dict(zip(columns, r)) for r in db.execute(
+            select(*[getattr(model, c) for c in columns]).where(model.id.in_(ids))
+        )]
+        archive_rows(table, rows, timestamp_key)
+        db.execute(delete(model).where(model.id.in_(ids)))
+        db.commit()
+        total += len(ids)
+
+def archive_activities(db: Session, now: datetime = None) -> int:
+    """Archive activities past retention, plus any activity whose quest log no longer exists."""
+    if ACTIVITY_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    watermark = get_watermark(db, ACTIVITY_WATERMARK)
+    orphaned = ~select(QuestLog.id).where(QuestLog.id == QLActivity.quest_log_id).exists()
+    id_query = select(QLActivity.id).where(
+        QLActivity.id <= watermark,
+        (QLActivity.timestamp < cutoff) | orphaned,
+    ).order_by(QLActivity.id.asc())
+    return _archive_and_delete(db, QLActivity, "ql_activities", id_query)
+
+def archive_task_history(db: Session, now: datetime = None) -> int:
+    """Archive complete histories of Done (or deleted) tasks whose last transition is past retention."""
+    if HISTORY_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=HISTORY_RETENTION_DAYS)
+    # Both task_flow_daily and user_xp_daily (Done rows) are fed from task_history.
+    watermark = min(get_watermark(db, TASK_FLOW_WATERMARK), get_watermark(db, USER_XP_WATERMARK))
+    live_unfinished = select(Task.id).where(Task.id == TaskHistory.task_id, Task.status != TaskStatus.done).exists()
+    finished_tasks = select(TaskHistory.task_id).where(~live_unfinished).group_by(TaskHistory.task_id).having(
+        func.max(TaskHistory.timestamp) < cutoff, func.max(TaskHistory.id) <= watermark
+    )
+    id_query = select(TaskHistory.id).where(TaskHistory.task_id.in_(finished_tasks)).order_by(TaskHistory.id.asc())
+    return _archive_and_delete(db, TaskHistory, "task_history", id_query)
+
+def dead_invite_condition(now: datetime):
+    """
+    Invites that can no longer be accepted: revoked, used (single-use) or expired.
+    Never NULL (IS TRUE, explicit NULL check), so it can be negated safely.
+    """
+    return or_(
+        QuestLogInvite.revoked.is_(True),
+        QuestLogInvite.used.is_(True),
+        and_(QuestLogInvite.expires_at.isnot(None), QuestLogInvite.expires_at < now),
+    )
+
+def sweep_invites(db: Session, now: datetime = None) -> int:
+    """Mark every dead, not yet archived invite as archived in one UPDATE."""
+    now = now or datetime.utcnow()
+    result = db.execute(
+        update(QuestLogInvite)
+        .where(QuestLogInvite.archived_at.is_(None), dead_invite_condition(now))
+        .values(archived_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+def archive_invites(db: Session, now: datetime = None) -> int:
+    """Move invites archived more than INVITE_RETENTION_DAYS ago to the archive files."""
+    if INVITE_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=INVITE_RETENTION_DAYS)
+    id_query = select(QuestLogInvite.id).where(QuestLogInvite.archived_at < cutoff).order_by(QuestLogInvite.id.asc())
+    return _archive_and_delete(db, QuestLogInvite, "quest_log_invites", id_query, timestamp_key="created_at")
+
+def compact_task_history(db: Session) -> int:
+    """
+    Delete history rows that repeat the previous state of the same task.
+    Walks forward from its own watermark in CHUNK_SIZE id ranges, never past rows the
+    flow rollup has not folded yet.
+    """
+    limit = get_watermark(db, TASK_FLOW_WATERMARK)
+    earlier = aliased(TaskHistory)
+    previous_status = select(earlier.status).where(
+        earlier.task_id == TaskHistory.task_id, earlier.id < TaskHistory.id
+    ).order_by(earlier.id.desc()).limit(1).scalar_subquery()
+    total = 0
+    while True:
+        mark = get_watermark(db, COMPACTION_WATERMARK)
+        high = min(limit, mark + CHUNK_SIZE)
+        if high <= mark:
+            db.commit()
+            return total
+        duplicates = [row[0] for row in db.execute(
+            select(TaskHistory.id).where(
+                TaskHistory.id > mark, TaskHistory.id <= high, TaskHistory.status == previous_status
+            )
+        )]
+        if duplicates:
+            db.execute(delete(TaskHistory).where(TaskHistory.id.in_(duplicates)))
+        if not advance_watermark(db, COMPACTION_WATERMARK, mark, high):
+            db.rollback()
+            continue
+        db.commit()
+        total += len(duplicates)
+
+def apply_retention(db: Session) -> Dict[str, int]:
+    counts = {
+        "history_compacted": compact_task_history(db),
+        "history_archived": archive_task_history(db),
+        "activities_archived": archive_activities(db),
+        "invites_archived": archive_invites(db),
+    }
+    if any(counts.values()):
+        logging_config.backend_logger.info(f"Retention applied: {counts}")
+    return counts
+
+def maintain_database(db: Session):
+    """
+    Refresh planner statistics, and reclaim space once free pages pass VACUUM_FREE_RATIO.
+    Runs on its own autocommit connection, as VACUUM cannot run inside a transaction.
+    """
+    bind = db.get_bind()
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if bind.dialect.name == "sqlite":
+            page_count = conn.execute(text("PRAGMA page_count")).scalar() or 0
+            free_pages = conn.execute(text("PRAGMA freelist_count")).scalar() or 0
+            conn.execute(text("ANALYZE"))
+            if page_count and free_pages / page_count >= VACUUM_FREE_RATIO:
+                conn.execute(text("VACUUM"))
+                logging_config.backend_logger.info(f"VACUUM reclaimed {free_pages} of {page_count} pages.")
+        elif bind.dialect.name == "postgresql":
+            for table in HOT_TABLES:
+                conn.execute(text(f"VACUUM (ANALYZE) {table}"))
+    logging_config.backend_logger.info("Database maintenance complete.")
+
+if __name__ == "__main__":
+    ensure_schema(engine)
+    session = SessionLocal()
+    try:
+        print(apply_retention(session))
+        maintain_database(session)
+    finally:
+        session.close()
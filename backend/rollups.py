@@ -0,0 +1,213 @@
+"""
+backend/rollups.py
+------------------
+Pre-aggregated daily rollup tables and the jobs that maintain them.
+Every rollup is fed from a watermark on its source table's id, so a refresh only reads
+rows created since the previous one. The source tables use AUTOINCREMENT (AUTOINCREMENT_TABLES
+in backend/models.py), so a new row never reuses the id of a deleted one below the watermark.
+The scheduler calls refresh_all() periodically; analytics endpoints read the rollup tables
+only and never touch the raw tables.
+
+Rollups:
+  - task_flow_daily    <- task_history (see backend/analytics.py)
+  - user_xp_daily      <- Done rows in task_history, split between owner and commenters
+  - ql_activity_daily  <- ql_activities
+  - story_daily        <- stories
+
+A rebuild replays the source tables from scratch, so it can't recount rows that retention
+(backend/retention.py) has moved out to archive files: task_flow_daily, user_xp_daily and
+ql_activity_daily would lose them. rebuild_all() therefore refuses to run once task_history
+or ql_activities has archives, unless forced (--force), accepting that loss.
+
+Usage (from the project root):
+    python -m backend.rollups refresh
+    python -m backend.rollups rebuild --chunk-size 5000
+"""
+
+import argparse
+from collections import defaultdict
+from typing import Dict, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal, engine
+from .models import (
+    Task, TaskHistory, Comment, Story, QLActivity, RollupWatermark,
+    TaskFlowDaily, UserXPDaily, QLActivityDaily, StoryDaily, COMPLETION_XP, COMPLETION_CURRENCY, ensure_schema
+)
+from .analytics import get_watermark, advance_watermark, refresh_task_flow, TASK_FLOW_WATERMARK
+from . import logging_config
+
+USER_XP_WATERMARK = "user_xp_daily"
+ACTIVITY_WATERMARK = "ql_activity_daily"
+STORY_WATERMARK = "story_daily"
+DEFAULT_BATCH_SIZE = 5000
+
+def upsert_increment(db: Session, model, keys: dict, increments: dict):
+    """INSERT the row or add `increments` to it when `keys` already exist (SQLite/PostgreSQL)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(model).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: getattr(model, column) + getattr(stmt.excluded, column) for column in increments},
+    )
+    db.execute(stmt)
+
+def _fold_from_watermark(db: Session, name: str, load_batch, fold, model, batch_size: int) -> int:
+    """
+    Generic watermark loop: load rows with id > watermark (id first in each row), fold them
+    into {keys: increments}, upsert, and advance the watermark in the same transaction.
+    """
+    folded = 0
+    while True:
+        watermark = get_watermark(db, name)
+        rows = load_batch(db, watermark, batch_size)
+        if not rows:
+            db.commit()
+            return folded
+        high_id = rows[-1][0]
+        for keys, increments in fold(db, rows).items():
+            upsert_increment(db, model, dict(keys), increments)
+        if not advance_watermark(db, name, watermark, high_id):
+            db.rollback()
+            continue
+        db.commit()
+        folded += len(rows)
+
+# --- user_xp_daily ---------------------------------------------------------------
+
+def _load_completions(db: Session, watermark: int, batch_size: int):
+    return db.query(TaskHistory.id, TaskHistory.task_id, TaskHistory.timestamp)\
+        .filter(TaskHistory.id > watermark, TaskHistory.status == "Done")\
+        .order_by(TaskHistory.id.asc()).limit(batch_size).all()
+
+def _fold_completions(db: Session, rows) -> Dict[Tuple, Dict[str, int]]:
+    """Re-derive the completion award: the owner plus everyone who commented before Done."""
+    task_ids = {row.task_id for row in rows}
+    owners = dict(db.query(Task.id, Task.owner_id).filter(Task.id.in_(task_ids)).all())
+    comments = defaultdict(list)
+    for task_id, user_id, created_at in db.query(Comment.task_id, Comment.user_id, Comment.created_at)\
+            .filter(Comment.task_id.in_(task_ids), Comment.user_id.isnot(None)):
+        comments[task_id].append((user_id, created_at))
+    buckets = defaultdict(lambda: {"completions": 0, "xp": 0, "currency": 0})
+    for _, task_id, done_at in rows:
+        participants = {user_id for user_id, created_at in comments[task_id] if created_at <= done_at}
+        if owners.get(task_id) is not None:
+            participants.add(owners[task_id])
+        if not participants:
+            continue
+        xp_split = COMPLETION_XP // len(participants)
+        currency_split = COMPLETION_CURRENCY // len(participants)
+        for user_id in participants:
+            bucket = buckets[(("user_id", user_id), ("day", done_at.date()))]
+            bucket["completions"] += 1
+            bucket["xp"] += xp_split
+            bucket["currency"] += currency_split
+    return buckets
+
+def refresh_user_xp(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    return _fold_from_watermark(db, USER_XP_WATERMARK, _load_completions, _fold_completions, UserXPDaily, batch_size)
+
+# --- ql_activity_daily -----------------------------------------------------------
+
+def _load_activities(db: Session, watermark: int, batch_size: int):
+    return db.query(QLActivity.id, QLActivity.quest_log_id, QLActivity.action, QLActivity.timestamp)\
+        .filter(QLActivity.id > watermark)\
+        .order_by(QLActivity.id.asc()).limit(batch_size).all()
+
+def _fold_activities(db: Session, rows):
+    buckets = defaultdict(lambda: {"count": 0})
+    for _, quest_log_id, action, timestamp in rows:
+        buckets[(("quest_log_id", quest_log_id), ("day", timestamp.date()), ("action", action))]["count"] += 1
+    return buckets
+
+def refresh_activities(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    return _fold_from_watermark(db, ACTIVITY_WATERMARK, _load_activities, _fold_activities, QLActivityDaily, batch_size)
+
+# --- story_daily -----------------------------------------------------------------
+
+def _load_stories(db: Session, watermark: int, batch_size: int):
+    return db.query(Story.id, Task.quest_log_id, Story.owner_id, Story.created_at, Story.xp, Story.currency)\
+        .outerjoin(Task, Task.id == Story.task_id)\
+        .filter(Story.id > watermark)\
+        .order_by(Story.id.asc()).limit(batch_size).all()
+
+def _fold_stories(db: Session, rows):
+    buckets = defaultdict(lambda: {"stories": 0, "xp": 0, "currency": 0})
+    for _, quest_log_id, owner_id, created_at, xp, currency in rows:
+        if quest_log_id is None or created_at is None:
+            continue  # Story of a deleted task.
+        bucket = buckets[(("quest_log_id", quest_log_id), ("user_id", owner_id), ("day", created_at.date()))]
+        bucket["stories"] += 1
+        bucket["xp"] += xp or 0
+        bucket["currency"] += currency or 0
+    return buckets
+
+def refresh_stories(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    return _fold_from_watermark(db, STORY_WATERMARK, _load_stories, _fold_stories, StoryDaily, batch_size)
+
+# --- entry points ----------------------------------------------------------------
+
+ROLLUPS = [
+    (TASK_FLOW_WATERMARK, TaskFlowDaily, refresh_task_flow),
+    (USER_XP_WATERMARK, UserXPDaily, refresh_user_xp),
+    (ACTIVITY_WATERMARK, QLActivityDaily, refresh_activities),
+    (STORY_WATERMARK, StoryDaily, refresh_stories),
+]
+
+def refresh_all(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, int]:
+    """Bring every rollup up to date; returns the number of source rows folded per rollup."""
+    folded = {name: refresh(db, batch_size=batch_size) for name, _, refresh in ROLLUPS}
+    if any(folded.values()):
+        logging_config.backend_logger.info(f"Rollups refreshed: {folded}")
+    return folded
+
+def rebuild_all(db: Session, chunk_size: int = DEFAULT_BATCH_SIZE, force: bool = False) -> Dict[str, int]:
+    """
+    Empty every rollup, reset its watermark, then backfill in chunks of `chunk_size` source rows.
+    Safe to run next to the scheduler: the reset is one transaction and refreshers use
+    compare-and-set on the watermark.
+    Raises RuntimeError if source rows have been archived (they would drop out of the
+    rollups), unless `force` is set.
+    """
+    from .retention import archived_tables  # retention.py imports this module.
+    archived = archived_tables()
+    if archived:
+        message = f"Archived rows of {', '.join(archived)} are not in the tables and would drop out of the rollups."
+        if not force:
+            raise RuntimeError(f"{message} Rebuild with force=True (--force) to accept that.")
+        logging_config.backend_logger.warning(f"Forced rollup rebuild: {message}")
+    for name, model, _ in ROLLUPS:
+        db.execute(delete(model))
+        db.execute(update(RollupWatermark).where(RollupWatermark.name == name).values(last_id=0))
+    db.commit()
+    logging_config.backend_logger.info(f"Rollup tables cleared; backfilling in chunks of {chunk_size}.")
+    return refresh_all(db, batch_size=chunk_size)
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain TaskFable rollup tables.")
+    parser.add_argument("command", choices=["refresh", "rebuild"])
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--force", action="store_true", help="Rebuild even though source rows have been archived")
+    args = parser.parse_args()
+    ensure_schema(engine)
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            try:
+                folded = rebuild_all(db, chunk_size=args.chunk_size, force=args.force)
+            except RuntimeError as e:
+                parser.exit(1, f"{e}\n")
+        else:
+            folded = refresh_all(db, batch_size=args.chunk_size)
+        print(f"Folded source rows: {folded}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
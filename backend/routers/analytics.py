@@ -0,0 +1,100 @@
+"""
+Analytics Router
+----------------
+This router exposes task flow analytics (cycle time, lead time, throughput and WIP)
+per quest log and/or per user, plus daily XP, activity and story counts.
+Answers come from the daily rollup tables only; the scheduler keeps them current
+(see backend/rollups.py), so results may lag writes by one scheduler tick.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from typing import Optional
+
+from ..db import get_db
+from ..models import User
+from .. import analytics
+from .. import logging_config
+
+router = APIRouter()
+
+def resolve_filters(quest_log_id: Optional[int], username: Optional[str], db: Session):
+    if quest_log_id is None and username is None:
+        raise HTTPException(status_code=400, detail="Provide quest_log_id, username, or both")
+    user_id = None
+    if username is not None:
+        user = db.query(User).filter(User.username == username).first()
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        user_id = user.id
+    return quest_log_id, user_id
+
+def date_window(days: int):
+    end = datetime.utcnow().date()
+    return end - timedelta(days=days - 1), end
+
+@router.get("/flow", response_model=list)
+def get_flow(
+    quest_log_id: Optional[int] = None,
+    username: Optional[str] = None,
+    days: int = Query(30, ge=1, le=3660),
+    db: Session = Depends(get_db)
+):
+    """
+    Daily created/started/completed counts, average cycle and lead time (hours)
+    and end-of-day WIP for the last `days` days.
+    """
+    quest_log_id, user_id = resolve_filters(quest_log_id, username, db)
+    start, end = date_window(days)
+    series = analytics.daily_flow(db, start, end, quest_log_id, user_id)
+    logging_config.backend_logger.debug(f"Flow analytics for quest_log={quest_log_id} user={username} over {days} days.")
+    return series
+
+@router.get("/throughput", response_model=list)
+def get_throughput(
+    quest_log_id: Optional[int] = None,
+    username: Optional[str] = None,
+    period: str = Query("day", pattern="^(day|week)$"),
+    days: int = Query(90, ge=1, le=3660),
+    db: Session = Depends(get_db)
+):
+    """Completed tasks per day or per ISO week."""
+    quest_log_id, user_id = resolve_filters(quest_log_id, username, db)
+    start, end = date_window(days)
+    return analytics.throughput(analytics.daily_flow(db, start, end, quest_log_id, user_id), period)
+
+@router.get("/summary", response_model=dict)
+def get_summary(
+    quest_log_id: Optional[int] = None,
+    username: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """All-time totals, average cycle/lead time and current WIP."""
+    quest_log_id, user_id = resolve_filters(quest_log_id, username, db)
+    return analytics.flow_summary(db, quest_log_id, user_id)
+
+@router.get("/xp", response_model=list)
+def get_xp(username: str, days: int = Query(30, ge=1, le=3660), db: Session = Depends(get_db)):
+    """XP, currency and completions earned by a user per day."""
+    _, user_id = resolve_filters(None, username, db)
+    start, end = date_window(days)
+    return analytics.daily_xp(db, start, end, user_id)
+
+@router.get("/activity", response_model=list)
+def get_activity_counts(quest_log_id: int, days: int = Query(30, ge=1, le=3660), db: Session = Depends(get_db)):
+    """Quest log activity counts per day and action."""
+    start, end = date_window(days)
+    return analytics.daily_activity(db, start, end, quest_log_id)
+
+@router.get("/stories", response_model=list)
+def get_story_counts(
+    quest_log_id: Optional[int] = None,
+    username: Optional[str] = None,
+    days: int = Query(30, ge=1, le=3660),
+    db: Session = Depends(get_db)
+):
+    """Stories generated per day, with their XP and currency."""
+    quest_log_id, user_id = resolve_filters(quest_log_id, username, db)
+    start, end = date_window(days)
+    return analytics.daily_stories(db, start, end, quest_log_id, user_id)
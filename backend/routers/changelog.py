@@ -1,17 +1,54 @@
 # backend/routers/changelog.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
+from enum import Enum
+import html
+import json
 import os
 
+from ..content_cache import content_cache, cached_response
+
+try:
+    import markdown
+except ImportError:
+    markdown = None
+
 router = APIRouter()
 
+# Build an absolute path relative to this file.
+this_dir = os.path.dirname(os.path.abspath(__file__))
+# Move two levels up to the project root, then locate CHANGELOG.md.
+CHANGELOG_PATH = os.path.join(this_dir, "..", "..", "CHANGELOG.md")
+
+class ChangelogFormat(str, Enum):
+    json = "json"
+    markdown = "markdown"
+    html = "html"
+
+def render_json(raw: bytes) -> bytes:
+    return json.dumps(raw.decode("utf-8")).encode("utf-8")
+
+def render_html(raw: bytes) -> bytes:
+    """CHANGELOG.md as HTML; without the optional `markdown` package, as escaped preformatted text."""
+    text = raw.decode("utf-8")
+    if markdown is None:
+        return f"<pre>{html.escape(text)}</pre>".encode("utf-8")
+    return markdown.markdown(text).encode("utf-8")
+
+RENDERERS = {
+    ChangelogFormat.json: ("application/json", render_json),
+    ChangelogFormat.markdown: ("text/markdown; charset=utf-8", None),
+    ChangelogFormat.html: ("text/html; charset=utf-8", render_html),
+}
+
 @router.get("/changelog", response_model=str)
-def get_changelog():
-    # Build an absolute path relative to this file.
-    this_dir = os.path.dirname(os.path.abspath(__file__))
-    # Move two levels up to the project root, then locate CHANGELOG.md.
-    changelog_path = os.path.join(this_dir, "..", "..", "CHANGELOG.md")
-    if not os.path.exists(changelog_path):
+def get_changelog(request: Request, format: ChangelogFormat = Query(ChangelogFormat.json)):
+    """
+    CHANGELOG.md as a JSON string (default), raw markdown, or rendered HTML.
+    Served from the content cache, with ETag/Last-Modified revalidation.
+    """
+    media_type, render = RENDERERS[format]
+    try:
+        entry = content_cache.get(CHANGELOG_PATH, media_type, render, variant=format.value)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="CHANGELOG.md not found")
-    with open(changelog_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    return content
+    return cached_response(request, entry)
@@ -0,0 +1,60 @@
+"""
+Export Router
+-------------
+Streams tasks, task history and stories, of one quest log or of all those the user is a
+member of, as CSV, Arrow or Parquet for offline analysis. Private tasks of other users are
+masked as on their boards. Rows are read and sent in chunks (see
+backend/export.py), so exports of any size run in constant memory.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from enum import Enum
+from typing import Optional
+
+from ..db import get_db
+from ..models import QuestLog, User
+from .. import export
+from .. import logging_config
+from .tasks import live_membership
+
+router = APIRouter()
+
+class ExportTable(str, Enum):
+    tasks = "tasks"
+    task_history = "task_history"
+    stories = "stories"
+
+@router.get("/{table}")
+def export_table(
+    table: ExportTable,
+    username: str = Query(...),
+    format: str = Query("csv", pattern="^(csv|arrow|parquet)$"),
+    quest_log_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    The rows of `table` on every quest log `username` is a member of, or only on
+    `quest_log_id` (which they must be a member of), as they may see them (row order: see
+    export.export_query). Arrow and Parquet need pyarrow on the server (501 otherwise).
+    """
+    if not export.format_available(format):
+        raise HTTPException(status_code=501, detail=f"Exporting {format} needs the pyarrow package")
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if quest_log_id is not None:
+        if not db.query(QuestLog.id).filter(QuestLog.id == quest_log_id, QuestLog.deleted_at.is_(None)).first():
+            raise HTTPException(status_code=404, detail="Quest Log not found")
+        if not live_membership(db, quest_log_id, user.id):
+            logging_config.backend_logger.warning(f"User '{username}' attempted to export Quest Log {quest_log_id} they are not a member of.")
+            raise HTTPException(status_code=403, detail="User is not a member of the specified Quest Log")
+    scope = f"quest_log_{quest_log_id}" if quest_log_id is not None else "all"
+    filename = f"{table.value}_{scope}.{format}"
+    logging_config.backend_logger.info(f"Exporting {table.value} ({scope}) as {format} for '{username}'.")
+    return StreamingResponse(
+        export.stream_export(db.get_bind(), table.value, format, quest_log_id, viewer_id=user.id),
+        media_type=export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,95 +1,209 @@
-from fastapi import APIRouter, HTTPException, Body
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import APIRouter, HTTPException, Body, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, FileResponse
+import asyncio
 import os
+from enum import Enum
+from typing import List, Optional, Union
 from pydantic import BaseModel
 from sqlalchemy import text
 import json
 
+from .. import log_reader
+from .. import logging_config
+from .. import profiling
+from ..content_cache import content_cache, cached_response
+
 router = APIRouter()
 
-def get_recent_lines(file_path, num_lines=100):
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-    return "".join(lines[-num_lines:][::-1])
+LOG_DIRS = {"backend": "logs/backend", "frontend": "logs/frontend"}
+LIVE_LOGS = {"backend": "backend.log", "frontend": "frontend.log"}
+FOLLOW_POLL_SECONDS = 1.0
+FOLLOW_KEEPALIVE_SECONDS = 15.0
+# Written by backend/scripts/generate_test_report.py.
+TEST_REPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "logs", "tests")
+TEST_REPORT_HTML = os.path.join(TEST_REPORT_DIR, "test_report.html")
+TEST_REPORT_JSON = os.path.join(TEST_REPORT_DIR, "report.json")
 
-@router.get("/backend", response_model=list)
-def list_backend_logs():
-    log_dir = "logs/backend"
+class LogKind(str, Enum):
+    backend = "backend"
+    frontend = "frontend"
+
+def get_recent_lines(file_path, num_lines=100, before=None):
+    """Newest-first lines ending before byte offset `before`, and the cursor for the next older page."""
+    lines, cursor = log_reader.tail(file_path, num_lines, before)
+    return "".join(line + "\n" for line in lines), cursor
+
+def list_log_files(log_dir):
+    """The live .log files and their rotated backups (e.g. backend.log.2025-03-10.gz)."""
     if not os.path.exists(log_dir):
         return []
     files = sorted(os.listdir(log_dir))
-    log_files = [f for f in files if f.endswith(".log")]
-    return log_files
+    return [f for f in files if f.endswith(".log") or ".log." in f]
 
-@router.get("/backend/{filename}")
-def get_backend_log_file(filename: str, lines: int = 100):
-    log_dir = "logs/backend"
-    file_path = os.path.join(log_dir, filename)
-    if not os.path.exists(file_path):
+def resolve_log_file(log_dir, filename):
+    # Only plain names inside the log directory may be read.
+    if os.path.basename(filename) != filename or filename not in list_log_files(log_dir):
         raise HTTPException(status_code=404, detail="Log file not found")
-    content = get_recent_lines(file_path, lines)
-    return {"filename": filename, "content": content}
+    return os.path.join(log_dir, filename)
+
+def read_log_page(kind, filename, lines, before):
+    file_path = resolve_log_file(LOG_DIRS[kind], filename)
+    content, cursor = get_recent_lines(file_path, lines, before)
+    return {"filename": filename, "content": content, "cursor": cursor}
+
+@router.get("/backend", response_model=list)
+def list_backend_logs():
+    return list_log_files(LOG_DIRS["backend"])
 
 @router.get("/frontend", response_model=list)
 def list_frontend_logs():
-    log_dir = "logs/frontend"
+    return list_log_files(LOG_DIRS["frontend"])
+
+@router.get("/profiles", response_model=list)
+def list_profiles():
+    """Stored request profiles (see backend/profiling.py), newest first."""
+    return profiling.list_profiles()
+
+@router.get("/profiles/{filename}")
+def download_profile(filename: str):
+    """Download a profile: collapsed stacks as text, or speedscope JSON (open at speedscope.app)."""
+    if os.path.basename(filename) != filename or filename not in {p["filename"] for p in profiling.list_profiles()}:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if filename.endswith(".json") else "text/plain"
+    return FileResponse(os.path.join(profiling.PROFILE_DIR, filename), media_type=media_type, filename=filename)
+
+@router.get("/{kind}/search", response_model=list)
+def search_logs(kind: LogKind, q: str = Query(..., min_length=1), limit: int = Query(200, ge=1, le=5000)):
+    """
+    Case-insensitive substring search across the live log and its rotated backups,
+    newest matches first. Files are streamed, never loaded whole.
+    """
+    log_dir = LOG_DIRS[kind.value]
     if not os.path.exists(log_dir):
         return []
-    files = sorted(os.listdir(log_dir))
-    log_files = [f for f in files if f.endswith(".log")]
-    return log_files
+    return log_reader.search(log_dir, LIVE_LOGS[kind.value], q, limit)
+
+@router.get("/{kind}/query", response_model=list)
+def query_logs(
+    kind: LogKind,
+    route: Optional[str] = None,
+    user: Optional[str] = None,
+    quest_log_id: Optional[str] = None,
+    request_id: Optional[str] = None,
+    level: Optional[str] = None,
+    min_latency_ms: Optional[float] = Query(None, ge=0),
+    limit: int = Query(200, ge=1, le=5000),
+):
+    """
+    Structured log entries matching every given field (exact match), newest first, e.g.
+    /logs/backend/query?route=/tasks/&min_latency_ms=250. Only JSON-format lines match.
+    """
+    log_dir = LOG_DIRS[kind.value]
+    if not os.path.exists(log_dir):
+        return []
+    fields = {
+        key: value for key, value in (
+            ("route", route), ("user", user), ("quest_log_id", quest_log_id),
+            ("request_id", request_id), ("level", level.upper() if level else None),
+        ) if value is not None
+    }
+    return log_reader.query(log_dir, LIVE_LOGS[kind.value], fields, min_latency_ms, limit)
+
+@router.get("/backend/{filename}")
+def get_backend_log_file(filename: str, lines: int = Query(100, ge=1, le=10000), before: Optional[int] = Query(None, ge=0)):
+    """
+    Returns the last `lines` lines (newest first). Pass the returned `cursor` as `before`
+    to page further back; `cursor` is null once the start of the file is reached.
+    """
+    return read_log_page("backend", filename, lines, before)
 
 @router.get("/frontend/{filename}")
-def get_frontend_log_file(filename: str, lines: int = 100):
-    log_dir = "logs/frontend"
-    file_path = os.path.join(log_dir, filename)
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="Log file not found")
-    content = get_recent_lines(file_path, lines)
-    return {"filename": filename, "content": content}
+def get_frontend_log_file(filename: str, lines: int = Query(100, ge=1, le=10000), before: Optional[int] = Query(None, ge=0)):
+    """Same as the backend variant, for frontend logs."""
+    return read_log_page("frontend", filename, lines, before)
+
+@router.get("/{kind}/{filename}/follow")
+async def follow_log_file(kind: LogKind, filename: str, request: Request, offset: Optional[int] = Query(None, ge=0)):
+    """
+    Server-Sent Events stream of lines appended to a live log. Each event's id is the byte
+    offset after the line, so reconnecting clients resume via Last-Event-ID (or `offset`).
+    """
+    file_path = resolve_log_file(LOG_DIRS[kind.value], filename)
+    if log_reader.is_compressed(file_path):
+        raise HTTPException(status_code=400, detail="Rotated log files cannot be followed")
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id and last_event_id.isdigit():
+        offset = int(last_event_id)
+
+    async def event_stream():
+        follower = log_reader.LogFollower(file_path, offset)
+        idle = 0.0
+        try:
+            while not await request.is_disconnected():
+                lines = follower.poll()
+                for line_end, line in lines:
+                    yield f"id: {line_end}\ndata: {line}\n\n"
+                idle = 0.0 if lines else idle + FOLLOW_POLL_SECONDS
+                if idle >= FOLLOW_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+                await asyncio.sleep(FOLLOW_POLL_SECONDS)
+        finally:
+            follower.close()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 class LogMessage(BaseModel):
-    message: str
+    message: Optional[str] = None
+    messages: List[str] = []
+
+MAX_FRONTEND_BATCH = 500
 
 @router.post("/frontend/append", response_model=dict)
-def append_frontend_log(log: LogMessage):
-    log_file = "logs/frontend/frontend.log"
-    try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"{log.message}\n")
-        return {"message": "Frontend log appended"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+def append_frontend_log(log: Union[LogMessage, List[str]] = Body(...)):
+    """
+    Queue frontend log lines. Accepts {"message": "..."}, {"messages": [...]} or a bare
+    JSON array of strings; lines go through the queued frontend logger, so the request
+    never waits on the file.
+    """
+    if isinstance(log, list):
+        messages = log
+    else:
+        messages = ([log.message] if log.message is not None else []) + log.messages
+    if len(messages) > MAX_FRONTEND_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FRONTEND_BATCH} messages per batch")
+    for message in messages:
+        logging_config.frontend_logger.info(message)
+    return {"message": "Frontend log appended", "count": len(messages)}
     
+def validate_json(raw: bytes) -> bytes:
+    """Parse once when the file is (re)loaded, so a broken report is reported instead of served."""
+    try:
+        json.loads(raw)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=f"Error reading report JSON: {e}")
+    return raw
+
 @router.get("/test_report", response_class=HTMLResponse)
-def get_test_report():
+def get_test_report(request: Request):
     """
     Returns the HTML test report generated by the test report script.
+    Served from the content cache, with ETag/Last-Modified revalidation.
     """
-    # Build an absolute path relative to this file.
-    this_dir = os.path.dirname(os.path.abspath(__file__))
-    # Assuming the report is saved in backend/logs/tests/test_report.html:
-    report_path = os.path.join(this_dir, "..", "logs", "tests", "test_report.html")
-    if not os.path.exists(report_path):
+    try:
+        entry = content_cache.get(TEST_REPORT_HTML, "text/html; charset=utf-8")
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Test report not found.")
-    with open(report_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    return HTMLResponse(content=content)
+    return cached_response(request, entry)
 
 @router.get("/test_report_json", response_class=JSONResponse)
-def get_test_report_json():
+def get_test_report_json(request: Request):
     """
     Returns the JSON test report generated by the test report script.
+    Served from the content cache, with ETag/Last-Modified revalidation.
     """
-    # Build an absolute path relative to this file.
-    this_dir = os.path.dirname(os.path.abspath(__file__))
-    # Assuming the report is saved at backend/logs/tests/report.json
-    report_path = os.path.join(this_dir, "..", "logs", "tests", "report.json")
-    if not os.path.exists(report_path):
-        raise HTTPException(status_code=404, detail="Test report JSON not found.")
     try:
-        with open(report_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error reading report JSON: {e}")
-    return JSONResponse(content=data)
+        entry = content_cache.get(TEST_REPORT_JSON, "application/json", validate_json)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Test report JSON not found.")
+    return cached_response(request, entry)
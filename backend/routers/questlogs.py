@@ -3,31 +3,30 @@ Questlogs Router
 ----------------
 This router provides endpoints for managing Quest Logs (boards),
 including creation, deletion, invite link generation/acceptance, listing
-activity, invites, and participants. All endpoints log actions and return
+activity, invites, and participants, and webhook subscriptions. All endpoints log actions and return
 human-readable messages where applicable.
 """
 
-from fastapi import APIRouter, HTTPException, Body, Depends, Query, Request
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Body, Depends, Query, Request
 from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
+from sqlalchemy import case, or_, select
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 import logging
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
-from ..db import SessionLocal
-from ..models import QuestLog, QuestLogMembership, QuestLogInvite, QLActivity, User
+from ..db import get_db
+from ..responses import FastJSONResponse
+from ..models import QuestLog, QuestLogMembership, QuestLogInvite, QLActivity, User, WebhookDelivery, WebhookSubscription
+from ..retention import dead_invite_condition
+from ..cache import roster_cache, roster_key, invalidate_roster, invalidate_webhooks, MISSING
+from .. import deletion, webhooks
 
 router = APIRouter()
 logger = logging.getLogger("backend-logger")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # -------------------------------
 # Pydantic Models
 # -------------------------------
@@ -48,6 +47,11 @@ class InviteAccept(BaseModel):
     username: str
     action: str  # "join" or "spectate"
 
+class WebhookCreate(BaseModel):
+    url: str
+    events: List[str] = ["*"]  # Event names from backend/webhooks.py EVENTS, or "*" for all.
+    secret: Optional[str] = None
+
 # -------------------------------
 # Endpoints
 # -------------------------------
@@ -66,6 +70,7 @@ def create_quest_log(ql_data: QuestLogCreate, db: Session = Depends(get_db)):
     membership = QuestLogMembership(quest_log_id=quest_log.id, user_id=owner.id, role="member")
     db.add(membership)
     db.commit()
+    invalidate_roster(db, quest_log.id)
     activity = QLActivity(
         quest_log_id=quest_log.id,
         user_id=owner.id,
@@ -82,23 +87,33 @@ def list_quest_logs(username: str = Query(...), db: Session = Depends(get_db)):
     if not user:
         logger.error(f"User '{username}' not found when listing quest logs.")
         raise HTTPException(status_code=404, detail="User not found")
-    owned = db.query(QuestLog).filter(QuestLog.owner_id == user.id).all()
-    memberships = db.query(QuestLogMembership).filter(QuestLogMembership.user_id == user.id).all()
-    member_ids = {m.quest_log_id for m in memberships if m.quest_log_id}
-    member_logs = db.query(QuestLog).filter(QuestLog.id.in_(member_ids), QuestLog.owner_id != user.id).all()
-    all_logs = owned + member_logs
-    logger.info(f"User '{username}' listed {len(all_logs)} quest logs.")
+    # Owned boards first, then boards the user is a member of, with owner names joined in.
+    owner = aliased(User)
+    member_of = select(QuestLogMembership.quest_log_id).where(QuestLogMembership.user_id == user.id)
+    rows = db.execute(
+        select(QuestLog.id, QuestLog.name, owner.username)
+        .outerjoin(owner, owner.id == QuestLog.owner_id)
+        .where(or_(QuestLog.owner_id == user.id, QuestLog.id.in_(member_of)), QuestLog.deleted_at.is_(None))
+        .order_by(case((QuestLog.owner_id == user.id, 0), else_=1), QuestLog.id)
+    ).all()
+    logger.info(f"User '{username}' listed {len(rows)} quest logs.")
     return [
         {
-            "id": ql.id,
-            "name": ql.name,
-            "owner_username": db.query(User).filter(User.id == ql.owner_id).first().username
+            "id": ql_id,
+            "name": name,
+            "owner_username": owner_username or "Unknown"
         }
-        for ql in all_logs
+        for ql_id, name, owner_username in rows
     ]
 
-@router.delete("/{quest_log_id}", response_model=dict)
-def delete_quest_log(quest_log_id: int, username: str, db: Session = Depends(get_db)):
+@router.delete("/{quest_log_id}", response_model=dict, status_code=202)
+def delete_quest_log(quest_log_id: int, username: str, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """
+    Soft-delete the Quest Log and queue its deletion job (backend/deletion.py), which removes
+    its tasks, comments, stories, history, memberships, invites and activities in chunks after
+    the response is sent. Progress is reported by GET /questlogs/{id}/deletion.
+    Deleting a Quest Log whose deletion is already under way resumes that job.
+    """
     quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id).first()
     if not quest_log:
         logger.error(f"Quest Log ID {quest_log_id} not found for deletion.")
@@ -107,22 +122,25 @@ def delete_quest_log(quest_log_id: int, username: str, db: Session = Depends(get
     if owner.username != username:
         logger.warning(f"User '{username}' attempted to delete Quest Log ID {quest_log_id} not owned by them.")
         raise HTTPException(status_code=403, detail="Only the owner can delete the Quest Log")
-    db.delete(quest_log)
-    db.commit()
-    logger.info(f"Quest Log ID {quest_log_id} deleted by owner '{username}'.")
-    activity = QLActivity(
-        quest_log_id=quest_log_id,
-        user_id=owner.id,
-        action="deleted",
-        details="Quest Log deleted."
-    )
-    db.add(activity)
-    db.commit()
-    return {"message": "Quest Log deleted"}
+    job = deletion.request_deletion(db, quest_log, username)
+    invalidate_roster(db, quest_log_id)
+    invalidate_webhooks(db, quest_log_id)
+    background_tasks.add_task(deletion.run_deletion_job, db.get_bind(), job.id)
+    # No "deleted" activity is recorded: it would reference a quest log that no longer exists.
+    logger.info(f"Quest Log ID {quest_log_id} marked deleted by owner '{username}' (deletion job {job.id}).")
+    return {"message": "Quest Log deletion started", "deletion_id": job.id}
+
+@router.get("/{quest_log_id}/deletion", response_class=FastJSONResponse)
+def get_deletion_progress(quest_log_id: int, db: Session = Depends(get_db)):
+    """Status of the Quest Log's latest deletion job: the table it is on and the rows deleted so far."""
+    job = deletion.latest_job(db, quest_log_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="No deletion found for this Quest Log")
+    return FastJSONResponse(deletion.job_progress(job))
 
 @router.post("/{quest_log_id}/invite", response_model=InviteResponse)
 def generate_invite(quest_log_id: int, username: str, options: InviteOptions = Body(...), db: Session = Depends(get_db)):
-    quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id).first()
+    quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id, QuestLog.deleted_at.is_(None)).first()
     if not quest_log:
         logger.error(f"Quest Log ID {quest_log_id} not found for invite generation.")
         raise HTTPException(status_code=404, detail="Quest Log not found")
@@ -148,6 +166,10 @@ def generate_invite(quest_log_id: int, username: str, options: InviteOptions = B
         details=f"Invite generated by {owner.username}"
     )
     db.add(activity)
+    webhooks.emit(db, quest_log_id, "invite.generated", {
+        "invite_id": invite.id, "expires_at": invite.expires_at, "is_permanent": invite.is_permanent,
+        "username": owner.username,
+    })
     db.commit()
     return InviteResponse(token=invite.token, expires_at=invite.expires_at)
 
@@ -174,6 +196,12 @@ def accept_invite(data: InviteAccept, db: Session = Depends(get_db)):
     if invite.expires_at and datetime.utcnow() > invite.expires_at:
         logger.warning(f"Expired invite token: {data.token}")
         raise HTTPException(status_code=400, detail="Invite token has expired")
+    if invite.revoked or invite.used or invite.archived_at:
+        logger.warning(f"Revoked or used invite token: {data.token}")
+        raise HTTPException(status_code=400, detail="Invite token is no longer valid")
+    if invite.quest_log is None or invite.quest_log.deleted_at:
+        logger.warning(f"Invite token {data.token} belongs to a deleted Quest Log.")
+        raise HTTPException(status_code=404, detail="Quest Log not found")
     user = db.query(User).filter(User.username == data.username).first()
     if not user:
         logger.error(f"User '{data.username}' not found during invite acceptance.")
@@ -203,13 +231,17 @@ def accept_invite(data: InviteAccept, db: Session = Depends(get_db)):
         details=f"Accepted invite with token {data.token}"
     )
     db.add(activity)
-    # Single-use: revoke invite after acceptance.
-    invite.revoked = True
+    # Single-use: mark the invite used (and revoked) after acceptance; permanent invites stay open.
+    if not invite.is_permanent:
+        invite.used = True
+        invite.revoked = True
+    webhooks.emit(db, invite.quest_log_id, "member.joined", {"username": user.username, "role": role})
     db.commit()
-    logger.info(f"User '{data.username}' accepted invite token {data.token} as {role} for Quest Log ID {invite.quest_log_id}. Invite now revoked.")
+    invalidate_roster(db, invite.quest_log_id)
+    logger.info(f"User '{data.username}' accepted invite token {data.token} as {role} for Quest Log ID {invite.quest_log_id}.")
     return {"message": f"Invite accepted; user added as {role}", "quest_log_id": invite.quest_log_id}
 
-@router.get("/{quest_log_id}/activities", response_model=list)
+@router.get("/{quest_log_id}/activities", response_class=FastJSONResponse)
 def get_activities(quest_log_id: int, skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
     activities = db.query(QLActivity).filter(QLActivity.quest_log_id == quest_log_id)\
         .order_by(QLActivity.timestamp.desc()).offset(skip).limit(limit).all()
@@ -240,24 +272,46 @@ def get_activities(quest_log_id: int, skip: int = 0, limit: int = 50, db: Sessio
     # If the only activity is a deletion, return an empty log.
     if len(result) == 1 and result[0]["action"].lower() == "deleted":
         result = []
-    return result
+    return FastJSONResponse(result)
+
+def invite_status(now: datetime):
+    """SQL expression for an invite's status; "Expiring" rows get their hours remaining in Python."""
+    return case(
+        (QuestLogInvite.revoked.is_(True), "Revoked"),
+        (QuestLogInvite.expires_at < now, "Expired"),
+        (QuestLogInvite.is_permanent.is_(True), "Permanent"),
+        (QuestLogInvite.expires_at.isnot(None), "Expiring"),
+        else_="Active",
+    )
 
 @router.get("/{quest_log_id}/invites", response_model=list)
-def get_invites(quest_log_id: int, db: Session = Depends(get_db)):
-    invites = db.query(QuestLogInvite).filter(QuestLogInvite.quest_log_id == quest_log_id).all()
+def get_invites(
+    quest_log_id: int,
+    include_dead: bool = Query(False, description="Also list revoked, used, expired and archived invites"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """
+    Invites of a quest log, newest first, with their status computed in the query.
+    Only live invites are listed unless include_dead is set.
+    """
+    now = datetime.utcnow()
+    query = select(
+        QuestLogInvite.id, QuestLogInvite.token, QuestLogInvite.is_permanent, QuestLogInvite.expires_at,
+        QuestLogInvite.created_at, QuestLogInvite.revoked, invite_status(now).label("status"),
+    ).where(QuestLogInvite.quest_log_id == quest_log_id)
+    if not include_dead:
+        query = query.where(QuestLogInvite.archived_at.is_(None), ~dead_invite_condition(now))
+    rows = db.execute(
+        query.order_by(QuestLogInvite.created_at.desc(), QuestLogInvite.id.desc()).offset(skip).limit(limit)
+    ).all()
     result = []
-    for inv in invites:
-        if inv.revoked:
-            status = "Revoked"
-        elif inv.expires_at and datetime.utcnow() > inv.expires_at:
-            status = "Expired"
-        elif inv.is_permanent:
-            status = "Permanent"
-        elif inv.expires_at:
-            hours = round((inv.expires_at - datetime.utcnow()).total_seconds() / 3600, 1)
+    for inv in rows:
+        status = inv.status
+        if status == "Expiring":
+            hours = round((inv.expires_at - now).total_seconds() / 3600, 1)
             status = f"{hours} hours remaining"
-        else:
-            status = "Active"
         result.append({
             "id": inv.id,
             "token": inv.token,
@@ -267,26 +321,28 @@ def get_invites(quest_log_id: int, db: Session = Depends(get_db)):
             "revoked": inv.revoked,
             "status": status
         })
-    # Sort invites by created_at descending.
-    result.sort(key=lambda x: x["created_at"], reverse=True)
     logger.info(f"Returning {len(result)} invites for Quest Log ID {quest_log_id}.")
     return result
 
-@router.get("/{quest_log_id}/participants", response_model=list)
+@router.get("/{quest_log_id}/participants", response_class=FastJSONResponse)
 def get_participants(quest_log_id: int, db: Session = Depends(get_db)):
-    memberships = db.query(QuestLogMembership).filter(QuestLogMembership.quest_log_id == quest_log_id).all()
-    participants = []
-    for membership in memberships:
-        user_obj = db.query(User).filter(User.id == membership.user_id).first()
-        if user_obj:
-            participants.append({
-                "user_id": user_obj.id,
-                "username": user_obj.username,
-                "role": membership.role,
-                "joined_at": membership.joined_at
-            })
+    """The quest log's roster, from the roster cache (see backend/cache.py) when it is warm."""
+    key = roster_key(db, quest_log_id)
+    participants = roster_cache.get(key)
+    if participants is MISSING:
+        rows = db.execute(
+            select(User.id, User.username, QuestLogMembership.role, QuestLogMembership.joined_at)
+            .join(User, User.id == QuestLogMembership.user_id)
+            .where(QuestLogMembership.quest_log_id == quest_log_id)
+            .order_by(QuestLogMembership.id)
+        ).all()
+        participants = [
+            {"user_id": user_id, "username": username, "role": role, "joined_at": joined_at}
+            for user_id, username, role, joined_at in rows
+        ]
+        roster_cache.set(key, participants)
     logger.info(f"Returning {len(participants)} participants for Quest Log ID {quest_log_id}.")
-    return participants
+    return FastJSONResponse(participants)
 
 @router.delete("/{quest_log_id}/invites/{invite_id}", response_model=dict)
 def revoke_invite(quest_log_id: int, invite_id: int, username: str, db: Session = Depends(get_db)):
@@ -294,7 +350,7 @@ def revoke_invite(quest_log_id: int, invite_id: int, username: str, db: Session
     Revoke a single-use invite link.
     Only the board owner can revoke an invite.
     """
-    quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id).first()
+    quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id, QuestLog.deleted_at.is_(None)).first()
     if not quest_log:
         logger.error(f"Quest Log ID {quest_log_id} not found for invite revocation.")
         raise HTTPException(status_code=404, detail="Quest Log not found")
@@ -317,6 +373,7 @@ def revoke_invite(quest_log_id: int, invite_id: int, username: str, db: Session
         details=f"Invite {invite.token} revoked by {username}"
     )
     db.add(activity)
+    webhooks.emit(db, quest_log_id, "invite.revoked", {"invite_id": invite.id, "username": username})
     db.commit()
     logger.info(f"Invite {invite.token} revoked for Quest Log ID {quest_log_id} by {username}.")
     return {"message": "Invite revoked successfully"}
@@ -331,7 +388,7 @@ def get_invite_details(token: str, db: Session = Depends(get_db)):
     if not invite:
         logger.error(f"Invite token {token} not found.")
         raise HTTPException(status_code=404, detail="Invite not found")
-    quest_log = db.query(QuestLog).filter(QuestLog.id == invite.quest_log_id).first()
+    quest_log = db.query(QuestLog).filter(QuestLog.id == invite.quest_log_id, QuestLog.deleted_at.is_(None)).first()
     if not quest_log:
         logger.error(f"Quest Log for invite token {token} not found.")
         raise HTTPException(status_code=404, detail="Quest Log not found")
@@ -369,5 +426,81 @@ def upgrade_membership(quest_log_id: int, username: str, db: Session = Depends(g
     )
     db.add(activity)
     db.commit()
+    invalidate_roster(db, quest_log_id)
     logger.info(f"User {username} upgraded from spectator to member in Quest Log {quest_log_id}.")
     return {"message": "Membership upgraded to member."}
+
+def owned_quest_log(db: Session, quest_log_id: int, username: str) -> QuestLog:
+    quest_log = db.query(QuestLog).filter(QuestLog.id == quest_log_id, QuestLog.deleted_at.is_(None)).first()
+    if not quest_log:
+        logger.error(f"Quest Log ID {quest_log_id} not found for webhook management.")
+        raise HTTPException(status_code=404, detail="Quest Log not found")
+    if quest_log.owner.username != username:
+        logger.warning(f"User '{username}' attempted to manage webhooks of Quest Log ID {quest_log_id} they do not own.")
+        raise HTTPException(status_code=403, detail="Only the owner can manage webhooks")
+    return quest_log
+
+def webhook_view(subscription: WebhookSubscription) -> dict:
+    # The secret is write-only.
+    return {
+        "id": subscription.id,
+        "url": subscription.url,
+        "events": subscription.events.split(","),
+        "has_secret": bool(subscription.secret),
+        "created_by": subscription.created_by,
+        "created_at": subscription.created_at,
+    }
+
+@router.post("/{quest_log_id}/webhooks", response_model=dict)
+def create_webhook(quest_log_id: int, username: str, data: WebhookCreate, db: Session = Depends(get_db)):
+    """
+    Subscribe an endpoint to events of this quest log (see backend/webhooks.py).
+    Only the board owner can manage webhooks.
+    """
+    owned_quest_log(db, quest_log_id, username)
+    try:
+        webhooks.check_target(data.url)
+    except webhooks.BlockedTarget as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except OSError:
+        raise HTTPException(status_code=400, detail="Webhook host cannot be resolved")
+    unknown = [e for e in data.events if e != "*" and e not in webhooks.EVENTS]
+    if unknown or not data.events:
+        raise HTTPException(status_code=400, detail=f"Unknown webhook events: {', '.join(unknown) or 'none given'}")
+    subscription = WebhookSubscription(
+        quest_log_id=quest_log_id,
+        url=data.url,
+        events="*" if "*" in data.events else ",".join(dict.fromkeys(data.events)),
+        secret=data.secret or None,
+        created_by=username,
+    )
+    db.add(subscription)
+    db.commit()
+    db.refresh(subscription)
+    invalidate_webhooks(db, quest_log_id)
+    logger.info(f"Webhook {subscription.id} added to Quest Log ID {quest_log_id} by '{username}'.")
+    return webhook_view(subscription)
+
+@router.get("/{quest_log_id}/webhooks", response_model=list)
+def list_webhooks(quest_log_id: int, username: str, db: Session = Depends(get_db)):
+    owned_quest_log(db, quest_log_id, username)
+    subscriptions = db.query(WebhookSubscription).filter(WebhookSubscription.quest_log_id == quest_log_id)\
+        .order_by(WebhookSubscription.id).all()
+    return [webhook_view(subscription) for subscription in subscriptions]
+
+@router.delete("/{quest_log_id}/webhooks/{webhook_id}", response_model=dict)
+def delete_webhook(quest_log_id: int, webhook_id: int, username: str, db: Session = Depends(get_db)):
+    """Remove a webhook subscription, with its queued deliveries."""
+    owned_quest_log(db, quest_log_id, username)
+    subscription = db.query(WebhookSubscription).filter(
+        WebhookSubscription.id == webhook_id, WebhookSubscription.quest_log_id == quest_log_id
+    ).first()
+    if not subscription:
+        logger.error(f"Webhook {webhook_id} not found for Quest Log ID {quest_log_id}.")
+        raise HTTPException(status_code=404, detail="Webhook not found")
+    db.query(WebhookDelivery).filter(WebhookDelivery.subscription_id == webhook_id).delete(synchronize_session=False)
+    db.delete(subscription)
+    db.commit()
+    invalidate_webhooks(db, quest_log_id)
+    logger.info(f"Webhook {webhook_id} removed from Quest Log ID {quest_log_id} by '{username}'.")
+    return {"message": "Webhook removed"}
@@ -0,0 +1,44 @@
+"""
+Search Router
+-------------
+Full-text search over the tasks, comments and stories of the viewer's quest logs.
+Matching, ranking and visibility rules live in backend/search.py; results are ranked
+and paginated with skip/limit.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..db import get_db
+from ..models import User
+from ..responses import FastJSONResponse
+from .. import search
+from .. import logging_config
+
+router = APIRouter()
+
+@router.get("/", response_class=FastJSONResponse)
+def search_tasks(
+    username: str = Query(...),
+    q: str = Query(..., min_length=1, max_length=200),
+    quest_log_id: Optional[int] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Tasks, comments and stories matching every word of `q` (the last word as a prefix),
+    on all of the user's quest logs or only `quest_log_id`. Each result names its kind
+    ("task", "comment" or "story"), its task and quest log, and a snippet with the
+    matches in [brackets]. Results are best first (X-Search-Order: relevance), or newest
+    first for very broad queries (X-Search-Order: recent).
+    """
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if not search.search_available(db):
+        raise HTTPException(status_code=503, detail="Search is not available on this database")
+    results, ranked = search.search(db, user.id, q, quest_log_id, skip, limit)
+    logging_config.backend_logger.debug(f"Search by '{username}' for {q!r} returned {len(results)} results.")
+    return FastJSONResponse(results, headers={"X-Search-Order": "relevance" if ranked else "recent"})
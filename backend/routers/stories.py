@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from ..db import SessionLocal
+from ..db import get_db
+from ..responses import FastJSONResponse
 from ..models import Story, Task, User
 from datetime import datetime
 from .. import logging_config
@@ -8,13 +9,6 @@ from .. import logging_config
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def add_story(task_id: int, owner_id: int, story: str, xp: int, currency: int, db: Session):
     new_story = Story(
         task_id=task_id,
@@ -30,7 +24,7 @@ def add_story(task_id: int, owner_id: int, story: str, xp: int, currency: int, d
     logging_config.backend_logger.info(f"Story created for task {task_id}")
     return new_story
 
-@router.get("/", response_model=list)
+@router.get("/", response_class=FastJSONResponse)
 def get_stories(viewer_username: str, db: Session = Depends(get_db)):
     """
     Retrieve all stories. For private tasks, if the viewer is not the owner, obfuscate the story text.
@@ -55,4 +49,4 @@ def get_stories(viewer_username: str, db: Session = Depends(get_db)):
             "currency": story.currency,
             "created_at": story.created_at
         })
-    return result
+    return FastJSONResponse(result)
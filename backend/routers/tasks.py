@@ -3,42 +3,53 @@ backend/routers/tasks.py
 ------------------------
 This router manages task creation, updates, and related actions.
 It now requires a quest_log_id parameter for creating and listing tasks.
-Tasks are owned by one Quest Log, though they may later be mirrored as "Oracle Tasks."
+Tasks are owned by one Quest Log, though they may be mirrored into others as "Oracle Tasks":
+a mirror only references the source task, so every board shows the task's current state.
 """
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
 from sqlalchemy.orm import Session
 from datetime import datetime
-from ..models import Task, TaskStatus, User, Comment, TaskHistory, QuestLogMembership
-from ..db import SessionLocal
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional
+from ..models import (
+    Task, TaskStatus, User, Comment, TaskHistory, TaskMirror, QuestLog, QuestLogMembership, QLActivity,
+    COMPLETION_XP, COMPLETION_CURRENCY, MASKED_TEXT, parse_user_ids
+)
+from ..db import get_db
+from ..responses import FastJSONResponse
 from ..llm_integration import generate_story_for_task
+from ..recurrence import MIN_REPEAT_INTERVAL, first_due
 from .stories import add_story
+from .. import webhooks
 from pydantic import BaseModel, field_validator
 from .. import logging_config
-from sqlalchemy import text
+from sqlalchemy import and_, text, select, union, update, func
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Model for creating a task.
 class TaskCreate(BaseModel):
     title: str
     description: str = None
     color: str = "blue"
     scheduled_time: datetime = None
-    repeat_interval: int = None
+    repeat_interval: int = None  # Seconds; the task recurs from scheduled_time (see backend/recurrence.py).
     is_private: bool = False
     locked: bool = False  # Allow creating a locked task
     owner_username: str
     co_owners: str = ""   # Comma-separated usernames
     quest_log_id: int     # New: associate task with a Quest Log
 
+    @field_validator("repeat_interval")
+    def check_repeat_interval(cls, v):
+        if not v:
+            return None
+        if v < MIN_REPEAT_INTERVAL:
+            raise ValueError(f"repeat_interval is in seconds and must be at least {MIN_REPEAT_INTERVAL}")
+        return v
+
 class StatusUpdate(BaseModel):
     new_status: TaskStatus
     username: str
@@ -71,105 +82,155 @@ class CommentEdit(BaseModel):
         except Exception as e:
             raise ValueError("task_id must be an integer") from e
 
+class MirrorCreate(BaseModel):
+    quest_log_id: int  # The board to show the task on.
+    username: str
+    note: Optional[str] = None
+
+# Board response models. Slotted dataclasses: built for every task of a board, they carry
+# no per-instance __dict__, and FastAPI derives the response schema from them.
+@dataclass(slots=True)
+class CommentView:
+    id: int
+    content: str
+    created_at: Optional[datetime]
+    user_id: Optional[int]
+    owner_username: str
+
+@dataclass(slots=True)
+class HistoryView:
+    status: str
+    timestamp: Optional[datetime]
+
+@dataclass(slots=True)
+class TaskView:
+    id: int
+    title: str
+    description: Optional[str]
+    color: Optional[str]
+    status: Optional[TaskStatus]
+    scheduled_time: Optional[datetime]
+    repeat_interval: Optional[int]
+    is_private: Optional[bool]
+    locked: Optional[bool]
+    owner_id: Optional[int]
+    owner_username: str
+    co_owners: List[str]
+    comments: List[CommentView]
+    history: List[HistoryView]
+    created_at: Optional[datetime]
+    # Set on Oracle Tasks: the quest log the task belongs to, and the mirror's note.
+    mirrored_from: Optional[int] = None
+    mirror_note: Optional[str] = None
+
+# Columns loaded for a board: plain rows instead of ORM instances (no identity map entries,
+# no attribute instrumentation).
+TASK_COLUMNS = (Task.id, Task.title, Task.description, Task.color, Task.status, Task.scheduled_time,
+                Task.repeat_interval, Task.is_private, Task.locked, Task.owner_id, Task.co_owner_ids, Task.created_at)
+COMMENT_COLUMNS = (Comment.task_id, Comment.id, Comment.content, Comment.created_at, Comment.user_id)
+HISTORY_COLUMNS = (TaskHistory.task_id, TaskHistory.status, TaskHistory.timestamp)
+
 # GET tasks endpoint: requires viewer_username and quest_log_id.
-@router.get("/", response_model=list)
+@router.get("/", response_model=List[TaskView], response_class=FastJSONResponse)
 def get_tasks(
     viewer_username: str = Query(...),
     quest_log_id: int = Query(...),
     db: Session = Depends(get_db)
 ):
-    # Check if the viewer is a member of this quest log.
-    membership = (
-        db.query(QuestLogMembership)
+    # Returned directly: boards can be large, and the views need no validation.
+    return FastJSONResponse(load_board(db, quest_log_id, viewer_username))
+
+def load_board(db: Session, quest_log_id: int, viewer_username: str) -> List[TaskView]:
+    """The tasks of a quest log as the viewer may see them (empty if they are not a member)."""
+    # Check if the viewer is a member of this quest log, and that it is not being deleted.
+    membership = db.execute(
+        select(QuestLogMembership.id)
         .join(User, QuestLogMembership.user_id == User.id)
-        .filter(QuestLogMembership.quest_log_id == quest_log_id, User.username == viewer_username)
-        .first()
-    )
+        .join(QuestLog, QuestLogMembership.quest_log_id == QuestLog.id)
+        .where(QuestLogMembership.quest_log_id == quest_log_id, User.username == viewer_username,
+               QuestLog.deleted_at.is_(None))
+        .limit(1)
+    ).first()
     if membership is None:
         # If the user is not a member, return an empty list.
         return []
-    
-    tasks = db.query(Task).filter(Task.quest_log_id == quest_log_id).all()
-    task_list = []
+
+    # One query each for the tasks, their history, their comments and the users they
+    # mention, instead of several queries per task.
+    task_ids = board_task_ids(quest_log_id)
+    tasks = db.execute(
+        select(*TASK_COLUMNS, Task.quest_log_id, TaskMirror.note)
+        .outerjoin(TaskMirror, and_(TaskMirror.task_id == Task.id, TaskMirror.quest_log_id == quest_log_id))
+        .where(Task.id.in_(task_ids))
+        .order_by(Task.id)
+    ).all()
+    if not tasks:
+        return []
+    history_by_task = defaultdict(list)
+    for h in db.execute(select(*HISTORY_COLUMNS).where(TaskHistory.task_id.in_(task_ids))
+                        .order_by(TaskHistory.task_id, TaskHistory.timestamp.asc())):
+        history_by_task[h.task_id].append(HistoryView(h.status, h.timestamp))
+    comments_by_task = defaultdict(list)
+    for c in db.execute(select(*COMMENT_COLUMNS).where(Comment.task_id.in_(task_ids)).order_by(Comment.id)):
+        comments_by_task[c.task_id].append(c)
+
+    co_owner_ids = {task.id: parse_user_ids(task.co_owner_ids) for task in tasks}
+    user_ids = {task.owner_id for task in tasks} | {uid for ids in co_owner_ids.values() for uid in ids}
+    user_ids |= {c.user_id for comments in comments_by_task.values() for c in comments}
+    user_ids.discard(None)
+    usernames = dict(db.execute(select(User.id, User.username).where(User.id.in_(user_ids))).all()) if user_ids else {}
+
+    views = []
     for task in tasks:
-        owner = db.query(User).filter(User.id == task.owner_id).first()
-        co_owners = []
-        if task.co_owner_ids:
-            for uid in task.co_owner_ids.split(","):
-                uid_str = uid.strip()
-                try:
-                    num = int(uid_str)
-                    u = db.query(User).filter(User.id == num).first()
-                    if u:
-                        co_owners.append(u.username)
-                except:
-                    continue
-        is_owner = (owner.username == viewer_username) or (viewer_username in co_owners)
-        history_records = db.query(TaskHistory).filter(TaskHistory.task_id == task.id)\
-            .order_by(TaskHistory.timestamp.asc()).all()
-        history_list = [{"status": h.status, "timestamp": h.timestamp.isoformat()} for h in history_records]
-        
-        if task.is_private and not is_owner:
-            task_dict = {
-                "id": task.id,
-                "title": "Solo Adventure",
-                "description": "Solo Adventure",
-                "color": task.color,
-                "status": task.status,
-                "scheduled_time": task.scheduled_time,
-                "repeat_interval": task.repeat_interval,
-                "is_private": task.is_private,
-                "locked": task.locked,
-                "owner_id": task.owner_id,
-                "owner_username": owner.username,
-                "co_owners": [],
-                "comments": [],
-                "history": history_list,
-                "created_at": task.created_at
-            }
-        else:
-            task_dict = {
-                "id": task.id,
-                "title": task.title,
-                "description": task.description,
-                "color": task.color,
-                "status": task.status,
-                "scheduled_time": task.scheduled_time,
-                "repeat_interval": task.repeat_interval,
-                "is_private": task.is_private,
-                "locked": task.locked,
-                "owner_id": task.owner_id,
-                "owner_username": owner.username if owner else "Unknown",
-                "co_owners": co_owners,
-                "comments": [
-                    {
-                        "id": c.id,
-                        "content": c.content,
-                        "created_at": c.created_at,
-                        "user_id": c.user_id,
-                        "owner_username": db.query(User).filter(User.id == c.user_id).first().username
-                                          if db.query(User).filter(User.id == c.user_id).first() else "Anonymous"
-                    }
-                    for c in task.comments
-                ],
-                "history": history_list,
-                "created_at": task.created_at
-            }
-        task_list.append(task_dict)
-    return task_list
+        owner_username = usernames.get(task.owner_id)
+        co_owners = [usernames[uid] for uid in co_owner_ids[task.id] if uid in usernames]
+        visible = not task.is_private or owner_username == viewer_username or viewer_username in co_owners
+        views.append(TaskView(
+            id=task.id,
+            title=task.title if visible else MASKED_TEXT,
+            description=task.description if visible else MASKED_TEXT,
+            color=task.color,
+            status=task.status,
+            scheduled_time=task.scheduled_time,
+            repeat_interval=task.repeat_interval,
+            is_private=task.is_private,
+            locked=task.locked,
+            owner_id=task.owner_id,
+            owner_username=owner_username or "Unknown",
+            co_owners=co_owners if visible else [],
+            comments=[
+                CommentView(c.id, c.content, c.created_at, c.user_id, usernames.get(c.user_id, "Anonymous"))
+                for c in comments_by_task[task.id]
+            ] if visible else [],
+            history=history_by_task[task.id],
+            created_at=task.created_at,
+            mirrored_from=task.quest_log_id if task.quest_log_id != quest_log_id else None,
+            mirror_note=task.note if visible else None,
+        ))
+    return views
+
+def board_task_ids(quest_log_id: int):
+    """
+    Ids of the tasks on a board: its own, plus those mirrored into it. Mirrors are read
+    through the (quest_log_id, task_id) index of task_mirrors, so the cost follows this
+    board's mirrors only; tasks of quest logs being deleted are left out.
+    """
+    mirrored = select(TaskMirror.task_id)\
+        .join(Task, Task.id == TaskMirror.task_id)\
+        .join(QuestLog, QuestLog.id == Task.quest_log_id)\
+        .where(TaskMirror.quest_log_id == quest_log_id, QuestLog.deleted_at.is_(None))
+    return union(select(Task.id).where(Task.quest_log_id == quest_log_id), mirrored)
 
 # Create a new task.
 @router.post("/", response_model=dict)
 def create_task(task_data: TaskCreate, db: Session = Depends(get_db)):
+    logging_config.update_request_context(user=task_data.owner_username, quest_log_id=str(task_data.quest_log_id))
     user = db.query(User).filter(User.username == task_data.owner_username).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Verify membership in the quest log.
-    membership = db.query(QuestLogMembership).filter(
-        QuestLogMembership.quest_log_id == task_data.quest_log_id,
-        QuestLogMembership.user_id == user.id
-    ).first()
+    # Verify membership in the quest log (none while it is being deleted).
+    membership = live_membership(db, task_data.quest_log_id, user.id)
     if not membership:
         raise HTTPException(status_code=403, detail="User is not a member of the specified Quest Log")
     
@@ -193,7 +254,8 @@ def create_task(task_data: TaskCreate, db: Session = Depends(get_db)):
         owner_id=user.id,
         status=TaskStatus.todo,
         co_owner_ids=co_owner_ids_str,
-        quest_log_id=task_data.quest_log_id
+        quest_log_id=task_data.quest_log_id,
+        next_occurrence_at=first_due(task_data.scheduled_time, datetime.utcnow(), task_data.repeat_interval)
     )
     db.add(task)
     db.commit()
@@ -201,6 +263,7 @@ def create_task(task_data: TaskCreate, db: Session = Depends(get_db)):
     logging_config.backend_logger.info(f"Task {task.id} created in Quest Log {task_data.quest_log_id} by '{user.username}'.")
     history_record = TaskHistory(task_id=task.id, status="Created")
     db.add(history_record)
+    webhooks.emit(db, task.quest_log_id, "task.created", {**webhooks.task_event(task), "username": user.username})
     db.commit()
     return {"message": "Task created", "task_id": task.id}
 
@@ -210,6 +273,7 @@ def update_task_status(task_id: int, status_data: StatusUpdate, db: Session = De
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
+    logging_config.update_request_context(user=status_data.username, quest_log_id=str(task.quest_log_id))
     current_status = task.status
     new_status = status_data.new_status
     allowed_transitions = {
@@ -225,39 +289,146 @@ def update_task_status(task_id: int, status_data: StatusUpdate, db: Session = De
         f"User {status_data.username} requested status change for task {task.id} from {current_status} to {new_status}"
     )
     
-    task.status = new_status
+    # Compare-and-set on the current status so two concurrent requests cannot both
+    # apply the same transition (and both pay out the Done reward).
+    values = {Task.status: new_status}
+    if new_status == TaskStatus.done:
+        values[Task.locked] = True
+    updated = db.query(Task).filter(Task.id == task.id, Task.status == current_status)\
+        .update(values, synchronize_session=False)
+    if not updated:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Task status was changed by another request")
+    db.add(TaskHistory(task_id=task.id, status=new_status))
+    if new_status == TaskStatus.done:
+        award_participants(task.id, db)
+    webhooks.emit(db, task.quest_log_id, "task.status_changed", {
+        **webhooks.task_event(task), "status": new_status.value, "previous_status": current_status.value,
+        "username": status_data.username,
+    })
     db.commit()
     db.refresh(task)
     logging_config.backend_logger.info(f"Task {task.id} status updated to {new_status} by '{status_data.username}'.")
-    
-    history_record = TaskHistory(task_id=task.id, status=new_status)
-    db.add(history_record)
-    db.commit()
+    if new_status == TaskStatus.done:
+        logging_config.backend_logger.info(f"Task {task.id} locked as done.")
     
     if current_status == TaskStatus.todo and new_status == TaskStatus.doing:
         story_text, xp, currency = generate_story_for_task(task, db)
         add_story(task_id, task.owner_id, story_text, xp, currency, db)
     
-    if new_status == TaskStatus.done:
-        task.locked = True
-        db.commit()
-        logging_config.backend_logger.info(f"Task {task.id} locked as done.")
-        participants = {task.owner_id}
-        for comment in task.comments:
-            participants.add(comment.user_id)
-        num_participants = len(participants)
-        if num_participants > 0:
-            xp_split = 10 // num_participants
-            currency_split = 5 // num_participants
-            for user_id in participants:
-                u = db.query(User).filter(User.id == user_id).first()
-                if u:
-                    u.xp += xp_split
-                    u.currency += currency_split
-            db.commit()
-    
     return {"message": "Task updated", "task_id": task.id}
 
+def award_participants(task_id: int, db: Session, xp_total: int = COMPLETION_XP, currency_total: int = COMPLETION_CURRENCY):
+    """
+    Split the completion reward between the task owner and every commenter.
+    Participants are found in one query and paid with a single set-based UPDATE
+    (xp = xp + n), so concurrent completions never overwrite each other's awards.
+    The caller owns the transaction and commits it.
+    """
+    participants = union(
+        select(Task.owner_id.label("user_id")).where(Task.id == task_id),
+        select(Comment.user_id).where(Comment.task_id == task_id),
+    ).subquery()
+    participant_ids = [
+        row.user_id for row in db.execute(select(participants.c.user_id)) if row.user_id is not None
+    ]
+    if not participant_ids:
+        return []
+    xp_split = xp_total // len(participant_ids)
+    currency_split = currency_total // len(participant_ids)
+    db.execute(
+        update(User)
+        .where(User.id.in_(participant_ids))
+        .values(
+            xp=func.coalesce(User.xp, 0) + xp_split,
+            currency=func.coalesce(User.currency, 0) + currency_split,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return participant_ids
+
+def live_membership(db: Session, quest_log_id: int, user_id: int):
+    """The user's membership of a quest log that is not being deleted, or None."""
+    return db.query(QuestLogMembership).filter(
+        QuestLogMembership.quest_log_id == quest_log_id,
+        QuestLogMembership.user_id == user_id,
+        QuestLogMembership.quest_log.has(QuestLog.deleted_at.is_(None))
+    ).first()
+
+# Mirror a task into another quest log (Oracle Task).
+@router.post("/{task_id}/mirrors", response_model=dict)
+def create_mirror(task_id: int, mirror_data: MirrorCreate, db: Session = Depends(get_db)):
+    logging_config.update_request_context(user=mirror_data.username, quest_log_id=str(mirror_data.quest_log_id))
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    user = db.query(User).filter(User.username == mirror_data.username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    if mirror_data.quest_log_id == task.quest_log_id:
+        raise HTTPException(status_code=400, detail="A task cannot be mirrored into its own Quest Log")
+    # Members (not spectators) of both boards only.
+    for quest_log_id in (task.quest_log_id, mirror_data.quest_log_id):
+        membership = live_membership(db, quest_log_id, user.id)
+        if not membership or membership.role != "member":
+            raise HTTPException(status_code=403, detail="User must be a member of both Quest Logs")
+    existing = db.query(TaskMirror.id).filter(
+        TaskMirror.quest_log_id == mirror_data.quest_log_id, TaskMirror.task_id == task_id
+    ).first()
+    if existing:
+        raise HTTPException(status_code=400, detail="Task is already mirrored into that Quest Log")
+    mirror = TaskMirror(task_id=task_id, quest_log_id=mirror_data.quest_log_id, note=mirror_data.note)
+    db.add(mirror)
+    db.add(QLActivity(
+        quest_log_id=mirror_data.quest_log_id,
+        user_id=user.id,
+        action="task_mirrored",
+        details=f"Task {task_id} mirrored from Quest Log {task.quest_log_id} by {user.username}"
+    ))
+    db.commit()
+    logging_config.backend_logger.info(
+        f"Task {task_id} mirrored into Quest Log {mirror_data.quest_log_id} by '{user.username}' (mirror {mirror.id})."
+    )
+    return {"message": "Task mirrored", "mirror_id": mirror.id}
+
+# List the quest logs a task is mirrored into.
+@router.get("/{task_id}/mirrors", response_model=list)
+def list_mirrors(task_id: int, db: Session = Depends(get_db)):
+    rows = db.execute(
+        select(TaskMirror.id, TaskMirror.quest_log_id, QuestLog.name, TaskMirror.note, TaskMirror.created_at)
+        .join(QuestLog, QuestLog.id == TaskMirror.quest_log_id)
+        .where(TaskMirror.task_id == task_id, QuestLog.deleted_at.is_(None))
+        .order_by(TaskMirror.id)
+    ).all()
+    return [
+        {"id": m.id, "quest_log_id": m.quest_log_id, "quest_log_name": m.name, "note": m.note, "created_at": m.created_at}
+        for m in rows
+    ]
+
+# Remove a mirror: the task's owner or a member of the board it is mirrored into.
+@router.delete("/{task_id}/mirrors/{mirror_id}", response_model=dict)
+def remove_mirror(task_id: int, mirror_id: int, username: str, db: Session = Depends(get_db)):
+    mirror = db.query(TaskMirror).filter(TaskMirror.id == mirror_id, TaskMirror.task_id == task_id).first()
+    if not mirror:
+        raise HTTPException(status_code=404, detail="Mirror not found")
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    logging_config.update_request_context(user=username, quest_log_id=str(mirror.quest_log_id))
+    membership = live_membership(db, mirror.quest_log_id, user.id)
+    if mirror.task.owner_id != user.id and not (membership and membership.role == "member"):
+        raise HTTPException(status_code=403, detail="Only the task owner or a board member can remove a mirror")
+    db.add(QLActivity(
+        quest_log_id=mirror.quest_log_id,
+        user_id=user.id,
+        action="task_unmirrored",
+        details=f"Mirror of task {task_id} removed by {username}"
+    ))
+    db.delete(mirror)
+    db.commit()
+    logging_config.backend_logger.info(f"Mirror {mirror_id} of task {task_id} removed by '{username}'.")
+    return {"message": "Mirror removed"}
+
 # Add a comment to a task.
 @router.post("/comment", response_model=dict)
 def add_comment(comment_data: CommentCreate, db: Session = Depends(get_db)):
@@ -273,6 +444,11 @@ def add_comment(comment_data: CommentCreate, db: Session = Depends(get_db)):
         user_id=user.id
     )
     db.add(comment)
+    db.flush()
+    event = {"comment_id": comment.id, "task_id": task.id, "username": user.username}
+    if not task.is_private:
+        event["content"] = comment.content
+    webhooks.emit(db, task.quest_log_id, "comment.added", event)
     db.commit()
     db.refresh(comment)
     logging_config.backend_logger.info(f"Comment {comment.id} added to task {task.id} by '{user.username}'.")
@@ -322,8 +498,10 @@ def edit_task_description(task_id: int, edit_data: TaskEdit, username: str, db:
 @router.post("/dev/purge", response_model=dict)
 def purge_tasks(db: Session = Depends(get_db)):
     db.execute(text("DELETE FROM task_history;"))
+    db.execute(text("DELETE FROM task_occurrences;"))
     db.execute(text("DELETE FROM stories;"))
     db.execute(text("DELETE FROM comments;"))
+    db.execute(text("DELETE FROM task_mirrors WHERE task_id IN (SELECT id FROM tasks);"))
     db.execute(text("DELETE FROM tasks;"))
     db.commit()
     logging_config.backend_logger.info("All tasks purged by developer command.")
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Body
 from sqlalchemy.orm import Session
-from ..db import SessionLocal
-from ..models import User
+from sqlalchemy import update
+from datetime import datetime
+from ..db import get_db
+from ..models import User, Notification
 from pydantic import BaseModel, EmailStr
 from passlib.context import CryptContext
 from typing import Optional
@@ -10,13 +12,6 @@ router = APIRouter()
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 class UserLogin(BaseModel):
     identifier: str
     password: str
@@ -122,3 +117,40 @@ def update_user_settings(username: str, settings: dict, db: Session = Depends(ge
         "skip_confirm_begin": user.skip_confirm_begin,
         "skip_confirm_end": user.skip_confirm_end
     }}
+
+@router.get("/{username}/notifications", response_model=list)
+def get_notifications(
+    username: str,
+    unread_only: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """The user's in-app notification feed, newest first."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    query = db.query(Notification).filter(Notification.user_id == user.id)
+    if unread_only:
+        query = query.filter(Notification.read_at.is_(None))
+    return [{
+        "id": n.id,
+        "kind": n.kind,
+        "task_id": n.task_id,
+        "message": n.message,
+        "due_at": n.due_at,
+        "created_at": n.created_at,
+        "read": n.read_at is not None
+    } for n in query.order_by(Notification.id.desc()).limit(limit)]
+
+@router.post("/{username}/notifications/read", response_model=dict)
+def mark_notifications_read(username: str, payload: dict = Body(default={}), db: Session = Depends(get_db)):
+    """Mark the notifications listed in payload["ids"] read, or all of the user's notifications."""
+    user = db.query(User).filter(User.username == username).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    condition = [Notification.user_id == user.id, Notification.read_at.is_(None)]
+    if payload.get("ids") is not None:
+        condition.append(Notification.id.in_(payload["ids"]))
+    marked = db.execute(update(Notification).where(*condition).values(read_at=datetime.utcnow())).rowcount
+    db.commit()
+    return {"message": "Notifications marked read", "count": marked}
@@ -1,26 +1,120 @@
-# backend/scheduler.py
+"""
+backend/scheduler.py
+--------------------
+Background job loop for TaskFable.
+Each job runs on its own interval with a fresh session; a failing job is logged and
+retried on its next tick without stopping the others. Jobs only run while this process
+holds the "scheduler" lease (backend/cluster.py), so however many schedulers are running
+(one per worker of a multi-worker deployment, plus any standalone one), one runs the jobs.
+Jobs:
+  - run_recurrence:   materialize occurrences of recurring tasks and reopen the ones that
+                      have come due (backend/recurrence.py).
+  - send_notifications: queue due-date reminders and send them as digests (backend/notifications.py).
+  - deliver_webhooks: send queued webhook deliveries and retry failed ones (backend/webhooks.py).
+  - refresh_rollups:  fold new rows into the daily rollup tables (backend/rollups.py).
+  - sweep_invites:    mark revoked, used and expired invites archived (backend/retention.py).
+  - process_deletions: run queued or interrupted quest log deletions (backend/deletion.py).
+  - apply_retention:  compact and archive old history/activity/invite rows (backend/retention.py).
+  - maintain_database: ANALYZE, and VACUUM when enough pages are free.
+  - prune_invalidations: delete old cross-worker cache invalidations (backend/cluster.py).
+Job runs and durations are written to logs/metrics/scheduler.prom after each tick, which
+the API's /metrics endpoint includes.
+Run it as a separate process from the project root:
+    python -m backend.scheduler
+or let the workers of `python -m backend.cluster` run it.
+"""
+
+import threading
 import time
-from datetime import datetime
-from db import SessionLocal
-from models import Task, TaskStatus
-
-def schedule_tasks():
-    """
-    Periodically checks for tasks with a scheduled_time in the past.
-    If a task’s scheduled_time is due and it has a repeat_interval, reset its status to "To-Do".
-    """
-    db = SessionLocal()
+from contextlib import nullcontext
+from typing import Optional
+
+from .db import SessionLocal, engine
+from .models import ensure_schema
+from . import rollups, retention, deletion, recurrence, notifications, webhooks, cluster
+from . import logging_config, metrics
+
+TICK_SECONDS = 5
+
+def run_recurrence(db):
+    recurrence.run_recurrence(db)
+
+def send_notifications(db):
+    notifications.send_notifications(db)
+
+def deliver_webhooks(db):
+    webhooks.deliver_webhooks(db)
+
+def refresh_rollups(db):
+    rollups.refresh_all(db)
+
+def sweep_invites(db):
+    retention.sweep_invites(db)
+
+def process_deletions(db):
+    deletion.process_deletions(db)
+
+def apply_retention(db):
+    retention.apply_retention(db)
+
+def maintain_database(db):
+    retention.maintain_database(db)
+
+def prune_invalidations(db):
+    cluster.prune_invalidations(db)
+
+# (job, interval in seconds)
+JOBS = [
+    (run_recurrence, 60),
+    (send_notifications, 60),
+    (deliver_webhooks, TICK_SECONDS),
+    (refresh_rollups, 60),
+    (sweep_invites, 600),
+    (process_deletions, 60),
+    (apply_retention, 3600),
+    (maintain_database, 24 * 3600),
+    (prune_invalidations, 600),
+]
+
+def run_due_jobs(last_run: dict, now: float, leader: Optional[cluster.Leader] = None):
+    for job, interval in JOBS:
+        last = last_run.get(job.__name__)
+        if last is not None and now - last < interval:
+            continue
+        # Checked before every job (stopping if the lease was lost), and renewed while it runs.
+        if leader is not None and not leader.acquire():
+            return
+        last_run[job.__name__] = now
+        db = SessionLocal()
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            with leader.heartbeat() if leader is not None else nullcontext():
+                job(db)
+        except Exception as e:
+            outcome = "error"
+            db.rollback()
+            logging_config.backend_logger.error(f"Scheduler job '{job.__name__}' failed: {e}")
+        finally:
+            db.close()
+            metrics.SCHEDULER_RUNS.inc(job.__name__, outcome)
+            metrics.SCHEDULER_DURATION.observe(time.perf_counter() - start, job.__name__)
+
+def schedule_tasks(stop: Optional[threading.Event] = None, leader: Optional[cluster.Leader] = None):
+    """Tick until `stop` is set, running the due jobs whenever this process is the leader."""
+    stop = stop or threading.Event()
+    leader = leader or cluster.Leader()
+    last_run = {}
+    logging_config.backend_logger.info(f"Scheduler started ({leader.holder}).")
     try:
-        while True:
-            now = datetime.utcnow()
-            tasks_to_update = db.query(Task).filter(Task.scheduled_time <= now).all()
-            for task in tasks_to_update:
-                # If the task is not already active, reset its status
-                if task.status != TaskStatus.todo:
-                    task.status = TaskStatus.todo
-                    db.commit()
-            time.sleep(60)  # Check every minute
+        while not stop.is_set():
+            if leader.acquire():
+                run_due_jobs(last_run, time.monotonic(), leader)
+                metrics.write_textfile("scheduler", prefix="taskfable_scheduler_")
+            stop.wait(TICK_SECONDS)
     finally:
-        db.close()
+        leader.release()
 
-# To run the scheduler, you might want to start it in a separate process or thread.
+if __name__ == "__main__":
+    ensure_schema(engine)
+    schedule_tasks()
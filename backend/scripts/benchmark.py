@@ -0,0 +1,482 @@
+"""
+backend/scripts/benchmark.py
+----------------------------
+Performance benchmarks and a load-test driver for the TaskFable API.
+The app runs in-process against a throwaway SQLite database (the shared get_db dependency
+is overridden), filled by the data generator with one quest log of N users, tasks, comments,
+history rows, stories and activities. Then:
+  - micro-benchmarks time repeated calls of get_tasks, get_activities, get_participants,
+    get_stories, search, status transitions (Doing <-> Waiting, and -> Done) and login;
+  - the load test fires a weighted mix of those requests from concurrent workers;
+  - a separate board of --board-tasks tasks (1,000 by default) is serialized with FastAPI's
+    default path (jsonable_encoder + JSONResponse) and with FastJSONResponse, and the body
+    size is recorded raw, gzip- and (if available) brotli-compressed;
+  - the same board is built once the former way (ORM entities turned into dicts) and once
+    the current way (column rows into slotted views) under tracemalloc, giving the peak and
+    retained bytes per task of each.
+Each result reports p50/p95/p99 latency, throughput and SQL statements per call.
+To-Do -> Doing is never benchmarked, as it runs LLM story generation.
+
+Results are written to backend/logs/tests/benchmark.json (the previous file is archived
+as benchmark_<timestamp>.json) with the change in p95 against the previous run;
+generate_test_report.py folds them into the HTML report.
+
+Usage (from the project root):
+    python -m backend.scripts.benchmark [--users 20] [--tasks 500] [--iterations 50]
+                                        [--concurrency 8] [--requests 500] [--board-tasks 1000]
+"""
+
+import argparse
+import gc
+import gzip
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from ..main import app
+from ..models import (
+    User, QuestLog, QuestLogMembership, QLActivity, Task, TaskStatus, TaskHistory, Comment, Story,
+    ensure_schema,
+)
+from ..routers import users, tasks
+from ..db import get_db
+from ..responses import FastJSONResponse
+from ..compression import GZIP_LEVEL, BROTLI_QUALITY, brotli
+from .. import metrics
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORT_DIR = os.path.join(BASE_DIR, "..", "logs", "tests")
+BENCHMARK_FILE = os.path.join(REPORT_DIR, "benchmark.json")
+# A p95 more than this much slower than the previous run is flagged as a regression.
+REGRESSION_THRESHOLD = 0.20
+
+BENCH_PASSWORD = "benchmark-password"
+
+@dataclass
+class Dataset:
+    quest_log_id: int
+    usernames: List[str]
+    # Task ids by status; transitions move ids between the lists.
+    task_ids: Dict[TaskStatus, List[int]] = field(default_factory=dict)
+
+def generate_dataset(session, num_users: int = 20, num_tasks: int = 500, comments_per_task: int = 2,
+                     history_per_task: int = 4, activities_per_user: int = 3, seed: int = 42,
+                     user_prefix: str = "bench_user") -> Dataset:
+    """Bulk-insert one quest log with its users, tasks, comments, history, stories and activities."""
+    rng = random.Random(seed)
+    password = users.pwd_context.hash(BENCH_PASSWORD)
+    usernames = [f"{user_prefix}_{i}" for i in range(num_users)]
+    session.execute(insert(User), [
+        {"username": name, "email": f"{name}@example.com", "password": password, "xp": 0, "currency": 0}
+        for name in usernames
+    ])
+    user_ids = list(session.scalars(select(User.id).where(User.username.in_(usernames)).order_by(User.id)))
+    quest_log_id = session.execute(insert(QuestLog).values(name="Benchmark Board", owner_id=user_ids[0])).inserted_primary_key[0]
+    session.execute(insert(QuestLogMembership), [
+        {"quest_log_id": quest_log_id, "user_id": uid, "role": "member"} for uid in user_ids
+    ])
+
+    now = datetime.utcnow()
+    statuses = [TaskStatus.todo, TaskStatus.doing, TaskStatus.waiting, TaskStatus.done]
+    task_rows = []
+    for i in range(num_tasks):
+        task_rows.append({
+            "title": f"Benchmark task {i}",
+            "description": "Generated by the benchmark suite. " * 3,
+            "status": statuses[i % len(statuses)],
+            "owner_id": rng.choice(user_ids),
+            "co_owner_ids": ",".join(str(uid) for uid in rng.sample(user_ids, min(2, len(user_ids)))),
+            "is_private": i % 10 == 0,
+            "locked": statuses[i % len(statuses)] == TaskStatus.done,
+            "quest_log_id": quest_log_id,
+            "created_at": now - timedelta(days=rng.randint(1, 60)),
+        })
+    session.execute(insert(Task), task_rows)
+    task_rows = session.execute(
+        select(Task.id, Task.status, Task.owner_id, Task.created_at).where(Task.quest_log_id == quest_log_id)
+    ).all()
+
+    comments, history, story_rows = [], [], []
+    flow = {
+        TaskStatus.todo: ["Created"],
+        TaskStatus.doing: ["Created", "Doing"],
+        TaskStatus.waiting: ["Created", "Doing", "Waiting"],
+        TaskStatus.done: ["Created", "Doing", "Waiting", "Doing", "Done"],
+    }
+    for task in task_rows:
+        for c in range(comments_per_task):
+            comments.append({"task_id": task.id, "user_id": rng.choice(user_ids), "content": f"Comment {c}",
+                             "created_at": task.created_at + timedelta(hours=c + 1)})
+        states = flow[task.status]
+        states = states + [states[-1]] * max(0, history_per_task - len(states))
+        for step, state in enumerate(states):
+            history.append({"task_id": task.id, "status": state, "timestamp": task.created_at + timedelta(hours=step)})
+        if task.status != TaskStatus.todo:
+            story_rows.append({"task_id": task.id, "owner_id": task.owner_id, "story_text": "Once upon a benchmark... " * 5,
+                               "xp": 10, "currency": 5, "created_at": task.created_at + timedelta(hours=1)})
+    activities = [
+        {"quest_log_id": quest_log_id, "user_id": uid, "action": rng.choice(["joined", "spectated", "invite_generated"]),
+         "details": "Generated by the benchmark suite", "timestamp": now - timedelta(minutes=rng.randint(1, 100000))}
+        for uid in user_ids for _ in range(activities_per_user)
+    ]
+    for model, rows in ((Comment, comments), (TaskHistory, history), (Story, story_rows), (QLActivity, activities)):
+        if rows:
+            session.execute(insert(model), rows)
+    session.commit()
+
+    dataset = Dataset(quest_log_id=quest_log_id, usernames=usernames)
+    for status in statuses:
+        dataset.task_ids[status] = [t.id for t in task_rows if t.status == status]
+    return dataset
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], wall_seconds: float = None, queries: float = None) -> dict:
+    ordered = sorted(latencies)
+    total = wall_seconds if wall_seconds is not None else sum(ordered)
+    summary = {
+        "calls": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        "ops_per_sec": round(len(ordered) / total, 2) if total else 0.0,
+    }
+    if queries is not None and ordered:
+        summary["queries_per_call"] = round(queries / len(ordered), 2)
+    return summary
+
+class Operations:
+    """The benchmarked requests, each returning the HTTP status code."""
+    def __init__(self, client: TestClient, dataset: Dataset, seed: int = 7):
+        self.client = client
+        self.dataset = dataset
+        self.viewer = dataset.usernames[0]
+        self.rng = random.Random(seed)
+        # Load-test workers share the task id lists.
+        self._lock = threading.Lock()
+
+    def get_tasks(self):
+        return self.client.get("/tasks/", params={"viewer_username": self.viewer, "quest_log_id": self.dataset.quest_log_id}).status_code
+
+    def get_activities(self):
+        return self.client.get(f"/questlogs/{self.dataset.quest_log_id}/activities").status_code
+
+    def get_participants(self):
+        return self.client.get(f"/questlogs/{self.dataset.quest_log_id}/participants").status_code
+
+    def get_stories(self):
+        return self.client.get("/stories/", params={"viewer_username": self.viewer}).status_code
+
+    def search(self):
+        """A term every task, comment and story matches (the slowest case to rank), or a rarer one."""
+        term = self.rng.choice(["benchmark", "upon", f"task {self.rng.randrange(1000)}"])
+        return self.client.get("/search/", params={"username": self.viewer, "q": term}).status_code
+
+    def _transition(self, task_id: int, new_status: TaskStatus):
+        return self.client.put(f"/tasks/{task_id}/status",
+                               json={"new_status": new_status.value, "username": self.viewer}).status_code
+
+    def status_toggle(self):
+        """Move a Doing task to Waiting, or a Waiting task back to Doing."""
+        ids = self.dataset.task_ids
+        with self._lock:
+            source = TaskStatus.doing if self.rng.random() < 0.5 and ids[TaskStatus.doing] else TaskStatus.waiting
+            target = TaskStatus.waiting if source == TaskStatus.doing else TaskStatus.doing
+            if not ids[source]:
+                source, target = target, source
+            task_id = ids[source].pop(self.rng.randrange(len(ids[source])))
+        status = self._transition(task_id, target)
+        with self._lock:
+            ids[target if status == 200 else source].append(task_id)
+        return status
+
+    def status_done(self):
+        ids = self.dataset.task_ids
+        with self._lock:
+            source = TaskStatus.doing if ids[TaskStatus.doing] else TaskStatus.waiting
+            task_id = ids[source].pop()
+        status = self._transition(task_id, TaskStatus.done)
+        with self._lock:
+            ids[TaskStatus.done if status == 200 else source].append(task_id)
+        return status
+
+    def login(self):
+        return self.client.post("/users/login", json={"identifier": self.rng.choice(self.dataset.usernames),
+                                                      "password": BENCH_PASSWORD}).status_code
+
+def time_operation(operation: Callable[[], int], iterations: int, warmup: int = 2) -> dict:
+    for _ in range(warmup):
+        operation()
+    latencies = []
+    queries_before = metrics.DB_QUERIES.value()
+    for _ in range(iterations):
+        start = time.perf_counter()
+        status = operation()
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"{operation.__name__} returned HTTP {status}")
+    return summarize(latencies, queries=metrics.DB_QUERIES.value() - queries_before)
+
+# Weighted request mix of the load test (read-heavy, like a board being watched).
+LOAD_MIX = [("get_tasks", 0.55), ("get_activities", 0.15), ("get_participants", 0.1),
+            ("get_stories", 0.1), ("status_toggle", 0.1)]
+
+def load_test(ops: Operations, concurrency: int, total_requests: int, seed: int = 11) -> dict:
+    """Fire `total_requests` requests from the LOAD_MIX across `concurrency` workers."""
+    rng = random.Random(seed)
+    names, weights = zip(*LOAD_MIX)
+    plan = rng.choices(names, weights=weights, k=total_requests)
+    results = []
+
+    def run(name):
+        start = time.perf_counter()
+        status = getattr(ops, name)()
+        return name, status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, plan))
+    wall = time.perf_counter() - start
+
+    by_operation = defaultdict(list)
+    errors = defaultdict(int)
+    for name, status, latency in results:
+        by_operation[name].append(latency)
+        # Concurrent transitions of the same task are expected to conflict (409).
+        if status != 200 and not (name == "status_toggle" and status in (400, 409)):
+            errors[name] += 1
+    return {
+        "concurrency": concurrency,
+        "overall": summarize([latency for _, _, latency in results], wall_seconds=wall),
+        "operations": {name: summarize(latencies) for name, latencies in sorted(by_operation.items())},
+        "errors": dict(errors),
+    }
+
+def serialization_benchmark(session, board: Dataset, iterations: int) -> tuple:
+    """
+    Time serializing one board (the get_tasks payload) with FastAPI's default path and with
+    FastJSONResponse, and measure its size. Returns (benchmarks, payload sizes in bytes).
+    """
+    payload = tasks.load_board(session, board.quest_log_id, board.usernames[0])
+    # Both responses render their body on construction; status_code is what time_operation checks.
+    serializers = {
+        "serialize_board_default": lambda: JSONResponse(jsonable_encoder(payload)).status_code,
+        "serialize_board_fast": lambda: FastJSONResponse(payload).status_code,
+    }
+    benchmarks = {name: time_operation(serialize, iterations) for name, serialize in serializers.items()}
+    body = FastJSONResponse(payload).body
+    sizes = {"tasks": len(payload), "identity": len(body), "gzip": len(gzip.compress(body, GZIP_LEVEL))}
+    if brotli is not None:
+        sizes["br"] = len(brotli.compress(body, quality=BROTLI_QUALITY))
+    return benchmarks, sizes
+
+def former_board(session, quest_log_id: int) -> list:
+    """The board as get_tasks used to build it: full ORM entities, copied into one dict per task."""
+    board_tasks = session.query(Task).filter(Task.quest_log_id == quest_log_id).all()
+    history, comments = defaultdict(list), defaultdict(list)
+    for h in session.query(TaskHistory).join(Task, TaskHistory.task_id == Task.id).filter(Task.quest_log_id == quest_log_id):
+        history[h.task_id].append({"status": h.status, "timestamp": h.timestamp.isoformat()})
+    for c in session.query(Comment).join(Task, Comment.task_id == Task.id).filter(Task.quest_log_id == quest_log_id):
+        comments[c.task_id].append(c)
+    return [{
+        "id": t.id, "title": t.title, "description": t.description, "color": t.color, "status": t.status,
+        "scheduled_time": t.scheduled_time, "repeat_interval": t.repeat_interval, "is_private": t.is_private,
+        "locked": t.locked, "owner_id": t.owner_id, "owner_username": str(t.owner_id), "co_owners": [],
+        "comments": [{"id": c.id, "content": c.content, "created_at": c.created_at, "user_id": c.user_id,
+                      "owner_username": str(c.user_id)} for c in comments[t.id]],
+        "history": history[t.id], "created_at": t.created_at,
+    } for t in board_tasks]
+
+def traced_memory(build) -> tuple:
+    """(peak, retained) bytes allocated while `build()` runs, retained meaning still held by its result."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        retained, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak, retained
+
+def memory_benchmark(session_factory, board: Dataset) -> dict:
+    """Peak and retained bytes per task of building one board the former and the current way."""
+    def measure(build):
+        session = session_factory()
+        try:
+            return traced_memory(lambda: build(session))
+        finally:
+            session.close()
+
+    former = measure(lambda session: former_board(session, board.quest_log_id))
+    current = measure(lambda session: tasks.load_board(session, board.quest_log_id, board.usernames[0]))
+    num_tasks = sum(len(ids) for ids in board.task_ids.values()) or 1
+    result = {"tasks": num_tasks}
+    for name, (peak, retained) in (("former", former), ("current", current)):
+        result[f"{name}_peak_bytes_per_task"] = round(peak / num_tasks)
+        result[f"{name}_retained_bytes_per_task"] = round(retained / num_tasks)
+    result["retained_reduction"] = round(1 - current[1] / former[1], 3) if former[1] else 0.0
+    return result
+
+def compare(current: dict, previous: dict) -> dict:
+    """Per-benchmark p95 change against the previous run; flags regressions past the threshold."""
+    comparison = {}
+    previous_results = dict(previous.get("benchmarks", {}))
+    if "load_test" in previous:
+        previous_results["load_test"] = previous["load_test"]["overall"]
+    current_results = dict(current["benchmarks"])
+    current_results["load_test"] = current["load_test"]["overall"]
+    for name, result in current_results.items():
+        before = previous_results.get(name)
+        if not before or not before.get("p95_ms"):
+            continue
+        change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        comparison[name] = {
+            "previous_p95_ms": before["p95_ms"],
+            "p95_change": round(change, 4),
+            "regression": change > REGRESSION_THRESHOLD,
+        }
+    return comparison
+
+def archive_previous_results():
+    if not os.path.exists(BENCHMARK_FILE):
+        return None
+    with open(BENCHMARK_FILE, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    timestamp = datetime.fromtimestamp(os.path.getmtime(BENCHMARK_FILE)).strftime("%Y%m%d_%H%M%S")
+    archived_file = os.path.join(REPORT_DIR, f"benchmark_{timestamp}.json")
+    shutil.move(BENCHMARK_FILE, archived_file)
+    print(f"Archived previous benchmark results as: {archived_file}")
+    previous["archived_as"] = os.path.basename(archived_file)
+    return previous
+
+def run_benchmarks(num_users: int = 20, num_tasks: int = 500, comments_per_task: int = 2, history_per_task: int = 4,
+                   iterations: int = 50, login_iterations: int = 5, concurrency: int = 8, load_requests: int = 500,
+                   board_tasks: int = 1000) -> dict:
+    """Build a throwaway database, run the micro-benchmarks and the load test, and return the results."""
+    workdir = tempfile.mkdtemp(prefix="taskfable-bench-")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}", connect_args={"check_same_thread": False})
+    metrics.instrument_engine(engine)
+    BenchSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_bench_db():
+        db = BenchSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    overrides = dict(app.dependency_overrides)
+    try:
+        ensure_schema(engine)
+        session = BenchSession()
+        started = time.perf_counter()
+        dataset = generate_dataset(session, num_users, num_tasks, comments_per_task, history_per_task)
+        session.close()
+        generate_seconds = time.perf_counter() - started
+        app.dependency_overrides[get_db] = get_bench_db
+        client = TestClient(app)
+        ops = Operations(client, dataset)
+
+        benchmarks = {}
+        for name in ("get_tasks", "get_activities", "get_participants", "get_stories", "search", "status_toggle"):
+            benchmarks[name] = time_operation(getattr(ops, name), iterations)
+            print(f"{name}: {benchmarks[name]}")
+        done_available = len(dataset.task_ids[TaskStatus.doing]) + len(dataset.task_ids[TaskStatus.waiting])
+        benchmarks["status_done"] = time_operation(ops.status_done, min(iterations, max(1, done_available // 4)), warmup=0)
+        print(f"status_done: {benchmarks['status_done']}")
+        benchmarks["login"] = time_operation(ops.login, login_iterations, warmup=1)
+        print(f"login: {benchmarks['login']}")
+        load = load_test(ops, concurrency, load_requests)
+        print(f"load_test: {load['overall']}")
+        # Last, so the extra board does not change what the request benchmarks see.
+        session = BenchSession()
+        board = generate_dataset(session, 20, board_tasks, comments_per_task, history_per_task, user_prefix="board_user")
+        serialization, payload_bytes = serialization_benchmark(session, board, iterations)
+        session.close()
+        benchmarks.update(serialization)
+        for name, result in serialization.items():
+            print(f"{name}: {result}")
+        print(f"board payload bytes: {payload_bytes}")
+        board_memory = memory_benchmark(BenchSession, board)
+        print(f"board memory: {board_memory}")
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(overrides)
+        engine.dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform()},
+        "parameters": {
+            "users": num_users, "tasks": num_tasks, "comments_per_task": comments_per_task,
+            "history_per_task": history_per_task, "iterations": iterations, "login_iterations": login_iterations,
+            "concurrency": concurrency, "load_requests": load_requests, "board_tasks": board_tasks,
+        },
+        "dataset_seconds": round(generate_seconds, 3),
+        "benchmarks": benchmarks,
+        "load_test": load,
+        "board_payload_bytes": payload_bytes,
+        "board_memory": board_memory,
+    }
+
+def save_results(results: dict) -> dict:
+    """Archive the previous results, attach the comparison against them, and write benchmark.json."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    previous = archive_previous_results()
+    if previous is not None:
+        results["baseline"] = previous.get("archived_as")
+        results["comparison"] = compare(results, previous)
+    with open(BENCHMARK_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Benchmark results written to: {BENCHMARK_FILE}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the TaskFable API benchmarks.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--tasks", type=int, default=500)
+    parser.add_argument("--comments", type=int, default=2, help="Comments per task")
+    parser.add_argument("--history", type=int, default=4, help="History rows per task")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--login-iterations", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="Requests in the load test")
+    parser.add_argument("--board-tasks", type=int, default=1000, help="Tasks on the board used for the serialization benchmark")
+    args = parser.parse_args()
+    results = save_results(run_benchmarks(
+        args.users, args.tasks, args.comments, args.history, args.iterations, args.login_iterations,
+        args.concurrency, args.requests, args.board_tasks,
+    ))
+    regressions = [name for name, c in results.get("comparison", {}).items() if c["regression"]]
+    if regressions:
+        print(f"p95 regressions over {REGRESSION_THRESHOLD:.0%}: {', '.join(regressions)}")
+
+if __name__ == "__main__":
+    main()
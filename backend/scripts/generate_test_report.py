@@ -5,12 +5,20 @@ This script runs the pytest test suite with JSON reporting enabled,
 reads the resulting JSON file, and then generates an HTML report that includes
 a table with test results (test name, outcome, duration, and a timestamp).
 The report adapts its styling for white and dark mode using media queries.
+Per-endpoint SQL statement counts and timings recorded by tests/conftest.py
+("endpoint_queries" in the JSON report) are listed below the test results.
+If benchmark results exist (backend/logs/tests/benchmark.json, see benchmark.py), they are
+added to the report with the p95 change against the previous archived run.
+Pass --benchmark to run the benchmarks before generating the report, and --workers N to
+run the tests on N parallel pytest-xdist workers ("auto" for one per CPU); each worker uses
+its own database (see tests/conftest.py) and the report gets a per-worker summary.
 The generated HTML report is saved under backend/logs/tests/test_report.html.
 """
 
 import subprocess
 import json
 import os
+import sys
 from datetime import datetime
 import shutil
 
@@ -23,6 +31,7 @@ if not os.path.exists(REPORT_DIR):
 
 JSON_REPORT_FILE = os.path.join(REPORT_DIR, "report.json")
 HTML_REPORT_FILE = os.path.join(REPORT_DIR, "test_report.html")
+BENCHMARK_FILE = os.path.join(REPORT_DIR, "benchmark.json")
 
 def archive_previous_report():
     if os.path.exists(JSON_REPORT_FILE):
@@ -35,10 +44,12 @@ def archive_previous_report():
         shutil.move(JSON_REPORT_FILE, archived_file)
         print(f"Archived previous JSON report as: {archived_file}")
 
-def run_tests():
+def run_tests(workers=None):
     print("Running pytest with JSON report...")
     archive_previous_report()
     cmd = ["pytest", "--json-report", f"--json-report-file={JSON_REPORT_FILE}"]
+    if workers:
+        cmd += ["-n", str(workers)]
     result = subprocess.run(cmd, capture_output=True, text=True)
     print("Pytest stdout:")
     print(result.stdout)
@@ -47,6 +58,168 @@ def run_tests():
         print(result.stderr)
     return result.returncode
 
+def run_benchmarks():
+    print("Running benchmarks...")
+    project_root = os.path.abspath(os.path.join(BASE_DIR, "..", ".."))
+    result = subprocess.run([sys.executable, "-m", "backend.scripts.benchmark"], cwd=project_root,
+                            capture_output=True, text=True)
+    print(result.stdout)
+    if result.returncode != 0:
+        print("Benchmark run failed:")
+        print(result.stderr)
+    return result.returncode
+
+def benchmark_rows(results):
+    """(name, result, comparison) for each micro-benchmark and the load test."""
+    comparison = results.get("comparison", {})
+    rows = [(name, result, comparison.get(name)) for name, result in results.get("benchmarks", {}).items()]
+    if "load_test" in results:
+        name = f"load_test (x{results['load_test']['concurrency']})"
+        rows.append((name, results["load_test"]["overall"], comparison.get("load_test")))
+    return rows
+
+def worker_rows(report):
+    """Per worker (from the test metadata): tests, passed, failed and total duration."""
+    workers = {}
+    for test in report.get("tests", []):
+        worker = test.get("metadata", {}).get("worker", "main")
+        row = workers.setdefault(worker, {"tests": 0, "passed": 0, "failed": 0, "duration": 0.0})
+        row["tests"] += 1
+        if test.get("outcome") in ("passed", "failed"):
+            row[test["outcome"]] += 1
+        for phase in ("setup", "call", "teardown"):
+            row["duration"] += test.get(phase, {}).get("duration", 0)
+    return sorted(workers.items())
+
+def generate_workers_section(report):
+    rows = worker_rows(report)
+    if len(rows) < 2:
+        return ""
+    html = """
+  <h2>Workers</h2>
+  <table>
+    <tr>
+      <th>Worker</th>
+      <th>Tests</th>
+      <th>Passed</th>
+      <th>Failed</th>
+      <th>Duration (s)</th>
+    </tr>
+    """
+    for worker, row in rows:
+        html += f"""
+    <tr>
+      <td>{worker}</td>
+      <td>{row["tests"]}</td>
+      <td class="passed">{row["passed"]}</td>
+      <td class="failed">{row["failed"]}</td>
+      <td>{row["duration"]:.2f}</td>
+    </tr>
+        """
+    html += """
+  </table>
+    """
+    return html
+
+def generate_endpoint_queries_section(report):
+    endpoints = report.get("endpoint_queries") or {}
+    if not endpoints:
+        return ""
+    html = """
+  <h2>Queries per Endpoint</h2>
+  <table>
+    <tr>
+      <th>Endpoint</th>
+      <th>Calls</th>
+      <th>Max queries</th>
+      <th>Mean queries</th>
+      <th>Max (ms)</th>
+      <th>Mean (ms)</th>
+    </tr>
+    """
+    for endpoint, stats in endpoints.items():
+        html += f"""
+    <tr>
+      <td>{endpoint}</td>
+      <td>{stats["calls"]}</td>
+      <td>{stats["queries_max"]}</td>
+      <td>{stats["queries_mean"]}</td>
+      <td>{stats["ms_max"]:.2f}</td>
+      <td>{stats["ms_mean"]:.2f}</td>
+    </tr>
+        """
+    html += """
+  </table>
+    """
+    return html
+
+def board_summary(results):
+    """One line on the big-board payload size and memory per task, if the run recorded them."""
+    sizes, memory = results.get("board_payload_bytes"), results.get("board_memory")
+    parts = []
+    if sizes:
+        parts.append(f"Board of {sizes['tasks']} tasks: {sizes['identity']:,} bytes, {sizes['gzip']:,} gzipped"
+                     + (f", {sizes['br']:,} brotli" if "br" in sizes else ""))
+    if memory:
+        parts.append(f"bytes per task retained {memory['former_retained_bytes_per_task']:,} (former) vs "
+                     f"{memory['current_retained_bytes_per_task']:,} (current), peak "
+                     f"{memory['former_peak_bytes_per_task']:,} vs {memory['current_peak_bytes_per_task']:,}")
+    return f"<p>{'; '.join(parts)}</p>" if parts else ""
+
+def generate_benchmark_section():
+    if not os.path.exists(BENCHMARK_FILE):
+        return ""
+    try:
+        with open(BENCHMARK_FILE, "r", encoding="utf-8") as f:
+            results = json.load(f)
+    except Exception as e:
+        print(f"Error reading benchmark results: {e}")
+        return ""
+    params = ", ".join(f"{key}={value}" for key, value in results.get("parameters", {}).items())
+    baseline = results.get("baseline")
+    html = f"""
+  <h2>Benchmarks</h2>
+  <p>Run: {results.get("timestamp", "unknown")} | {params}</p>
+  <p>Compared with: {baseline or "no previous run"}</p>
+  {board_summary(results)}
+  <table>
+    <tr>
+      <th>Benchmark</th>
+      <th>Calls</th>
+      <th>p50 (ms)</th>
+      <th>p95 (ms)</th>
+      <th>p99 (ms)</th>
+      <th>Ops/s</th>
+      <th>Queries/call</th>
+      <th>Previous p95 (ms)</th>
+      <th>p95 change</th>
+    </tr>
+    """
+    for name, result, change in benchmark_rows(results):
+        if change:
+            change_class = "failed" if change["regression"] else "passed" if change["p95_change"] < 0 else ""
+            previous = f"{change['previous_p95_ms']:.2f}"
+            change_text = f"{change['p95_change']:+.1%}" + (" (regression)" if change["regression"] else "")
+        else:
+            change_class, previous, change_text = "", "-", "-"
+        html += f"""
+    <tr>
+      <td>{name}</td>
+      <td>{result.get("calls", 0)}</td>
+      <td>{result.get("p50_ms", 0):.2f}</td>
+      <td>{result.get("p95_ms", 0):.2f}</td>
+      <td>{result.get("p99_ms", 0):.2f}</td>
+      <td>{result.get("ops_per_sec", 0):.2f}</td>
+      <td>{result.get("queries_per_call", "-")}</td>
+      <td>{previous}</td>
+      <td class="{change_class}">{change_text}</td>
+    </tr>
+        """
+    html += """
+  </table>
+    """
+    return html
+
 def generate_html_report():
     print("Generating HTML report from JSON report...")
     try:
@@ -153,6 +326,11 @@ def generate_html_report():
             """
     html += """
   </table>
+    """
+    html += generate_workers_section(report)
+    html += generate_endpoint_queries_section(report)
+    html += generate_benchmark_section()
+    html += """
 </body>
 </html>
     """
@@ -161,7 +339,11 @@ def generate_html_report():
     print(f"HTML report generated at: {HTML_REPORT_FILE}")
 
 if __name__ == "__main__":
-    ret_code = run_tests()
+    args = sys.argv[1:]
+    if "--benchmark" in args:
+        run_benchmarks()
+    workers = args[args.index("--workers") + 1] if "--workers" in args[:-1] else None
+    ret_code = run_tests(workers)
     print("Pytest finished with return code:", ret_code)
     if ret_code == 0:
         generate_html_report()
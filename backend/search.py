@@ -0,0 +1,255 @@
+"""
+backend/search.py
+-----------------
+Full-text search over task titles and descriptions, comments and stories.
+
+SQLite: one FTS5 table, search_index(title, body, task_id), holds a copy of the searchable
+text of every task, comment and story. Its rowid encodes the source row as
+id * 4 + kind (1 task, 2 comment, 3 story), so the triggers created below can keep it in
+sync with single-row deletes and inserts on every INSERT, UPDATE and DELETE of the source
+tables, whichever code path writes them. Results are ranked with bm25 (title matches
+weigh TITLE_WEIGHT times body matches); queries matching more than RANK_LIMIT rows, where
+ranking every match would dominate the response time, are returned newest first.
+
+PostgreSQL: no copy; GIN indexes on to_tsvector() expressions of the source columns, which
+PostgreSQL maintains itself, ranked with ts_rank.
+
+Either way, results are limited to tasks on the viewer's live quest logs (their own tasks
+and the ones mirrored into them), and private tasks of other users are left out unless the
+viewer co-owns them, so hidden text can never match.
+
+Usage (from the project root), to rebuild the SQLite index from the source tables:
+    python -m backend.search rebuild
+"""
+
+import argparse
+import os
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Integer, and_, cast, column, func, literal, literal_column, or_, select, table, text, union_all
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .models import Comment, QuestLog, QuestLogMembership, Story, Task, TaskMirror
+from . import logging_config
+
+SEARCH_TABLE = "search_index"
+KINDS = {1: "task", 2: "comment", 3: "story"}
+TITLE_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+SNIPPET_TOKENS = 12
+# Queries matching more rows than this (SQLite) are returned newest first rather than ranked.
+RANK_LIMIT = int(os.getenv("TASKFABLE_SEARCH_RANK_LIMIT", "5000"))
+TS_CONFIG = "english"
+
+SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "title, body, task_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')",
+]
+# (table, kind, update columns, title, body, task id) for the sync triggers and backfill.
+SOURCES = [
+    ("tasks", 1, "title, description", "{row}.title", "{row}.description", "{row}.id"),
+    ("comments", 2, "content", "NULL", "{row}.content", "{row}.task_id"),
+    ("stories", 3, "story_text, task_id", "NULL", "{row}.story_text", "{row}.task_id"),
+]
+
+def _insert_sql(kind: int, title: str, body: str, task_id: str, row: str) -> str:
+    return (f"INSERT INTO {SEARCH_TABLE}(rowid, title, body, task_id) VALUES "
+            f"({row}.id * 4 + {kind}, {title.format(row=row)}, {body.format(row=row)}, {task_id.format(row=row)})")
+
+def _delete_sql(kind: int, row: str) -> str:
+    return f"DELETE FROM {SEARCH_TABLE} WHERE rowid = {row}.id * 4 + {kind}"
+
+def sqlite_triggers() -> List[str]:
+    statements = []
+    for name, kind, update_columns, title, body, task_id in SOURCES:
+        insert_new = _insert_sql(kind, title, body, task_id, "new")
+        delete_old = _delete_sql(kind, "old")
+        statements += [
+            f"CREATE TRIGGER IF NOT EXISTS {name}_search_insert AFTER INSERT ON {name} BEGIN {insert_new}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_search_update AFTER UPDATE OF {update_columns} ON {name} "
+            f"BEGIN {delete_old}; {insert_new}; END",
+            f"CREATE TRIGGER IF NOT EXISTS {name}_search_delete AFTER DELETE ON {name} BEGIN {delete_old}; END",
+        ]
+    return statements
+
+# Expressions shared by the PostgreSQL indexes and queries (they must match for the index to be used).
+PG_DOCUMENTS = {
+    "task": "to_tsvector('english', coalesce(tasks.title, '') || ' ' || coalesce(tasks.description, ''))",
+    "comment": "to_tsvector('english', coalesce(comments.content, ''))",
+    "story": "to_tsvector('english', coalesce(stories.story_text, ''))",
+}
+POSTGRES_DDL = [
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING GIN "
+    "(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_comments_search ON comments USING GIN (to_tsvector('english', coalesce(content, '')))",
+    "CREATE INDEX IF NOT EXISTS ix_stories_search ON stories USING GIN (to_tsvector('english', coalesce(story_text, '')))",
+]
+
+def ensure_search_index(bind):
+    """Create the search index (and, on SQLite, its triggers); a new SQLite index is filled from the source tables."""
+    dialect = bind.dialect.name
+    if dialect == "postgresql":
+        with bind.begin() as conn:
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+        return
+    if dialect != "sqlite":
+        return
+    try:
+        with bind.begin() as conn:
+            exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_TABLE}).first()
+            for statement in SQLITE_DDL + sqlite_triggers():
+                conn.execute(text(statement))
+            if not exists:
+                _backfill(conn)
+    except OperationalError as e:
+        # SQLite built without FTS5: everything else works, /search answers 503.
+        logging_config.backend_logger.warning(f"Full-text search is unavailable: {e}")
+
+def _backfill(conn):
+    for name, kind, _, title, body, task_id in SOURCES:
+        conn.execute(text(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, title, body, task_id) SELECT {name}.id * 4 + {kind}, "
+            f"{title.format(row=name)}, {body.format(row=name)}, {task_id.format(row=name)} FROM {name}"
+        ))
+
+def rebuild_search_index(bind):
+    with bind.begin() as conn:
+        conn.execute(text(f"DELETE FROM {SEARCH_TABLE}"))
+        _backfill(conn)
+        conn.execute(text(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"))
+
+def search_available(db: Session) -> bool:
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql":
+        return True
+    return db.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"), {"name": SEARCH_TABLE}).first() is not None
+
+def fts_query(query: str) -> Optional[str]:
+    """User input as an FTS5 query: every word must match, the last one as a prefix (search as you type)."""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def member_boards(viewer_id: int):
+    """Ids of the live quest logs the viewer is a member (or spectator) of, as a subquery."""
+    return select(QuestLogMembership.quest_log_id)\
+        .join(QuestLog, QuestLog.id == QuestLogMembership.quest_log_id)\
+        .where(QuestLogMembership.user_id == viewer_id, QuestLog.deleted_at.is_(None))
+
+def readable_condition(viewer_id: int):
+    """Tasks whose text the viewer may read: not private, or owned or co-owned by them."""
+    co_owner = (literal(",") + func.coalesce(Task.co_owner_ids, "") + literal(",")).like(f"%,{viewer_id},%")
+    return or_(Task.is_private.isnot(True), Task.owner_id == viewer_id, co_owner)
+
+def visible_task_condition(viewer_id: int, quest_log_id: Optional[int] = None):
+    """Tasks on the viewer's live quest logs (own or mirrored in) that the viewer may read."""
+    boards = member_boards(viewer_id)
+    if quest_log_id is not None:
+        boards = boards.where(QuestLogMembership.quest_log_id == quest_log_id)
+    mirrored = select(TaskMirror.task_id).where(TaskMirror.quest_log_id.in_(boards))
+    source_live = select(QuestLog.id).where(QuestLog.id == Task.quest_log_id, QuestLog.deleted_at.is_(None)).exists()
+    return and_(
+        or_(Task.quest_log_id.in_(boards), Task.id.in_(mirrored)),
+        source_live,
+        readable_condition(viewer_id),
+    )
+
+def _sqlite_matches(match: str):
+    """(kind, id, task_id, position, snippet, score) of every match; a higher score is a better match."""
+    index = table(SEARCH_TABLE, column("rowid", Integer), column("task_id"))
+    index_ref = literal_column(SEARCH_TABLE)
+    return select(
+        (index.c.rowid % 4).label("kind"),
+        (index.c.rowid // 4).label("id"),
+        cast(index.c.task_id, Integer).label("task_id"),
+        index.c.rowid.label("position"),
+        func.snippet(index_ref, -1, "[", "]", "…", SNIPPET_TOKENS).label("snippet"),
+        (-func.bm25(index_ref, TITLE_WEIGHT, BODY_WEIGHT)).label("score"),
+    ).where(index_ref.op("MATCH")(match))
+
+def _sqlite_match_count(db: Session, match: str, cap: int) -> int:
+    """Matches in the whole index, counted up to `cap` only (reads doclists, no ranking)."""
+    capped = text(f"SELECT 1 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match LIMIT :cap").bindparams(match=match, cap=cap)
+    return db.execute(select(func.count()).select_from(capped.columns().subquery())).scalar()
+
+def _postgres_matches(query: str):
+    tsquery = func.websearch_to_tsquery(TS_CONFIG, query)
+    def documents(kind, model, task_id, text_expr, weight):
+        document = literal_column(PG_DOCUMENTS[KINDS[kind]])
+        return select(
+            literal(kind).label("kind"), model.id.label("id"), task_id.label("task_id"),
+            (model.id * 4 + kind).label("position"),
+            literal_column(text_expr).label("body"), (func.ts_rank(document, tsquery) * weight).label("score"),
+        ).where(document.op("@@")(tsquery))
+    matches = union_all(
+        documents(1, Task, Task.id, "coalesce(tasks.title, '') || ' ' || coalesce(tasks.description, '')", TITLE_WEIGHT),
+        documents(2, Comment, Comment.task_id, "comments.content", BODY_WEIGHT),
+        documents(3, Story, Story.task_id, "stories.story_text", BODY_WEIGHT),
+    ).subquery()
+    headline = func.ts_headline(
+        TS_CONFIG, matches.c.body, tsquery,
+        f"StartSel=[, StopSel=], MaxWords={SNIPPET_TOKENS}, MinWords={SNIPPET_TOKENS // 2}",
+    )
+    return select(matches.c.kind, matches.c.id, matches.c.task_id, matches.c.position, headline.label("snippet"), matches.c.score)
+
+def search(db: Session, viewer_id: int, query: str, quest_log_id: Optional[int] = None,
+           skip: int = 0, limit: int = 20) -> Tuple[List[dict], bool]:
+    """
+    One page of matches visible to the viewer, and whether it is ranked by relevance.
+    On SQLite, a query matching more than RANK_LIMIT rows is returned newest first instead:
+    bm25 would have to score every match before the first page, while walking the index in
+    rowid order stops as soon as the page is full.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        matches, ranked = _postgres_matches(query), True
+    else:
+        match = fts_query(query)
+        if match is None:
+            return [], True
+        matches = _sqlite_matches(match)
+        ranked = _sqlite_match_count(db, match, RANK_LIMIT + 1) <= RANK_LIMIT
+    matches = matches.subquery()
+    order = (matches.c.score.desc(), matches.c.position) if ranked else (matches.c.position.desc(),)
+    rows = db.execute(
+        select(matches.c.kind, matches.c.id, matches.c.task_id, matches.c.snippet, matches.c.score,
+               Task.title, Task.quest_log_id)
+        .join(Task, Task.id == matches.c.task_id)
+        .where(visible_task_condition(viewer_id, quest_log_id))
+        .order_by(*order)
+        .offset(skip).limit(limit)
+    ).all()
+    results = [
+        {
+            "kind": KINDS[row.kind],
+            "id": row.id,
+            "task_id": row.task_id,
+            "task_title": row.title,
+            "quest_log_id": row.quest_log_id,
+            "snippet": row.snippet,
+            "score": row.score,
+        }
+        for row in rows
+    ]
+    return results, ranked
+
+def main():
+    from .db import engine
+    from .models import ensure_schema
+    parser = argparse.ArgumentParser(description="TaskFable full-text search index")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    ensure_schema(engine)
+    if engine.dialect.name == "sqlite":
+        rebuild_search_index(engine)
+        print("Search index rebuilt.")
+    else:
+        print("PostgreSQL search uses expression indexes; nothing to rebuild.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+backend/webhooks.py
+-------------------
+Outbound webhooks for quest log events.
+A quest log owner subscribes an endpoint to some or all of EVENTS
+(POST /questlogs/{id}/webhooks). The routers call emit() where they record the change, and
+emit() adds one WebhookDelivery per matching subscription to the caller's own transaction:
+the outbox. So an event is queued exactly when its change commits, and producers never wait
+on an endpoint. Subscriptions are read through webhook_cache (backend/cache.py), so an event
+on a quest log without webhooks costs no query.
+
+The worker (deliver_pending) sends the outbox with one pooled httpx.AsyncClient, at most
+CONCURRENCY requests at a time:
+  - each endpoint (URL) has a token bucket of RATE_BURST requests refilled at
+    RATE_PER_SECOND; deliveries over the limit wait in the outbox for their turn, without
+    using an attempt;
+  - network errors, timeouts, 408, 429 and 5xx answers are retried with exponential backoff
+    (RETRY_BASE_SECONDS doubling per attempt, capped at MAX_RETRY_SECONDS, with jitter, or
+    the endpoint's Retry-After), up to MAX_ATTEMPTS; other answers are final;
+  - rows are claimed with a lease (next_attempt_at moved LEASE_SECONDS ahead) before they
+    are sent, so a worker that dies mid-batch leaves them to be retried, not lost.
+Bodies are JSON: {"event", "quest_log_id", "occurred_at", "data"}, with the event and the
+delivery id (stable across retries, for deduplication) in the X-TaskFable-Event and
+X-TaskFable-Delivery headers, and, when the subscription has a secret,
+X-TaskFable-Signature: sha256=<hex HMAC of the body>.
+Endpoints must resolve to public addresses only: check_target() refuses loopback, private,
+link-local and reserved ones when a subscription is created and again before every
+delivery, as DNS can change in between. TASKFABLE_WEBHOOK_ALLOW_PRIVATE=1 lifts that for
+development against a local receiver.
+The scheduler runs a pass every tick (deliver_webhooks); a dedicated worker can run instead.
+
+Usage (from the project root), to run the delivery worker:
+    python -m backend.webhooks
+"""
+
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import os
+import random
+import socket
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from .cache import MISSING, roster_key, webhook_cache
+from .db import SessionLocal, engine
+from .models import WebhookDelivery, WebhookSubscription, ensure_schema
+from . import logging_config
+
+EVENTS = ("task.created", "task.status_changed", "comment.added", "member.joined", "invite.generated", "invite.revoked")
+CONCURRENCY = int(os.getenv("TASKFABLE_WEBHOOK_CONCURRENCY", "16"))
+RATE_PER_SECOND = float(os.getenv("TASKFABLE_WEBHOOK_RATE_PER_SECOND", "5"))
+RATE_BURST = int(os.getenv("TASKFABLE_WEBHOOK_RATE_BURST", "10"))
+TIMEOUT_SECONDS = float(os.getenv("TASKFABLE_WEBHOOK_TIMEOUT_SECONDS", "10"))
+MAX_ATTEMPTS = 8
+RETRY_BASE_SECONDS = 10
+MAX_RETRY_SECONDS = 3600
+LEASE_SECONDS = 120
+BATCH_SIZE = 500
+POLL_SECONDS = 1.0
+RETRYABLE_STATUS = {408, 429}
+ALLOW_PRIVATE_TARGETS = os.getenv("TASKFABLE_WEBHOOK_ALLOW_PRIVATE", "0") == "1"
+
+class BlockedTarget(ValueError):
+    """A webhook URL that is not http(s), or whose host resolves to a non-public address."""
+
+def resolve_host(host: str, port: int) -> List[str]:
+    return list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+
+def check_target(url: str) -> None:
+    """
+    Raise BlockedTarget unless `url` is an http(s) URL whose host resolves to public addresses
+    only, so webhooks can't reach the server's own network (loopback, private ranges, cloud
+    metadata endpoints). Resolution errors (OSError) are left to the caller.
+    """
+    parsed = urlparse(url)
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        raise BlockedTarget("Webhook URL has an invalid port")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise BlockedTarget("Webhook URL must be an http(s) URL")
+    if ALLOW_PRIVATE_TARGETS:
+        return
+    for address in resolve_host(parsed.hostname, port):
+        ip = ipaddress.ip_address(address.split("%")[0])  # Without the zone of a link-local IPv6 address.
+        if not ip.is_global or ip.is_multicast:
+            raise BlockedTarget(f"Webhook host {parsed.hostname} resolves to a non-public address ({address})")
+
+# -------------------------------
+# Producing events
+# -------------------------------
+def subscriptions_for(db: Session, quest_log_id: int) -> List[Tuple[int, frozenset]]:
+    """(subscription id, subscribed events) of a quest log, cached."""
+    key = roster_key(db, quest_log_id)
+    cached = webhook_cache.get(key)
+    if cached is not MISSING:
+        return cached
+    subscriptions = [
+        (sub_id, frozenset(e.strip() for e in events.split(",") if e.strip()))
+        for sub_id, events in db.execute(
+            select(WebhookSubscription.id, WebhookSubscription.events).where(WebhookSubscription.quest_log_id == quest_log_id)
+        )
+    ]
+    webhook_cache.set(key, subscriptions)
+    return subscriptions
+
+def emit(db: Session, quest_log_id: int, event: str, data: dict) -> int:
+    """
+    Queue `event` for every subscription of the quest log that wants it, in the caller's
+    transaction (the caller commits). Returns the deliveries queued.
+    """
+    targets = [sub_id for sub_id, events in subscriptions_for(db, quest_log_id) if "*" in events or event in events]
+    if not targets:
+        return 0
+    now = datetime.utcnow()
+    db.execute(insert(WebhookDelivery), [
+        {"subscription_id": sub_id, "event": event, "status": "pending", "attempts": 0, "next_attempt_at": now,
+         "created_at": now,
+         "payload": json.dumps({"event": event, "quest_log_id": quest_log_id, "occurred_at": now.isoformat(),
+                                "data": data}, default=str)}
+        for sub_id in targets
+    ])
+    return len(targets)
+
+def task_event(task) -> dict:
+    """A task as sent in events; private tasks go without their title and description."""
+    data = {"task_id": task.id, "quest_log_id": task.quest_log_id, "status": getattr(task.status, "value", task.status),
+            "is_private": bool(task.is_private)}
+    if not task.is_private:
+        data.update(title=task.title, description=task.description)
+    return data
+
+# -------------------------------
+# Delivering the outbox
+# -------------------------------
+class RateLimiter:
+    """A token bucket per endpoint: `burst` requests at once, refilled at `rate` per second."""
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.rate = rate or RATE_PER_SECOND
+        self.burst = burst or RATE_BURST
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # endpoint -> (tokens, updated at)
+
+    def acquire(self, endpoint: str, now: Optional[float] = None) -> float:
+        """Take a token: 0 if one is available, else the seconds until there is one (nothing taken)."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self._buckets.get(endpoint, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[endpoint] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[endpoint] = (tokens - 1, now)
+        return 0.0
+
+def sign(secret: str, body: bytes) -> str:
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(MAX_RETRY_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * (1 + random.uniform(0, 0.25))
+
+def _retry_after(response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value).replace(tzinfo=None) - datetime.utcnow()).total_seconds())
+        except (TypeError, ValueError):
+            return None
+
+def claim_batch(db: Session, now: datetime, batch_size: int = BATCH_SIZE) -> list:
+    """Due deliveries with their endpoint, leased to this worker for LEASE_SECONDS."""
+    rows = db.execute(
+        select(WebhookDelivery.id, WebhookDelivery.event, WebhookDelivery.payload, WebhookDelivery.attempts,
+               WebhookSubscription.url, WebhookSubscription.secret)
+        .join(WebhookSubscription, WebhookSubscription.id == WebhookDelivery.subscription_id)
+        .where(WebhookDelivery.status == "pending", WebhookDelivery.next_attempt_at <= now)
+        .order_by(WebhookDelivery.next_attempt_at, WebhookDelivery.id)
+        .limit(batch_size)
+    ).all()
+    if rows:
+        db.execute(
+            update(WebhookDelivery)
+            .where(WebhookDelivery.id.in_([row.id for row in rows]))
+            .values(next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return rows
+
+async def _send(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, row) -> tuple:
+    """(outcome, response status, error, retry after) of one POST; outcome is "sent", "retry" or "failed"."""
+    body = row.payload.encode("utf-8")
+    headers = {"Content-Type": "application/json", "X-TaskFable-Event": row.event, "X-TaskFable-Delivery": str(row.id)}
+    if row.secret:
+        headers["X-TaskFable-Signature"] = sign(row.secret, body)
+    async with semaphore:
+        try:
+            await asyncio.to_thread(check_target, row.url)
+        except BlockedTarget as e:
+            return "failed", None, str(e), None
+        except OSError as e:
+            return "retry", None, f"{type(e).__name__}: {e}", None
+        try:
+            response = await client.post(row.url, content=body, headers=headers)
+        except httpx.HTTPError as e:
+            return "retry", None, f"{type(e).__name__}: {e}", None
+    if response.is_success:
+        return "sent", response.status_code, None, None
+    error = f"HTTP {response.status_code}"
+    if response.status_code >= 500 or response.status_code in RETRYABLE_STATUS:
+        return "retry", response.status_code, error, _retry_after(response)
+    return "failed", response.status_code, error, None
+
+def record_outcomes(db: Session, outcomes: list, now: datetime) -> dict:
+    """Write the outcome of every delivery of a batch, one UPDATE per kind of outcome. Returns counts."""
+    groups = defaultdict(list)
+    counts = {"sent": 0, "retry": 0, "failed": 0}
+    for row, (outcome, status, error, retry_after) in outcomes:
+        attempts = row.attempts + 1
+        if outcome == "sent":
+            groups[("sent", status, None, None)].append(row.id)
+        elif outcome == "retry" and attempts < MAX_ATTEMPTS:
+            delay = retry_after if retry_after is not None else backoff_seconds(attempts)
+            # Bucketed to the second so a batch needs few distinct UPDATEs.
+            groups[("retry", status, error, int(delay))].append(row.id)
+        else:
+            groups[("failed", status, error, None)].append(row.id)
+    for (outcome, status, error, delay), ids in groups.items():
+        values = {"attempts": WebhookDelivery.attempts + 1, "response_status": status, "error": error}
+        if outcome == "sent":
+            values.update(status="sent", sent_at=now)
+        elif outcome == "retry":
+            values["next_attempt_at"] = now + timedelta(seconds=delay)
+        else:
+            values["status"] = "failed"
+        db.execute(update(WebhookDelivery).where(WebhookDelivery.id.in_(ids)).values(**values)
+                   .execution_options(synchronize_session=False))
+        counts[outcome] += len(ids)
+    db.commit()
+    return counts
+
+async def deliver_pending(db: Session, client: Optional[httpx.AsyncClient] = None, limiter: Optional[RateLimiter] = None,
+                          now: Optional[datetime] = None, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Send every due delivery once. Returns counts by outcome ("sent", "retry", "failed") and
+    "deferred" (held back by an endpoint's rate limit).
+    """
+    limiter = limiter or RateLimiter()
+    counts = {"sent": 0, "retry": 0, "failed": 0, "deferred": 0}
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(timeout=TIMEOUT_SECONDS, limits=httpx.Limits(max_connections=CONCURRENCY))
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    try:
+        while True:
+            batch_now = now or datetime.utcnow()
+            rows = claim_batch(db, batch_now, batch_size)
+            if not rows:
+                return counts
+            ready, deferred = [], defaultdict(list)
+            for row in rows:
+                wait = limiter.acquire(row.url)
+                if wait:
+                    deferred[int(wait) + 1].append(row.id)
+                else:
+                    ready.append(row)
+            for delay, ids in deferred.items():
+                # Held back by the rate limit: back in the outbox, no attempt used.
+                db.execute(update(WebhookDelivery).where(WebhookDelivery.id.in_(ids))
+                           .values(next_attempt_at=batch_now + timedelta(seconds=delay))
+                           .execution_options(synchronize_session=False))
+                counts["deferred"] += len(ids)
+            results = await asyncio.gather(*(_send(client, semaphore, row) for row in ready))
+            for outcome, count in record_outcomes(db, list(zip(ready, results)), batch_now).items():
+                counts[outcome] += count
+            if len(rows) < batch_size:
+                return counts
+    finally:
+        if own_client:
+            await client.aclose()
+
+# The scheduler's passes share one limiter, so rate limits hold across ticks.
+_scheduler_limiter = RateLimiter()
+
+def deliver_webhooks(db: Session) -> dict:
+    """One synchronous pass over the outbox, for the scheduler."""
+    counts = asyncio.run(deliver_pending(db, limiter=_scheduler_limiter))
+    if counts["sent"] or counts["retry"] or counts["failed"]:
+        logging_config.backend_logger.info(f"Webhook deliveries: {counts}")
+    return counts
+
+async def run_worker(poll_seconds: float = POLL_SECONDS):
+    """Deliver the outbox continuously with one connection pool and one set of rate limits."""
+    limiter = RateLimiter()
+    async with httpx.AsyncClient(timeout=TIMEOUT_SECONDS, limits=httpx.Limits(max_connections=CONCURRENCY)) as client:
+        logging_config.backend_logger.info("Webhook worker started.")
+        while True:
+            db = SessionLocal()
+            try:
+                await deliver_pending(db, client, limiter)
+            except Exception as e:
+                db.rollback()
+                logging_config.backend_logger.error(f"Webhook worker pass failed: {e}")
+            finally:
+                db.close()
+            await asyncio.sleep(poll_seconds)
+
+if __name__ == "__main__":
+    ensure_schema(engine)
+    asyncio.run(run_worker())
@@ -2,10 +2,11 @@
 // ---------------------------------------------------------------------
 // InviteListPanel Component
 // ---------------------------------------------------------------------
-// Displays a list of all invite links for the current Quest Log with their
+// Displays the live invite links for the current Quest Log with their
 // status, full invite link, and creation date. Invites are sorted by most
-// recent first. Each entry includes a copy button; if revoked, the entry is
-// rendered with strikethrough styling.
+// recent first. Revoked, used and expired invites are only listed when
+// "Show revoked and expired" is checked. Each entry includes a copy button;
+// if revoked, the entry is rendered with strikethrough styling.
 // The list auto-refreshes when a "boardAction" event is detected as well as
 // every 30 seconds.
 // ---------------------------------------------------------------------
@@ -19,10 +20,13 @@ const InviteListPanel = ({ questLogId, user }) => {
   const [invites, setInvites] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [showDead, setShowDead] = useState(false);
 
   const fetchInvites = useCallback(async () => {
     try {
-      const res = await axios.get(`${CONFIG.BACKEND_URL}/questlogs/${questLogId}/invites`);
+      const res = await axios.get(`${CONFIG.BACKEND_URL}/questlogs/${questLogId}/invites`, {
+        params: { include_dead: showDead }
+      });
       setInvites(res.data);
       console.info(`Fetched ${res.data.length} invites for quest log ${questLogId}`);
     } catch (err) {
@@ -31,7 +35,7 @@ const InviteListPanel = ({ questLogId, user }) => {
     } finally {
       setLoading(false);
     }
-  }, [questLogId]);
+  }, [questLogId, showDead]);
 
   // Auto-refresh on interval and when a "boardAction" event is dispatched.
   useEffect(() => {
@@ -70,8 +74,12 @@ const InviteListPanel = ({ questLogId, user }) => {
   return (
     <div className="invite-list-panel" title="Invite list auto-refreshes on board actions">
       <h3 title="List of generated invite links">Existing Invites</h3>
+      <label className="invite-show-dead" title="Also list revoked, used and expired invites">
+        <input type="checkbox" checked={showDead} onChange={(e) => setShowDead(e.target.checked)} />
+        Show revoked and expired
+      </label>
       {invites.length === 0 ? (
-        <p>No invites generated yet.</p>
+        <p>{showDead ? "No invites generated yet." : "No active invites."}</p>
       ) : (
         <ul>
           {invites.map(invite => (
@@ -1,5 +1,5 @@
 // frontend/src/components/LogsPage.js
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import axios from "axios";
 import CONFIG from "../config";
 
@@ -7,12 +7,22 @@ function LogsPage() {
   const [backendLogs, setBackendLogs] = useState([]);
   const [frontendLogs, setFrontendLogs] = useState([]);
   const [selectedLog, setSelectedLog] = useState(null);
+  const [selectedType, setSelectedType] = useState(null);
   const [logContent, setLogContent] = useState("");
+  const [cursor, setCursor] = useState(null);
+  const [following, setFollowing] = useState(false);
+  const eventSourceRef = useRef(null);
 
   useEffect(() => {
     fetchLogs();
   }, []);
 
+  // Close any live stream when leaving the page.
+  useEffect(() => {
+    const streamRef = eventSourceRef;
+    return () => streamRef.current && streamRef.current.close();
+  }, []);
+
   const fetchLogs = async () => {
     try {
       const backendRes = await axios.get(`${CONFIG.BACKEND_URL}/logs/backend`);
@@ -24,16 +34,53 @@ function LogsPage() {
     }
   };
 
+  const stopFollowing = () => {
+    if (eventSourceRef.current) {
+      eventSourceRef.current.close();
+      eventSourceRef.current = null;
+    }
+    setFollowing(false);
+  };
+
   const handleSelectLog = async (type, filename) => {
+    stopFollowing();
     try {
       const res = await axios.get(`${CONFIG.BACKEND_URL}/logs/${type}/${filename}`, { params: { lines: 100 } });
       setSelectedLog(filename);
+      setSelectedType(type);
       setLogContent(res.data.content);
+      setCursor(res.data.cursor);
     } catch (error) {
       console.error("Error fetching log content:", error);
     }
   };
 
+  // Page further back from the byte-offset cursor returned by the previous request.
+  const handleLoadOlder = async () => {
+    try {
+      const res = await axios.get(`${CONFIG.BACKEND_URL}/logs/${selectedType}/${selectedLog}`, {
+        params: { lines: 100, before: cursor }
+      });
+      setLogContent(prev => prev + res.data.content);
+      setCursor(res.data.cursor);
+    } catch (error) {
+      console.error("Error fetching older log lines:", error);
+    }
+  };
+
+  // Stream new lines over Server-Sent Events; newest lines stay on top.
+  const handleToggleFollow = () => {
+    if (following) {
+      stopFollowing();
+      return;
+    }
+    const source = new EventSource(`${CONFIG.BACKEND_URL}/logs/${selectedType}/${selectedLog}/follow`);
+    source.onmessage = (event) => setLogContent(prev => `${event.data}\n${prev}`);
+    source.onerror = () => console.error("Log follow stream interrupted; the browser will retry.");
+    eventSourceRef.current = source;
+    setFollowing(true);
+  };
+
   return (
     <div className="logs">
       <h2>Logs</h2>
@@ -60,7 +107,13 @@ function LogsPage() {
       {selectedLog && (
         <div>
           <h3>{selectedLog}</h3>
+          {!selectedLog.endsWith(".gz") && (
+            <button onClick={handleToggleFollow} className="btn">{following ? "Stop following" : "Follow live"}</button>
+          )}
           <pre className="log-content">{logContent}</pre>
+          {cursor !== null && (
+            <button onClick={handleLoadOlder} className="btn">Load older</button>
+          )}
         </div>
       )}
     </div>
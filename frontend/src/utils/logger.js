@@ -2,12 +2,51 @@
 import axios from "axios";
 import CONFIG from "../config";
 
+// Events are buffered and sent to the backend in batches, so logging
+// never costs one request per message.
+const FLUSH_INTERVAL_MS = 2000;
+const MAX_BATCH_SIZE = 50;
+const APPEND_URL = `${CONFIG.BACKEND_URL}/logs/frontend/append`;
+
+let buffer = [];
+let flushTimer = null;
+
+function flush() {
+  if (flushTimer) {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+  }
+  if (buffer.length === 0) return;
+  const messages = buffer;
+  buffer = [];
+  axios.post(APPEND_URL, { messages }, {
+    headers: { "Content-Type": "application/json" }
+  }).catch(err => console.error("Error logging frontend events", err));
+}
+
+// Send whatever is left when the page is hidden or closed; keepalive lets the
+// request outlive the page.
+window.addEventListener("pagehide", () => {
+  if (buffer.length === 0) return;
+  const messages = buffer;
+  buffer = [];
+  fetch(APPEND_URL, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ messages }),
+    keepalive: true
+  }).catch(() => {});
+});
+
 /**
  * Logs frontend events by sending them to the backend logs.
  */
 export function logFrontendEvent(message) {
   console.log(message);
-  axios.post(`${CONFIG.BACKEND_URL}/logs/frontend/append`, { message }, {
-    headers: { "Content-Type": "application/json" }
-  }).catch(err => console.error("Error logging frontend event", err));
+  buffer.push(message);
+  if (buffer.length >= MAX_BATCH_SIZE) {
+    flush();
+  } else if (!flushTimer) {
+    flushTimer = setTimeout(flush, FLUSH_INTERVAL_MS);
+  }
 }
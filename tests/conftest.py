@@ -0,0 +1,141 @@
+"""
+tests/conftest.py
+-----------------
+Shared fixtures and pytest hooks.
+Each test process (each pytest-xdist worker, or the single process of a serial run) gets
+its own temporary SQLite database: TASKFABLE_DATABASE_URL is set before backend.db is
+imported, so the app and SessionLocal in the tests both use it, and the schema is created
+up front. Set TASKFABLE_TEST_DATABASE_URL to run the suite against another database.
+Parallel run:  pytest -n auto   (needs pytest-xdist)
+
+Every request a test makes is recorded with its SQL statement count (counted through the
+SQLAlchemy engine events in backend/metrics.py) and duration:
+  - the `query_counter` fixture exposes them, so tests can assert upper bounds, e.g.
+        with query_counter.at_most(5):
+            client.get("/tasks/", params=...)
+  - with pytest-json-report, each test's per-endpoint counts (and the worker that ran it)
+    are added to its metadata and the totals per endpoint to the report
+    ("endpoint_queries"), which backend/scripts/generate_test_report.py renders.
+"""
+import sys
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pytest
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+WORKER = os.environ.get("PYTEST_XDIST_WORKER", "main")
+TEST_DB_DIR = None
+if os.environ.get("TASKFABLE_TEST_DATABASE_URL"):
+    os.environ["TASKFABLE_DATABASE_URL"] = os.environ["TASKFABLE_TEST_DATABASE_URL"]
+else:
+    TEST_DB_DIR = tempfile.mkdtemp(prefix=f"taskfable-tests-{WORKER}-")
+    os.environ["TASKFABLE_DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DB_DIR, 'test.db')}"
+
+from backend import metrics
+from backend.db import engine
+from backend.models import ensure_schema
+
+ensure_schema(engine)
+
+@pytest.fixture(scope="session", autouse=True)
+def test_database():
+    """The per-process test database; removed at the end of the session."""
+    yield engine
+    engine.dispose()
+    if TEST_DB_DIR:
+        shutil.rmtree(TEST_DB_DIR, ignore_errors=True)
+
+class QueryCounter:
+    """Requests made during one test: method, route, status, SQL statements and milliseconds."""
+    def __init__(self):
+        self.requests = []
+
+    def observe(self, method, route, status, seconds, stats):
+        self.requests.append({
+            "endpoint": f"{method} {route}", "status": status,
+            "queries": stats.queries, "ms": round(seconds * 1000, 3),
+        })
+
+    def queries(self, endpoint=None):
+        return [r["queries"] for r in self.requests if endpoint is None or r["endpoint"] == endpoint]
+
+    @contextmanager
+    def at_most(self, max_queries):
+        """Fail if any request made inside the block runs more than `max_queries` statements."""
+        first = len(self.requests)
+        yield self
+        made = self.requests[first:]
+        assert made, "No request was made inside the query_counter block"
+        for request in made:
+            assert request["queries"] <= max_queries, \
+                f"{request['endpoint']} ran {request['queries']} SQL statements (limit {max_queries})"
+
+    def summary(self):
+        return summarize_requests(self.requests)
+
+def summarize_requests(requests):
+    """Per endpoint: calls, max/mean SQL statements, and max/mean milliseconds."""
+    by_endpoint = defaultdict(list)
+    for request in requests:
+        by_endpoint[request["endpoint"]].append(request)
+    return {
+        endpoint: {
+            "calls": len(calls),
+            "queries_max": max(c["queries"] for c in calls),
+            "queries_mean": round(sum(c["queries"] for c in calls) / len(calls), 2),
+            "ms_max": max(c["ms"] for c in calls),
+            "ms_mean": round(sum(c["ms"] for c in calls) / len(calls), 3),
+        }
+        for endpoint, calls in sorted(by_endpoint.items())
+    }
+
+@pytest.fixture(autouse=True)
+def query_counter(request):
+    counter = QueryCounter()
+    metrics.REQUEST_OBSERVERS.append(counter.observe)
+    request.node.query_counter = counter
+    yield counter
+    metrics.REQUEST_OBSERVERS.remove(counter.observe)
+
+def merge_summaries(summaries):
+    """Combine per-test endpoint summaries (as produced by summarize_requests) into totals."""
+    totals = {}
+    for summary in summaries:
+        for endpoint, stats in summary.items():
+            total = totals.setdefault(endpoint, {"calls": 0, "queries_max": 0, "queries_sum": 0.0, "ms_max": 0.0, "ms_sum": 0.0})
+            total["calls"] += stats["calls"]
+            total["queries_max"] = max(total["queries_max"], stats["queries_max"])
+            total["queries_sum"] += stats["queries_mean"] * stats["calls"]
+            total["ms_max"] = max(total["ms_max"], stats["ms_max"])
+            total["ms_sum"] += stats["ms_mean"] * stats["calls"]
+    return {
+        endpoint: {
+            "calls": t["calls"], "queries_max": t["queries_max"],
+            "queries_mean": round(t["queries_sum"] / t["calls"], 2),
+            "ms_max": t["ms_max"], "ms_mean": round(t["ms_sum"] / t["calls"], 3),
+        }
+        for endpoint, t in sorted(totals.items())
+    }
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_json_runtest_metadata(item, call):
+    if call.when != "call":
+        return {}
+    metadata = {"worker": WORKER}
+    counter = getattr(item, "query_counter", None)
+    if counter is not None and counter.requests:
+        metadata["endpoint_queries"] = counter.summary()
+    return metadata
+
+@pytest.hookimpl(optionalhook=True)
+def pytest_json_modifyreport(json_report):
+    # Built from the per-test metadata, which pytest-xdist workers send to the controller.
+    json_report["endpoint_queries"] = merge_summaries(
+        test.get("metadata", {}).get("endpoint_queries", {}) for test in json_report.get("tests", [])
+    )
@@ -0,0 +1,176 @@
+"""
+tests/test_analytics.py
+-----------------------
+Tests for task flow analytics:
+  - Folding history into daily buckets (cycle time, lead time, WIP).
+  - Incremental refresh from the watermark only counts new history rows, including rows
+    added after the newest ones were deleted.
+  - Flow, throughput, summary and XP endpoints read the rollups.
+  - Rebuilding the rollups reproduces the incrementally maintained totals, and is refused
+    once source rows have been archived.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Task, TaskStatus, TaskHistory, TaskFlowDaily, QLActivity, QLActivityDaily
+from backend.db import SessionLocal
+from backend import analytics, rollups, retention
+
+client = TestClient(app)
+
+TEST_USER = {"identifier": "erin_analytics", "password": "password123", "email": "erin_analytics@example.com"}
+
+def test_fold_task_history_buckets():
+    t0 = datetime(2025, 3, 10, 9, 0)
+    rows = [
+        (1, 7, "Created", t0, 1, 42),
+        (2, 7, "Doing", t0 + timedelta(hours=1), 1, 42),
+        (3, 7, "Waiting", t0 + timedelta(hours=2), 1, 42),
+        (4, 7, "Doing", t0 + timedelta(hours=3), 1, 42),
+        (5, 7, "Done", t0 + timedelta(days=1, hours=1), 1, 42),
+    ]
+    buckets = analytics.fold_task_history(rows, watermark=0)
+    day1 = buckets[(1, 42, t0.date())]
+    day2 = buckets[(1, 42, (t0 + timedelta(days=1)).date())]
+    assert (day1["created"], day1["started"], day1["wip_delta"]) == (1, 1, 1), "Waiting -> Doing is not a new start"
+    assert (day2["completed"], day2["wip_delta"]) == (1, -1)
+    assert day2["cycle_seconds"] == timedelta(hours=24).total_seconds()
+    assert day2["lead_seconds"] == timedelta(hours=25).total_seconds()
+
+    # Rows below the watermark only rebuild state.
+    incremental = analytics.fold_task_history(rows, watermark=4)
+    assert list(incremental) == [(1, 42, (t0 + timedelta(days=1)).date())]
+    assert incremental[(1, 42, (t0 + timedelta(days=1)).date())]["cycle_seconds"] == timedelta(hours=24).total_seconds()
+
+@pytest.fixture(scope="module")
+def board():
+    user = client.post("/users/login", json=TEST_USER).json()["user"]
+    ql_response = client.post("/questlogs", json={"name": "Analytics Board", "owner_username": user["username"]})
+    ql_id = ql_response.json()["quest_log_id"]
+    yield user, ql_id
+    client.delete(f"/questlogs/{ql_id}?username={user['username']}")
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+def add_history(task_id, statuses):
+    session = SessionLocal()
+    try:
+        session.add_all([TaskHistory(task_id=task_id, status=s, timestamp=ts) for s, ts in statuses])
+        session.commit()
+    finally:
+        session.close()
+
+def refresh_rollups():
+    session = SessionLocal()
+    try:
+        rollups.refresh_all(session)
+    finally:
+        session.close()
+
+def test_flow_endpoints_refresh_incrementally(board):
+    user, ql_id = board
+    session = SessionLocal()
+    task = Task(title="Analytics Task", owner_id=user["user_id"], status=TaskStatus.todo, quest_log_id=ql_id)
+    session.add(task)
+    session.commit()
+    task_id = task.id
+    session.close()
+    now = datetime.utcnow()
+    add_history(task_id, [("Created", now - timedelta(hours=5)), ("Doing", now - timedelta(hours=4))])
+    refresh_rollups()
+
+    summary = client.get(f"/analytics/summary?quest_log_id={ql_id}").json()
+    assert (summary["started"], summary["completed"], summary["wip"]) == (1, 0, 1)
+
+    add_history(task_id, [("Done", now - timedelta(hours=2))])
+    summary = client.get(f"/analytics/summary?quest_log_id={ql_id}").json()
+    assert summary["completed"] == 0, "Reads must only see the rollup until the next refresh"
+    refresh_rollups()
+    summary = client.get(f"/analytics/summary?quest_log_id={ql_id}&username={user['username']}").json()
+    assert (summary["started"], summary["completed"], summary["wip"]) == (1, 1, 0)
+    assert summary["avg_cycle_hours"] == 2.0
+    assert summary["avg_lead_hours"] == 3.0
+
+    flow = client.get(f"/analytics/flow?quest_log_id={ql_id}&days=7").json()
+    assert len(flow) == 7 and flow[-1]["wip"] == 0
+    assert sum(point["completed"] for point in flow) == 1
+
+    weekly = client.get(f"/analytics/throughput?quest_log_id={ql_id}&period=week&days=14").json()
+    assert sum(point["completed"] for point in weekly) == 1
+
+    assert client.get("/analytics/summary").status_code == 400
+
+    xp = client.get(f"/analytics/xp?username={user['username']}&days=2").json()
+    assert sum(point["xp"] for point in xp) >= 10, "Sole participant earns the full completion XP"
+
+def test_rebuild_matches_incremental(board):
+    refresh_rollups()
+    session = SessionLocal()
+    try:
+        def snapshot():
+            return {name: sorted(
+                tuple(getattr(row, c.name) for c in model.__table__.columns if c.name != "id")
+                for row in session.query(model).all()
+            ) for name, model, _ in rollups.ROLLUPS}
+        incremental = snapshot()
+        rollups.rebuild_all(session, chunk_size=2)
+        assert snapshot() == incremental
+    finally:
+        session.close()
+
+def test_rebuild_refuses_after_archiving(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+    (tmp_path / "task_history").mkdir()
+    (tmp_path / "task_history" / "2020-01.jsonl.gz").write_bytes(b"")
+    session = SessionLocal()
+    try:
+        before = session.query(TaskFlowDaily).count()
+        with pytest.raises(RuntimeError, match="task_history"):
+            rollups.rebuild_all(session)
+        assert session.query(TaskFlowDaily).count() == before, "Nothing is cleared"
+    finally:
+        session.close()
+
+def test_ids_of_deleted_rows_are_not_reused(board):
+    user, ql_id = board
+    session = SessionLocal()
+    try:
+        task = Task(title="Reused Ids", owner_id=user["user_id"], status=TaskStatus.todo, quest_log_id=ql_id)
+        session.add(task)
+        session.commit()
+        now = datetime.utcnow()
+        add_history(task.id, [("Created", now), ("Doing", now)])
+        session.add(QLActivity(quest_log_id=ql_id, action="reused_ids"))
+        session.commit()
+        refresh_rollups()
+
+        # Delete the newest rows (as deletion, purge and retention do), then add new ones.
+        newest = session.query(TaskHistory).order_by(TaskHistory.id.desc()).first()
+        session.delete(newest)
+        session.delete(session.query(QLActivity).filter(QLActivity.action == "reused_ids").one())
+        session.commit()
+        add_history(task.id, [("Done", now)])
+        session.add(QLActivity(quest_log_id=ql_id, action="reused_ids"))
+        session.commit()
+        refresh_rollups()
+
+        completed = session.query(func.sum(TaskFlowDaily.completed)).filter(TaskFlowDaily.quest_log_id == ql_id).scalar()
+        assert completed >= 1, "The new history row is counted"
+        activity = session.query(func.sum(QLActivityDaily.count))\
+            .filter(QLActivityDaily.quest_log_id == ql_id, QLActivityDaily.action == "reused_ids").scalar()
+        assert activity == 2, "The new activity is counted next to the deleted one"
+    finally:
+        session.close()
@@ -0,0 +1,48 @@
+"""
+tests/test_benchmark.py
+-----------------------
+Smoke test for the benchmark suite (backend/scripts/benchmark.py):
+  - A tiny run builds its own database, produces percentiles for every benchmark and the
+    load test, and leaves the application's dependency overrides untouched.
+  - The board serialization and memory benchmarks report payload sizes and bytes per task.
+  - A second run is compared against the archived first one.
+"""
+import sys
+import os
+import json
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.scripts import benchmark
+
+def test_percentiles_use_nearest_rank():
+    values = [i / 1000 for i in range(1, 101)]
+    assert benchmark.percentile(values, 50) == 0.05
+    assert benchmark.percentile(values, 99) == 0.099
+    assert benchmark.summarize(values)["p95_ms"] == 95.0
+
+def test_small_run_is_saved_and_compared(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark, "REPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(benchmark, "BENCHMARK_FILE", str(tmp_path / "benchmark.json"))
+    sizes = dict(num_users=3, num_tasks=24, iterations=3, login_iterations=1, concurrency=4, load_requests=20,
+                 board_tasks=40)
+
+    first = benchmark.save_results(benchmark.run_benchmarks(**sizes))
+    assert app.dependency_overrides == {}
+    assert set(first["benchmarks"]) == {"get_tasks", "get_activities", "get_participants", "get_stories", "search",
+                                        "status_toggle", "status_done", "login",
+                                        "serialize_board_default", "serialize_board_fast"}
+    assert first["board_payload_bytes"]["tasks"] == 40
+    assert first["board_payload_bytes"]["gzip"] < first["board_payload_bytes"]["identity"]
+    memory = first["board_memory"]
+    assert memory["current_retained_bytes_per_task"] < memory["former_retained_bytes_per_task"]
+    assert first["load_test"]["overall"]["calls"] == 20 and first["load_test"]["errors"] == {}
+    assert all(r["p50_ms"] <= r["p95_ms"] <= r["p99_ms"] for r in first["benchmarks"].values())
+    assert "comparison" not in first
+
+    benchmark.save_results(benchmark.run_benchmarks(**sizes))
+    saved = json.loads((tmp_path / "benchmark.json").read_text())
+    assert saved["baseline"].startswith("benchmark_")
+    assert set(saved["comparison"]) >= {"get_tasks", "load_test"}
@@ -0,0 +1,188 @@
+"""
+tests/test_cluster.py
+---------------------
+Tests for the multi-worker deployment mode (backend/cluster.py):
+  - One process at a time holds a lease; it passes to another once it expires or is released.
+  - The scheduler only runs jobs while it is the leader, and keeps the lease through a job
+    longer than the lease.
+  - Cache invalidations published by one worker are applied by the others.
+  - Several worker processes share one database and elect a single scheduler.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import socket
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, func, select
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Lease, CacheInvalidation
+from backend.db import SessionLocal
+from backend import cache, cluster, scheduler
+
+client = TestClient(app)
+
+OWNER = {"identifier": "ivy_cluster", "password": "password123", "email": "ivy_cluster@example.com"}
+GUEST = {"identifier": "bram_cluster", "password": "password123", "email": "bram_cluster@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, GUEST)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def board(people):
+    owner = people[0]
+    ql_id = client.post("/questlogs", json={"name": "Clustered Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    yield ql_id
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+@pytest.fixture
+def session():
+    db = SessionLocal()
+    yield db
+    db.query(Lease).filter(Lease.name.like("test-%")).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+@pytest.fixture
+def channel(monkeypatch):
+    """This process as one worker of a cluster, and a second worker's channel to publish from."""
+    ours = cluster.InvalidationChannel(poll_seconds=0)
+    first_id = ours.last_id
+    monkeypatch.setattr(cache, "channel", ours)
+    yield ours, cluster.InvalidationChannel(poll_seconds=0)
+    session = SessionLocal()
+    session.query(CacheInvalidation).filter(CacheInvalidation.id > first_id).delete(synchronize_session=False)
+    session.commit()
+    session.close()
+
+def test_lease_has_one_holder(session):
+    first, second = cluster.Leader("test-lease"), cluster.Leader("test-lease")
+    now = datetime.utcnow()
+    assert first.acquire(now) is True
+    assert second.acquire(now) is False
+    assert first.acquire(now + timedelta(seconds=10)) is True, "The holder renews its lease"
+
+    later = now + timedelta(seconds=10 + cluster.LEASE_SECONDS + 1)
+    assert second.acquire(later) is True, "An expired lease is taken over"
+    assert first.acquire(later) is False
+    second.release()
+    assert first.acquire(later) is True, "A released lease is free at once"
+
+def test_scheduler_runs_jobs_only_as_leader(session, monkeypatch):
+    runs = []
+    def job(db):
+        runs.append(1)
+    monkeypatch.setattr(scheduler, "JOBS", [(job, 60)])
+    leader, follower = cluster.Leader("test-scheduler"), cluster.Leader("test-scheduler")
+    assert leader.acquire()
+    scheduler.run_due_jobs({}, time.monotonic(), follower)
+    assert runs == []
+    scheduler.run_due_jobs({}, time.monotonic(), leader)
+    assert runs == [1]
+
+    stop = threading.Event()
+    thread = threading.Thread(target=scheduler.schedule_tasks, kwargs={"stop": stop, "leader": follower})
+    thread.start()
+    time.sleep(0.3)
+    stop.set()
+    thread.join(timeout=10)
+    assert runs == [1], "A follower's loop runs nothing"
+
+def test_leader_keeps_lease_through_long_jobs(session, monkeypatch):
+    leader, rival = cluster.Leader("test-heartbeat", lease_seconds=1), cluster.Leader("test-heartbeat")
+    taken = []
+    def slow_job(db):
+        time.sleep(2.5)
+        taken.append(rival.acquire())
+    def next_job(db):
+        taken.append("ran")
+    monkeypatch.setattr(scheduler, "JOBS", [(slow_job, 60), (next_job, 60)])
+    assert leader.acquire()
+    scheduler.run_due_jobs({}, time.monotonic(), leader)
+    assert taken == [False, "ran"], "The lease is renewed while a job outlasts it"
+
+    # A leader that lost its lease stops before the next job.
+    taken.clear()
+    def lose_lease(db):
+        leader.release()
+        taken.append(rival.acquire())
+    monkeypatch.setattr(scheduler, "JOBS", [(lose_lease, 60), (next_job, 60)])
+    assert leader.acquire()
+    scheduler.run_due_jobs({}, time.monotonic(), leader)
+    assert taken == [True]
+
+def test_invalidations_reach_other_workers(people, board, session, channel):
+    ours, theirs = channel
+    owner, guest = people
+    roster = client.get(f"/questlogs/{board}/participants").json()
+    key = cache.roster_key(session, board)
+    assert cache.roster_cache.get(key) is not cache.MISSING
+
+    # Another worker changes the roster: its invalidation empties our copy too.
+    theirs.publish(session, "roster", key)
+    assert cache.roster_cache.get(key) is cache.MISSING
+
+    # A change made here is published for the others.
+    token = client.post(f"/questlogs/{board}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": guest["username"], "action": "join"})
+    assert theirs.receive(force=True) >= 1
+    updated = client.get(f"/questlogs/{board}/participants").json()
+    assert len(updated) == len(roster) + 1
+
+    old = datetime.utcnow() + timedelta(seconds=cluster.INVALIDATION_RETENTION_SECONDS + 1)
+    assert cluster.prune_invalidations(session, old) >= 2
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_workers_share_one_scheduler(tmp_path):
+    pytest.importorskip("uvicorn")
+    port = free_port()
+    # A database of their own: the workers' scheduler runs every job on it.
+    url = f"sqlite:///{tmp_path / 'cluster.db'}"
+    env = {**os.environ, "TASKFABLE_METRICS_DIR": str(tmp_path), "TASKFABLE_DATABASE_URL": url}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "backend.cluster", "--workers", "2", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    workers_db = create_engine(url)
+    try:
+        deadline = time.monotonic() + 120
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/server/timezone").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            assert time.monotonic() < deadline, "The workers did not start"
+            time.sleep(0.5)
+        with workers_db.connect() as conn:
+            leases = conn.execute(select(Lease.holder, Lease.expires_at).where(Lease.name == "scheduler")).all()
+        assert len(leases) == 1 and leases[0].expires_at > datetime.utcnow()
+    finally:
+        process.terminate()
+        process.wait(timeout=60)
+    with workers_db.connect() as conn:
+        assert conn.scalar(select(func.count()).select_from(Lease)) == 0, "The leader gives the lease up on shutdown"
+    workers_db.dispose()
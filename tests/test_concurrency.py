@@ -0,0 +1,100 @@
+"""
+tests/test_concurrency.py
+-------------------------
+Concurrency stress tests for task completion rewards:
+  - Many parallel Done transitions paying the same participants lose no XP/currency.
+  - Racing the same task to Done pays out exactly once.
+Tasks are seeded directly in the Doing state so no stories are generated.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Task, TaskStatus, Comment
+from backend.db import SessionLocal
+
+client = TestClient(app)
+
+NUM_TASKS = 24
+NUM_WORKERS = 8
+
+OWNER = {"identifier": "carol_concurrency", "password": "password123", "email": "carol_concurrency@example.com"}
+HELPER = {"identifier": "dave_concurrency", "password": "password123", "email": "dave_concurrency@example.com"}
+
+@pytest.fixture(scope="module")
+def board():
+    owner = client.post("/users/login", json=OWNER).json()["user"]
+    helper = client.post("/users/login", json=HELPER).json()["user"]
+    ql_response = client.post("/questlogs", json={"name": "Concurrency Board", "owner_username": owner["username"]})
+    assert ql_response.status_code == 200, f"Quest log creation failed: {ql_response.text}"
+    ql_id = ql_response.json()["quest_log_id"]
+    yield owner, helper, ql_id
+    client.delete(f"/questlogs/{ql_id}?username={owner['username']}")
+    session = SessionLocal()
+    for user in [owner, helper]:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+def seed_doing_tasks(ql_id, owner_id, commenter_id, count):
+    session = SessionLocal()
+    try:
+        tasks = [
+            Task(title=f"Concurrent Task {i}", owner_id=owner_id, status=TaskStatus.doing, quest_log_id=ql_id)
+            for i in range(count)
+        ]
+        session.add_all(tasks)
+        session.flush()
+        session.add_all([Comment(content="On it", task_id=t.id, user_id=commenter_id) for t in tasks])
+        session.commit()
+        return [t.id for t in tasks]
+    finally:
+        session.close()
+
+def balances(*user_ids):
+    session = SessionLocal()
+    try:
+        rows = session.query(User.id, User.xp, User.currency).filter(User.id.in_(user_ids)).all()
+        return {row.id: (row.xp, row.currency) for row in rows}
+    finally:
+        session.close()
+
+def complete(task_id, username):
+    return client.put(f"/tasks/{task_id}/status", json={"new_status": "Done", "username": username})
+
+def test_parallel_completions_lose_no_rewards(board):
+    owner, helper, ql_id = board
+    task_ids = seed_doing_tasks(ql_id, owner["user_id"], helper["user_id"], NUM_TASKS)
+    before = balances(owner["user_id"], helper["user_id"])
+
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as pool:
+        responses = list(pool.map(lambda tid: complete(tid, owner["username"]), task_ids))
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+
+    after = balances(owner["user_id"], helper["user_id"])
+    # Two participants per task: 10 // 2 XP and 5 // 2 currency each.
+    for user_id in (owner["user_id"], helper["user_id"]):
+        assert after[user_id][0] - before[user_id][0] == NUM_TASKS * 5, "Lost XP updates under concurrency"
+        assert after[user_id][1] - before[user_id][1] == NUM_TASKS * 2, "Lost currency updates under concurrency"
+
+def test_racing_same_task_pays_once(board):
+    owner, helper, ql_id = board
+    task_id = seed_doing_tasks(ql_id, owner["user_id"], helper["user_id"], 1)[0]
+    before = balances(owner["user_id"])
+
+    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as pool:
+        responses = list(pool.map(lambda _: complete(task_id, owner["username"]), range(NUM_WORKERS)))
+    assert sum(r.status_code == 200 for r in responses) == 1, "Exactly one completion should win"
+    assert all(r.status_code in (200, 400, 409) for r in responses)
+
+    after = balances(owner["user_id"])
+    assert after[owner["user_id"]][0] - before[owner["user_id"]][0] == 5, "Reward paid more than once"
@@ -0,0 +1,84 @@
+"""
+tests/test_content_cache.py
+---------------------------
+Tests for the cached static content (changelog, test reports):
+  - Repeated reads are served from memory until the file's mtime or size changes.
+  - Responses carry an ETag and Last-Modified; a matching conditional request gets a 304.
+  - Bodies are served precompressed to clients that accept gzip.
+"""
+import sys
+import os
+import json
+import gzip
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend import metrics
+from backend.content_cache import ContentCache
+
+client = TestClient(app)
+
+def test_cache_reloads_only_when_file_changes(tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("# Notes\n" + "line\n" * 200)
+    cache = ContentCache("test_content")
+
+    first = cache.get(str(path), "text/markdown")
+    assert cache.get(str(path), "text/markdown") is first
+    assert metrics.CACHE_REQUESTS.value("test_content", "hit") == 1
+    assert gzip.decompress(first.bodies["gzip"]) == first.bodies["identity"]
+
+    path.write_text("# Notes\nchanged\n")
+    os.utime(path, ns=(first.mtime_ns + 1_000_000_000, first.mtime_ns + 1_000_000_000))
+    second = cache.get(str(path), "text/markdown")
+    assert second is not first
+    assert second.bodies["identity"] == b"# Notes\nchanged\n"
+    assert second.etag != first.etag
+
+def test_changelog_conditional_get():
+    response = client.get("/other/changelog", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json().startswith("# Changelog")
+    etag = response.headers["etag"]
+
+    not_modified = client.get("/other/changelog", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    since = client.get("/other/changelog", headers={"If-Modified-Since": response.headers["last-modified"]})
+    assert since.status_code == 304
+
+def test_changelog_formats():
+    raw = client.get("/other/changelog", params={"format": "markdown"}, headers={"Accept-Encoding": "identity"})
+    assert raw.status_code == 200
+    assert raw.headers["content-type"].startswith("text/markdown")
+    assert "content-encoding" not in raw.headers
+    assert raw.text == client.get("/other/changelog").json()
+
+    rendered = client.get("/other/changelog", params={"format": "html"})
+    assert rendered.headers["content-type"].startswith("text/html")
+    assert "Changelog" in rendered.text
+    assert rendered.headers["etag"] != raw.headers["etag"]
+
+def test_test_report_json_served_from_cache(tmp_path, monkeypatch):
+    from backend.routers import logs
+    report = tmp_path / "report.json"
+    report.write_text(json.dumps({"summary": {"passed": 3}, "tests": []}))
+    monkeypatch.setattr(logs, "TEST_REPORT_JSON", str(report))
+
+    response = client.get("/logs/test_report_json")
+    assert response.status_code == 200
+    assert response.json()["summary"]["passed"] == 3
+    assert client.get("/logs/test_report_json", headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+
+    report.write_text("{broken")
+    os.utime(report, (0, 0))
+    assert client.get("/logs/test_report_json").status_code == 500
+
+    monkeypatch.setattr(logs, "TEST_REPORT_JSON", str(tmp_path / "missing.json"))
+    assert client.get("/logs/test_report_json").status_code == 404
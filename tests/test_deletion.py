@@ -0,0 +1,137 @@
+"""
+tests/test_deletion.py
+----------------------
+Tests for background quest log deletion:
+  - DELETE /questlogs/{id} hides the quest log at once (listings, board, new tasks, invites)
+    and queues a deletion job.
+  - The job deletes every row under the quest log in chunks, including comments, stories,
+    history, mirrors and rollup rows, and reports its progress.
+  - A job that fails part-way resumes at the table it stopped on.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import (
+    User, QuestLog, Task, Comment, Story, TaskHistory, TaskMirror, QuestLogMembership,
+    QuestLogInvite, QLActivity, TaskFlowDaily, QLActivityDaily, StoryDaily
+)
+from backend.db import SessionLocal
+from backend import deletion, rollups
+
+client = TestClient(app)
+
+OWNER = {"identifier": "quinn_deletion", "password": "password123", "email": "quinn_deletion@example.com"}
+MEMBER = {"identifier": "rosa_deletion", "password": "password123", "email": "rosa_deletion@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, MEMBER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def session():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+@pytest.fixture
+def queued(monkeypatch):
+    """Leave deletion jobs queued instead of running them after the response."""
+    monkeypatch.setattr(deletion, "run_deletion_job", lambda bind, job_id: None)
+
+def make_board(owner, member, session, name="Doomed Board"):
+    ql_id = client.post("/questlogs", json={"name": name, "owner_username": owner["username"]}).json()["quest_log_id"]
+    token = client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]},
+                        json={"is_permanent": True}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": member["username"], "action": "join"})
+    for i in range(3):
+        task_id = client.post("/tasks", json={"title": f"Doomed task {i}", "owner_username": owner["username"],
+                                              "quest_log_id": ql_id}).json()["task_id"]
+        client.post("/tasks/comment", json={"task_id": task_id, "content": "Bye", "username": member["username"]})
+        session.add(Story(task_id=task_id, owner_id=owner["user_id"], story_text="Once upon a time", xp=1, currency=1))
+    session.commit()
+    return ql_id, token
+
+def rows_of(session, ql_id):
+    task_ids = [t for (t,) in session.query(Task.id).filter(Task.quest_log_id == ql_id)]
+    return {
+        "tasks": len(task_ids),
+        "comments": session.query(Comment).filter(Comment.task_id.in_(task_ids)).count(),
+        "stories": session.query(Story).filter(Story.task_id.in_(task_ids)).count(),
+        "history": session.query(TaskHistory).filter(TaskHistory.task_id.in_(task_ids)).count(),
+        "memberships": session.query(QuestLogMembership).filter(QuestLogMembership.quest_log_id == ql_id).count(),
+        "invites": session.query(QuestLogInvite).filter(QuestLogInvite.quest_log_id == ql_id).count(),
+        "activities": session.query(QLActivity).filter(QLActivity.quest_log_id == ql_id).count(),
+        "flow_rollup": session.query(TaskFlowDaily).filter(TaskFlowDaily.quest_log_id == ql_id).count(),
+        "activity_rollup": session.query(QLActivityDaily).filter(QLActivityDaily.quest_log_id == ql_id).count(),
+        "story_rollup": session.query(StoryDaily).filter(StoryDaily.quest_log_id == ql_id).count(),
+        "quest_log": session.query(QuestLog).filter(QuestLog.id == ql_id).count(),
+    }
+
+def test_soft_delete_then_chunked_job(people, session, queued):
+    owner, member = people
+    ql_id, token = make_board(owner, member, session)
+    other_id = client.post("/questlogs", json={"name": "Mirror Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    doomed_task = session.query(Task.id).filter(Task.quest_log_id == ql_id).first()[0]
+    session.add(TaskMirror(task_id=doomed_task, quest_log_id=other_id))
+    session.commit()
+    rollups.refresh_all(session)
+    before = rows_of(session, ql_id)
+    # Rollup rows depend on the rollup watermarks other tests left behind.
+    assert all(count for table, count in before.items() if not table.endswith("_rollup"))
+
+    response = client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+    assert response.status_code == 202
+    progress = client.get(f"/questlogs/{ql_id}/deletion").json()
+    assert (progress["deletion_id"], progress["status"], progress["rows_deleted"]) == (response.json()["deletion_id"], "pending", 0)
+
+    assert ql_id not in [ql["id"] for ql in client.get("/questlogs", params={"username": member["username"]}).json()]
+    assert client.get("/tasks/", params={"viewer_username": member["username"], "quest_log_id": ql_id}).json() == []
+    assert client.post("/tasks", json={"title": "Too late", "owner_username": owner["username"], "quest_log_id": ql_id}).status_code == 403
+    assert client.get("/questlogs/invite/details", params={"token": token}).status_code == 404
+
+    assert deletion.process_deletions(session, chunk_size=2) == 1
+    assert not any(rows_of(session, ql_id).values())
+    assert session.query(TaskMirror).filter(TaskMirror.task_id == doomed_task).count() == 0
+    progress = client.get(f"/questlogs/{ql_id}/deletion").json()
+    assert progress["status"] == "done" and progress["steps_done"] == progress["steps_total"]
+    assert progress["rows_deleted"] == sum(before.values()) + 1  # Plus the mirror.
+    assert client.get(f"/questlogs/{other_id}/participants").json()[0]["username"] == owner["username"]
+    client.delete(f"/questlogs/{other_id}", params={"username": owner["username"]})
+    deletion.process_deletions(session)
+
+def test_failed_job_resumes_at_its_step(people, session, queued, monkeypatch):
+    owner, member = people
+    ql_id, _ = make_board(owner, member, session, "Stubborn Board")
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+    real_delete_chunk = deletion.delete_chunk
+    def failing_delete_chunk(db, model, condition, chunk_size):
+        if model is Task:
+            raise RuntimeError("database is locked")
+        return real_delete_chunk(db, model, condition, chunk_size)
+    monkeypatch.setattr(deletion, "delete_chunk", failing_delete_chunk)
+    deletion.process_deletions(session)
+    progress = client.get(f"/questlogs/{ql_id}/deletion").json()
+    assert (progress["status"], progress["step"], progress["error"]) == ("failed", "tasks", "database is locked")
+    assert rows_of(session, ql_id)["comments"] == 0 and rows_of(session, ql_id)["tasks"] == 3
+
+    monkeypatch.setattr(deletion, "delete_chunk", real_delete_chunk)
+    assert client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]}).json()["deletion_id"] == progress["deletion_id"]
+    deletion.process_deletions(session)
+    assert client.get(f"/questlogs/{ql_id}/deletion").json()["status"] == "done"
+    assert not any(rows_of(session, ql_id).values())
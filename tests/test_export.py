@@ -0,0 +1,174 @@
+"""
+tests/test_export.py
+--------------------
+Tests for the streaming export (/export):
+  - Tasks, task history and stories export as CSV, for one quest log or all of the user's,
+    with enum values written as plain text.
+  - Only members may export a quest log, and other users' private tasks and their stories
+    are masked as on the board.
+  - Rows are read and written in chunks of the requested size, from one snapshot: a
+    writer can commit while an export is half-way through, and its rows are not exported.
+  - Arrow and Parquet exports round-trip through pyarrow, or answer 501 without it.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import csv
+import io
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Story, TaskHistory
+from backend.db import SessionLocal
+from backend import export
+
+client = TestClient(app)
+
+OWNER = {"identifier": "xena_export", "password": "password123", "email": "xena_export@example.com"}
+MEMBER = {"identifier": "gabi_export", "password": "password123", "email": "gabi_export@example.com"}
+
+@pytest.fixture(scope="module")
+def owner():
+    user = client.post("/users/login", json=OWNER).json()["user"]
+    yield user
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture(scope="module")
+def member():
+    user = client.post("/users/login", json=MEMBER).json()["user"]
+    yield user
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture(scope="module")
+def boards(owner):
+    created = [client.post("/questlogs", json={"name": name, "owner_username": owner["username"]}).json()["quest_log_id"]
+               for name in ("Export Board", "Other Export Board")]
+    tasks = {}
+    for ql_id in created:
+        for i in range(3):
+            tasks[ql_id, i] = client.post("/tasks", json={"title": f"Export task {i}", "description": "Tally, the, scrolls",
+                                                          "owner_username": owner["username"], "quest_log_id": ql_id}).json()["task_id"]
+    client.put(f"/tasks/{tasks[created[0], 0]}/status", json={"new_status": "Doing", "username": owner["username"]})
+    session = SessionLocal()
+    session.add(Story(task_id=tasks[created[0], 1], owner_id=owner["user_id"], story_text="The scrolls were tallied", xp=3, currency=2))
+    session.commit()
+    session.close()
+    yield created, tasks
+    for ql_id in created:
+        client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def get_export(user, table, **params):
+    return client.get(f"/export/{table}", params={"username": user["username"], **params})
+
+def read_csv(response):
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/csv")
+    return list(csv.DictReader(io.StringIO(response.text)))
+
+def test_csv_export(owner, boards):
+    (board, other), tasks = boards
+    response = get_export(owner, "tasks", quest_log_id=board)
+    assert response.headers["content-disposition"] == f'attachment; filename="tasks_quest_log_{board}.csv"'
+    rows = read_csv(response)
+    assert [int(r["id"]) for r in rows] == [tasks[board, i] for i in range(3)]
+    assert (rows[0]["status"], rows[1]["status"]) == ("Doing", "To-Do")
+    assert rows[0]["description"] == "Tally, the, scrolls"
+
+    history = read_csv(get_export(owner, "task_history", quest_log_id=board))
+    assert [(int(r["task_id"]), r["status"]) for r in history if int(r["task_id"]) == tasks[board, 0]] == [
+        (tasks[board, 0], "Created"), (tasks[board, 0], "Doing")]
+    assert {int(r["quest_log_id"]) for r in history} == {board}
+
+    everything = read_csv(get_export(owner, "task_history"))
+    assert {int(r["quest_log_id"]) for r in everything} >= {board, other}
+
+    stories = read_csv(get_export(owner, "stories", quest_log_id=board))
+    assert (str(tasks[board, 1]), "3", "The scrolls were tallied") in [(r["task_id"], r["xp"], r["story_text"]) for r in stories]
+    assert all(int(r["quest_log_id"]) == board for r in stories)
+    assert read_csv(get_export(owner, "stories", quest_log_id=other)) == []
+
+    assert get_export(owner, "tasks", quest_log_id=999999).status_code == 404
+    assert get_export(owner, "users").status_code == 422
+    assert get_export(owner, "tasks", format="xlsx").status_code == 422
+    assert client.get("/export/tasks").status_code == 422, "An export is always for a user"
+
+def test_export_is_limited_to_members(owner, member):
+    vault = client.post("/questlogs", json={"name": "Vault", "owner_username": owner["username"]}).json()["quest_log_id"]
+    try:
+        assert get_export(member, "tasks", quest_log_id=vault).status_code == 403
+        assert read_csv(get_export(member, "tasks")) == [], "Nothing of quest logs they are not in"
+        token = client.post(f"/questlogs/{vault}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+        client.post("/questlogs/invite/accept", json={"token": token, "username": member["username"], "action": "join"})
+
+        task = {"owner_username": owner["username"], "quest_log_id": vault}
+        public = client.post("/tasks", json={**task, "title": "Count the coins"}).json()["task_id"]
+        secret = client.post("/tasks", json={**task, "title": "Hidden hoard", "description": "Under the third stone",
+                                             "is_private": True, "co_owners": owner["username"]}).json()["task_id"]
+        session = SessionLocal()
+        session.add(Story(task_id=secret, owner_id=owner["user_id"], story_text="The hoard was found", xp=1, currency=1))
+        session.commit()
+        session.close()
+
+        theirs = {int(r["id"]): r for r in read_csv(get_export(member, "tasks"))}
+        assert set(theirs) == {public, secret}, "Only the quest log they joined"
+        assert (theirs[secret]["title"], theirs[secret]["description"], theirs[secret]["co_owner_ids"]) == (
+            "Solo Adventure", "Solo Adventure", "")
+        assert theirs[public]["title"] == "Count the coins"
+        stories = read_csv(get_export(member, "stories", quest_log_id=vault))
+        assert [r["story_text"] for r in stories if int(r["task_id"]) == secret] == ["Solo Adventure"]
+
+        mine = {int(r["id"]): r for r in read_csv(get_export(owner, "tasks", quest_log_id=vault))}
+        assert mine[secret]["title"] == "Hidden hoard"
+        stories = read_csv(get_export(owner, "stories", quest_log_id=vault))
+        assert [r["story_text"] for r in stories if int(r["task_id"]) == secret] == ["The hoard was found"]
+    finally:
+        client.delete(f"/questlogs/{vault}", params={"username": owner["username"]})
+
+def test_export_streams_chunks_from_one_snapshot(boards):
+    (board, _), tasks = boards
+    reader = SessionLocal()
+    stream = export.export_table(reader, "task_history", quest_log_id=board, chunk_size=2)
+    first = next(stream)
+    assert first.decode().splitlines()[0] == "id,task_id,quest_log_id,status,timestamp"
+    assert len(first.decode().splitlines()) == 3, "Header and the first chunk of two rows"
+
+    writer = SessionLocal()
+    writer.add(TaskHistory(task_id=tasks[board, 2], status="Waiting"))
+    writer.commit()  # Would raise "database is locked" if the open export blocked writers.
+    writer.close()
+
+    rest = b"".join(stream)
+    reader.close()
+    lines = (first + rest).decode().splitlines()
+    assert len(lines) == 1 + 4, "Four history rows when the export started: three created, one moved"
+    assert "Waiting" not in [line.split(",")[3] for line in lines[1:]]
+
+@pytest.mark.parametrize("fmt", ["arrow", "parquet"])
+def test_columnar_export(owner, boards, fmt):
+    (board, _), tasks = boards
+    response = get_export(owner, "tasks", quest_log_id=board, format=fmt)
+    if export.pyarrow is None:
+        assert response.status_code == 501
+        return
+    assert response.status_code == 200, response.text
+    if fmt == "arrow":
+        table = export.pyarrow.ipc.open_stream(response.content).read_all()
+    else:
+        table = export.pyarrow.parquet.read_table(export.pyarrow.BufferReader(response.content))
+    assert table.column("id").to_pylist() == [tasks[board, i] for i in range(3)]
+    assert table.column("status").to_pylist() == ["Doing", "To-Do", "To-Do"]
+    assert str(table.schema.field("created_at").type) == "timestamp[us]"
@@ -64,7 +64,7 @@ def cleanup_questlogs(test_users):
                 ql_list = list_resp.json()
                 for ql in ql_list:
                     del_resp = client.delete(f"/questlogs/{ql['id']}?username={user['username']}")
-                    if del_resp.status_code != 200:
+                    if del_resp.status_code != 202:
                         print(f"Warning: Could not delete quest log {ql['id']} for user {user['username']}")
         except Exception as e:
             print("Error during quest log cleanup:", e)
@@ -143,7 +143,7 @@ def test_quest_log_creation_and_invite(test_users, cleanup_questlogs):
     perm_token = perm_response.json()["token"]
 
     # Get invites.
-    invites_response = client.get(f"/questlogs/{ql_id}/invites")
+    invites_response = client.get(f"/questlogs/{ql_id}/invites", params={"include_dead": True})
     assert invites_response.status_code == 200, "Getting invites failed"
     invites = invites_response.json()
     non_perm_invite = next((inv for inv in invites if inv["token"] == token), None)
@@ -0,0 +1,143 @@
+"""
+tests/test_invites.py
+---------------------
+Tests for invite listing and sweeping:
+  - Statuses come from the query; revoked, used and expired invites are hidden unless
+    include_dead is set, and the listing is paginated newest first.
+  - Single-use invites can only be accepted once, permanent ones by everyone.
+  - The sweeper marks dead invites archived in bulk, and old archived invites are moved
+    to the archive files.
+  - ensure_schema adds the new archived_at column to an existing invites table.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect, text
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, QuestLogInvite, ensure_schema
+from backend.db import SessionLocal
+from backend import retention
+
+client = TestClient(app)
+
+OWNER = {"identifier": "lena_invites", "password": "password123", "email": "lena_invites@example.com"}
+GUEST = {"identifier": "milo_invites", "password": "password123", "email": "milo_invites@example.com"}
+OTHER = {"identifier": "nora_invites", "password": "password123", "email": "nora_invites@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, GUEST, OTHER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def board(people):
+    owner = people[0]
+    ql_id = client.post("/questlogs", json={"name": "Invite Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    yield ql_id
+    session = SessionLocal()
+    session.query(QuestLogInvite).filter(QuestLogInvite.quest_log_id == ql_id).delete()
+    session.commit()
+    session.close()
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def invite(ql_id, owner, **options):
+    return client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]}, json=options).json()["token"]
+
+def expire(token):
+    session = SessionLocal()
+    session.query(QuestLogInvite).filter(QuestLogInvite.token == token).update(
+        {"expires_at": datetime.utcnow() - timedelta(hours=1)})
+    session.commit()
+    session.close()
+
+def accept(token, user):
+    return client.post("/questlogs/invite/accept", json={"token": token, "username": user["username"], "action": "join"})
+
+def statuses(ql_id, **params):
+    return {inv["token"]: inv["status"] for inv in client.get(f"/questlogs/{ql_id}/invites", params=params).json()}
+
+def test_listing_hides_dead_invites(people, board):
+    owner, guest, _ = people
+    expiring = invite(board, owner, expires_in_hours=5)
+    permanent = invite(board, owner, is_permanent=True)
+    used = invite(board, owner)
+    expired = invite(board, owner, expires_in_hours=1)
+    assert accept(used, guest).status_code == 200
+    expire(expired)
+
+    live = statuses(board)
+    assert live.keys() == {expiring, permanent}
+    assert live[permanent] == "Permanent"
+    assert live[expiring].endswith("hours remaining") and float(live[expiring].split()[0]) > 4.9
+
+    everything = statuses(board, include_dead=True)
+    assert (everything[used], everything[expired]) == ("Revoked", "Expired")
+
+    page = client.get(f"/questlogs/{board}/invites", params={"include_dead": True, "limit": 2, "skip": 1}).json()
+    assert [inv["token"] for inv in page] == [used, permanent]
+
+def test_accept_rules(people, board):
+    owner, guest, other = people
+    single = invite(board, owner)
+    assert accept(single, guest).status_code == 200
+    assert accept(single, other).status_code == 400
+
+    permanent = invite(board, owner, is_permanent=True)
+    assert accept(permanent, guest).json()["message"] == "User already a member or spectator"
+    assert accept(permanent, other).status_code == 200
+    assert statuses(board)[permanent] == "Permanent"
+
+def test_sweeper_archives_dead_invites(people, board, tmp_path, monkeypatch):
+    owner, guest, _ = people
+    live = invite(board, owner, is_permanent=True)
+    used = invite(board, owner)
+    expired = invite(board, owner, expires_in_hours=1)
+    accept(used, guest)
+    expire(expired)
+
+    session = SessionLocal()
+    try:
+        assert retention.sweep_invites(session) >= 2
+        archived = dict(session.query(QuestLogInvite.token, QuestLogInvite.archived_at)
+                        .filter(QuestLogInvite.quest_log_id == board))
+        assert archived[live] is None and archived[used] and archived[expired]
+        assert statuses(board, include_dead=True).keys() == {live, used, expired}
+
+        monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+        assert retention.archive_invites(session) == 0
+        assert retention.archive_invites(session, now=datetime.utcnow() + timedelta(days=retention.INVITE_RETENTION_DAYS + 1)) >= 2
+    finally:
+        session.close()
+    assert statuses(board, include_dead=True).keys() == {live}
+    archived_rows = [json.loads(line) for path in (tmp_path / "quest_log_invites").iterdir()
+                     for line in gzip.open(path, "rt")]
+    assert {used, expired} <= {row["token"] for row in archived_rows}
+
+def test_ensure_schema_adds_archived_at(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE quest_log_invites (id INTEGER PRIMARY KEY, quest_log_id INTEGER NOT NULL, token VARCHAR UNIQUE NOT NULL,"
+            " used BOOLEAN, revoked BOOLEAN, expires_at DATETIME, is_permanent BOOLEAN, created_at DATETIME)"
+        ))
+    ensure_schema(engine)
+    inspector = inspect(engine)
+    assert "archived_at" in {c["name"] for c in inspector.get_columns("quest_log_invites")}
+    assert "ix_quest_log_invites_listing" in {i["name"] for i in inspector.get_indexes("quest_log_invites")}
+    engine.dispose()
@@ -0,0 +1,65 @@
+"""
+tests/test_log_reader.py
+------------------------
+Tests for the bounded-memory log readers:
+  - Paging backwards through a log with byte-offset cursors returns every line once.
+  - Rotated gzip backups page and search the same way.
+  - The follower picks up appended lines and survives rotation.
+"""
+import sys
+import os
+import gzip
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend import log_reader
+
+LINES = [f"2025-03-10 12:00:{i % 60:02d} - INFO - event {i} " + "x" * (i % 97) for i in range(3000)]
+
+def write_log(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in lines))
+
+def page_all(path, page_size):
+    collected, cursor = [], None
+    while True:
+        page, cursor = log_reader.tail(path, page_size, cursor)
+        collected.extend(page)
+        if cursor is None:
+            return collected
+
+def test_tail_pages_backwards_with_cursor(tmp_path):
+    path = tmp_path / "backend.log"
+    write_log(path, LINES)
+    newest, _ = log_reader.tail(str(path), 5)
+    assert newest == LINES[::-1][:5]
+    assert page_all(str(path), 173) == LINES[::-1]
+    # Tiny blocks exercise lines spanning block boundaries.
+    assert [line.decode() for _, line in log_reader.iter_lines_reverse(str(path), block_size=11)] == LINES[::-1]
+
+def test_rotated_gzip_backups_page_and_search(tmp_path):
+    write_log(tmp_path / "backend.log", LINES[2000:])
+    with gzip.open(tmp_path / "backend.log.2025-03-09.gz", "wt", encoding="utf-8") as f:
+        f.write("".join(line + "\n" for line in LINES[:2000]))
+    assert page_all(str(tmp_path / "backend.log.2025-03-09.gz"), 300) == LINES[:2000][::-1]
+
+    matches = log_reader.search(str(tmp_path), "backend.log", "EVENT 1999 ", limit=10)
+    assert [m["filename"] for m in matches] == ["backend.log.2025-03-09.gz"]
+    matches = log_reader.search(str(tmp_path), "backend.log", "event 2", limit=3)
+    assert [m["line"] for m in matches] == [LINES[2999], LINES[2998], LINES[2997]]
+
+def test_follower_reads_appends_across_rotation(tmp_path):
+    path = tmp_path / "frontend.log"
+    write_log(path, ["old"])
+    follower = log_reader.LogFollower(str(path))
+    try:
+        assert follower.poll() == []
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("new 1\nnew 2\npartial")
+        assert [line for _, line in follower.poll()] == ["new 1", "new 2"]
+        os.replace(path, tmp_path / "frontend.log.1")
+        write_log(path, ["after rotation"])
+        assert [line for _, line in follower.poll()] == ["after rotation"]
+    finally:
+        follower.close()
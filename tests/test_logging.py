@@ -0,0 +1,105 @@
+"""
+tests/test_logging.py
+---------------------
+Tests for the queued logging pipeline:
+  - A full queue drops records below WARNING (and counts them) but never blocks the caller.
+  - The batching listener writes every queued record and reports drops in the log itself.
+  - The frontend append endpoint accepts single messages and batches.
+  - Records carry the request context and can be queried by field.
+  - DEBUG sampling is decided per request.
+"""
+import sys
+import os
+import time
+import json
+import queue
+import logging
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend import logging_config, log_reader
+
+client = TestClient(app)
+
+def test_full_queue_drops_low_priority_records(tmp_path):
+    log_queue = queue.Queue(maxsize=2)
+    handler = logging_config.BoundedQueueHandler(log_queue)
+    logger = logging.getLogger("test-bounded-queue")
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.info(f"record {i}")
+        assert handler.dropped == 3
+        assert log_queue.qsize() == 2
+
+        file_handler = logging_config.make_rotating_handler(str(tmp_path / "test.log"))
+        file_handler.setFormatter(logging.Formatter("%(levelname)s - %(message)s"))
+        listener = logging_config.BatchingQueueListener(log_queue, file_handler, overflow_handler=handler)
+        listener.start()
+        listener.stop()
+        file_handler.close()
+        lines = (tmp_path / "test.log").read_text(encoding="utf-8").splitlines()
+        assert lines == ["INFO - record 0", "INFO - record 1", "WARNING - Log queue full: dropped 3 records"]
+    finally:
+        logger.removeHandler(handler)
+
+def test_frontend_append_accepts_batches():
+    marker = f"batch-{time.time()}"
+    assert client.post("/logs/frontend/append", json={"message": f"{marker} single"}).json()["count"] == 1
+    response = client.post("/logs/frontend/append", json={"messages": [f"{marker} a", f"{marker} b"]})
+    assert response.status_code == 200 and response.json()["count"] == 2
+    assert client.post("/logs/frontend/append", json=["x"] * 501).status_code == 413
+
+    written = wait_for_lines("logs/frontend/frontend.log", marker, 3)
+    assert [json.loads(line)["msg"] for line in written] == [f"{marker} single", f"{marker} a", f"{marker} b"]
+
+def wait_for_lines(path, marker, count):
+    """The writer thread is asynchronous; wait until `count` lines containing `marker` are on disk."""
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        with open(path, encoding="utf-8") as f:
+            written = [line for line in f if marker in line]
+        if len(written) >= count:
+            break
+        time.sleep(0.05)
+    return written
+
+def test_request_context_is_logged_and_queryable():
+    request_id = f"req-{time.time()}"
+    # An unknown user gets a 404, which is still a completed request.
+    response = client.get("/questlogs/", params={"username": "nobody_logging"}, headers={"X-Request-ID": request_id})
+    assert response.headers["X-Request-ID"] == request_id
+    written = wait_for_lines("logs/backend/backend.log", request_id, 2)
+    completed = json.loads(written[-1])
+    assert completed["msg"] == "Request completed"
+    assert completed["route"] == "/questlogs/" and completed["user"] == "nobody_logging"
+    assert completed["status"] == 404 and completed["latency_ms"] >= 0
+
+    found = client.get("/logs/backend/query", params={"request_id": request_id}).json()
+    assert [m["entry"]["msg"] for m in found][0] == "Request completed"
+    assert all(m["entry"]["user"] == "nobody_logging" for m in found)
+    slow = log_reader.query("logs/backend", "backend.log", {"request_id": request_id}, min_latency_ms=10 ** 9)
+    assert slow == []
+
+def test_debug_sampling_is_per_request(monkeypatch):
+    monkeypatch.setattr(logging_config, "DEBUG_SAMPLING", logging_config.parse_sampling("/logs=0,*=1"))
+    context_filter = logging_config.RequestContextFilter()
+    debug = logging.makeLogRecord({"levelno": logging.DEBUG, "msg": "noisy"})
+    info = logging.makeLogRecord({"levelno": logging.INFO, "msg": "kept"})
+
+    token = logging_config.bind_request_context(request_id="sampled-out", path="/logs/backend")
+    try:
+        assert not context_filter.filter(debug)
+        assert context_filter.filter(info) and info.request_id == "sampled-out"
+    finally:
+        logging_config.reset_request_context(token)
+    token = logging_config.bind_request_context(request_id="kept", path="/tasks/")
+    try:
+        assert context_filter.filter(debug)
+    finally:
+        logging_config.reset_request_context(token)
@@ -0,0 +1,74 @@
+"""
+tests/test_metrics.py
+---------------------
+Tests for the /metrics endpoint and its instrumentation:
+  - Requests are counted per route template, with latency and queries-per-request histograms.
+  - Scheduler job runs written to a textfile by the scheduler process appear in /metrics once.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import re
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User
+from backend.db import SessionLocal
+from backend import metrics, scheduler
+
+client = TestClient(app)
+
+TEST_USER = {"identifier": "grace_metrics", "password": "password123", "email": "grace_metrics@example.com"}
+
+@pytest.fixture(scope="module")
+def user():
+    user = client.post("/users/login", json=TEST_USER).json()["user"]
+    yield user
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+def sample(text, name, **labels):
+    """The value of one sample in Prometheus text output (None if absent)."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + ("{" + label_text + "}" if labels else "")) + r" (\S+)"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+def test_requests_and_queries_are_measured_per_route(user):
+    ql_id = client.post("/questlogs", json={"name": "Metrics Board", "owner_username": user["username"]}).json()["quest_log_id"]
+    for i in range(3):
+        client.post("/tasks", json={"title": f"Metric task {i}", "owner_username": user["username"], "quest_log_id": ql_id})
+    before = metrics.DB_QUERIES_PER_REQUEST.count("GET", "/tasks/")
+
+    response = client.get("/tasks/", params={"viewer_username": user["username"], "quest_log_id": ql_id})
+    assert response.status_code == 200 and len(response.json()) == 3
+
+    text = client.get("/metrics").text
+    assert sample(text, "taskfable_db_queries_per_request_count", method="GET", route="/tasks/") == before + 1
+    assert sample(text, "taskfable_http_requests_total", method="GET", route="/tasks/", status="200") >= 1
+    assert sample(text, "taskfable_http_request_duration_seconds_bucket", method="GET", route="/tasks/", le="+Inf") >= 1
+    assert sample(text, "taskfable_db_queries_total") > 0
+    assert 'taskfable_log_records_dropped{logger="backend-logger"}' in text
+    client.delete(f"/questlogs/{ql_id}?username={user['username']}")
+
+def test_scheduler_runs_are_exported_through_textfile(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+
+    def failing_job(db):
+        raise RuntimeError("boom")
+    monkeypatch.setattr(scheduler, "JOBS", [(failing_job, 60)])
+    scheduler.run_due_jobs({}, 0.0)
+    metrics.write_textfile("scheduler", prefix="taskfable_scheduler_")
+
+    text = client.get("/metrics").text
+    assert sample(text, "taskfable_scheduler_job_runs_total", job="failing_job", outcome="error") >= 1
+    assert text.count("# TYPE taskfable_scheduler_job_runs_total counter") == 1
+    assert text.count("# TYPE taskfable_http_requests_total counter") == 1
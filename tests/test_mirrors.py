@@ -0,0 +1,125 @@
+"""
+tests/test_mirrors.py
+---------------------
+Tests for Oracle Tasks (tasks mirrored into other quest logs):
+  - Mirrors are created, listed and removed through /tasks/{id}/mirrors, by members of
+    both boards only.
+  - The target board lists mirrored tasks next to its own, marked with their source quest
+    log, and shows edits of the source task without any copy.
+  - Purging tasks (/tasks/dev/purge) removes their mirrors too.
+  - A board with mirrors still loads in a constant number of queries, however many other
+    boards the same task is mirrored into.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, TaskMirror
+from backend.db import SessionLocal
+
+client = TestClient(app)
+
+OWNER = {"identifier": "sage_mirrors", "password": "password123", "email": "sage_mirrors@example.com"}
+MEMBER = {"identifier": "tara_mirrors", "password": "password123", "email": "tara_mirrors@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, MEMBER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def boards(people):
+    owner = people[0]
+    created = []
+    def make(name):
+        ql_id = client.post("/questlogs", json={"name": name, "owner_username": owner["username"]}).json()["quest_log_id"]
+        created.append(ql_id)
+        return ql_id
+    yield make
+    for ql_id in created:
+        client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def add_member(ql_id, owner, member):
+    token = client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": member["username"], "action": "join"})
+
+def add_task(ql_id, owner, title):
+    return client.post("/tasks", json={"title": title, "description": "Original", "owner_username": owner["username"],
+                                       "quest_log_id": ql_id}).json()["task_id"]
+
+def mirror(task_id, ql_id, user, note=None):
+    return client.post(f"/tasks/{task_id}/mirrors", json={"quest_log_id": ql_id, "username": user["username"], "note": note})
+
+def board(ql_id, viewer):
+    return {t["title"]: t for t in client.get("/tasks/", params={"viewer_username": viewer["username"], "quest_log_id": ql_id}).json()}
+
+def test_mirror_lifecycle(people, boards):
+    owner, member = people
+    source, target = boards("Oracle Source"), boards("Oracle Target")
+    add_member(target, owner, member)
+    oracle = add_task(source, owner, "Consult the oracle")
+    add_task(target, owner, "Local quest")
+
+    assert mirror(oracle, source, owner).status_code == 400
+    assert mirror(oracle, target, member).status_code == 403, "Members of the target board only cannot mirror"
+    created = mirror(oracle, target, owner, note="See the source board")
+    assert created.status_code == 200
+    assert mirror(oracle, target, owner).status_code == 400
+
+    seen = board(target, member)
+    assert seen.keys() == {"Consult the oracle", "Local quest"}
+    assert (seen["Consult the oracle"]["mirrored_from"], seen["Consult the oracle"]["mirror_note"]) == (source, "See the source board")
+    assert seen["Local quest"]["mirrored_from"] is None
+    assert seen["Consult the oracle"]["history"][0]["status"] == "Created"
+
+    client.put(f"/tasks/{oracle}/edit", params={"username": owner["username"]}, json={"description": "Revised"})
+    assert board(target, member)["Consult the oracle"]["description"] == "Revised"
+
+    mirrors = client.get(f"/tasks/{oracle}/mirrors").json()
+    assert [(m["id"], m["quest_log_id"], m["quest_log_name"]) for m in mirrors] == [(created.json()["mirror_id"], target, "Oracle Target")]
+    removed = client.delete(f"/tasks/{oracle}/mirrors/{mirrors[0]['id']}", params={"username": member["username"]})
+    assert removed.status_code == 200
+    assert board(target, member).keys() == {"Local quest"}
+    assert client.get(f"/tasks/{oracle}/mirrors").json() == []
+
+def test_purge_removes_mirrors(people, boards):
+    owner, _ = people
+    source, target = boards("Purged Source"), boards("Purged Target")
+    oracle = add_task(source, owner, "Doomed oracle")
+    assert mirror(oracle, target, owner).status_code == 200
+    assert client.post("/tasks/dev/purge").status_code == 200
+    session = SessionLocal()
+    try:
+        assert session.query(TaskMirror).filter(TaskMirror.task_id == oracle).count() == 0
+    finally:
+        session.close()
+    assert board(target, owner) == {}
+
+def test_board_with_widely_mirrored_task_is_constant_queries(people, boards, query_counter):
+    owner, _ = people
+    source = boards("Fan-out Source")
+    oracle = add_task(source, owner, "Everywhere at once")
+    targets = [boards(f"Fan-out Target {i}") for i in range(8)]
+    for ql_id in targets:
+        assert mirror(oracle, ql_id, owner).status_code == 200
+        add_task(ql_id, owner, f"Own task of {ql_id}")
+
+    with query_counter.at_most(5):
+        seen = board(targets[3], owner)
+    assert seen.keys() == {"Everywhere at once", f"Own task of {targets[3]}"}
+
+    client.delete(f"/questlogs/{source}", params={"username": owner["username"]})
+    assert board(targets[3], owner).keys() == {f"Own task of {targets[3]}"}, "Mirrors go with their source quest log"
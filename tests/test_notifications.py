@@ -0,0 +1,215 @@
+"""
+tests/test_notifications.py
+---------------------------
+Tests for due-date notifications (backend/notifications.py):
+  - Owners and co-owners of tasks coming due get one notification each, with the due time
+    in their own timezone (fixed offsets such as "UTC+05:00" or IANA names), in their in-app
+    feed (/users/{username}/notifications); malformed co-owner ids are skipped.
+  - The outbox is delivered as one digest per user and sink, to a local webhook server and
+    an SMTP stand-in; failed digests are retried with backoff, then given up on.
+  - A spike of thousands of due tasks is queued and delivered in a few batched statements.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Task, TaskStatus, Notification, NotificationDelivery
+from backend.db import SessionLocal, engine
+from backend import notifications
+
+client = TestClient(app)
+
+OWNER = {"identifier": "zora_notify", "password": "password123", "email": "zora_notify@example.com"}
+HELPER = {"identifier": "abel_notify", "password": "password123", "email": "abel_notify@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, HELPER)]
+    client.put(f"/users/{created[0]['username']}/settings", json={"timezone": "Europe/Paris"})
+    yield created
+    session = SessionLocal()
+    ids = [user["user_id"] for user in created]
+    session.query(NotificationDelivery).filter(NotificationDelivery.user_id.in_(ids)).delete(synchronize_session=False)
+    session.query(Notification).filter(Notification.user_id.in_(ids)).delete(synchronize_session=False)
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def board(people):
+    owner = people[0]
+    ql_id = client.post("/questlogs", json={"name": "Deadline Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    yield ql_id
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+@pytest.fixture
+def session():
+    db = SessionLocal()
+    yield db
+    db.close()
+
+@pytest.fixture
+def webhook():
+    """A local webhook endpoint recording every JSON body; set .status to make it fail."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            server.received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(server.status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    server.received, server.status = [], 200
+    server.url = f"http://127.0.0.1:{server.server_port}/hook"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sinks(monkeypatch, webhook):
+    """Webhook and email sinks enabled; emails are collected instead of sent."""
+    sent = []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout=None):
+            pass
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def send_message(self, message):
+            sent.append(message)
+
+    monkeypatch.setattr(notifications, "NOTIFY_SINKS", ["webhook", "email"])
+    monkeypatch.setitem(notifications.SINKS, "webhook", lambda: notifications.WebhookSink(webhook.url))
+    monkeypatch.setattr(notifications.smtplib, "SMTP", FakeSMTP)
+    return sent
+
+def add_task(board, owner, title, due_in, co_owners=""):
+    return client.post("/tasks", json={"title": title, "owner_username": owner["username"], "quest_log_id": board,
+                                       "co_owners": co_owners,
+                                       "scheduled_time": (datetime.utcnow() + due_in).isoformat()}).json()["task_id"]
+
+def feed(user, **params):
+    return client.get(f"/users/{user['username']}/notifications", params=params).json()
+
+def digests_for(webhook, user):
+    return [body for body in webhook.received if body["username"] == user["username"]]
+
+def test_due_tasks_notify_owners(people, board, session):
+    owner, helper = people
+    soon = add_task(board, owner, "Feed the phoenix", timedelta(minutes=30), co_owners=helper["username"])
+    add_task(board, owner, "Later chores", timedelta(hours=5))
+    done = add_task(board, owner, "Already fed", timedelta(minutes=20))
+    client.put(f"/tasks/{done}/status", json={"new_status": "Doing", "username": owner["username"]})
+    client.put(f"/tasks/{done}/status", json={"new_status": "Done", "username": owner["username"]})
+
+    notifications.enqueue_due(session)
+    assert [n["task_id"] for n in feed(owner)] == [soon]
+    assert [n["task_id"] for n in feed(helper)] == [soon]
+    assert feed(owner)[0]["message"].startswith("'Feed the phoenix' is due ")
+    assert feed(owner)[0]["message"].endswith("(Europe/Paris)")
+    assert feed(helper)[0]["message"].endswith("(UTC)")
+    assert notifications.enqueue_due(session) == 0, "Each due time is notified once"
+
+    marked = client.post(f"/users/{owner['username']}/notifications/read", json={}).json()
+    assert marked["count"] == 1
+    assert feed(owner, unread_only=True) == []
+
+def test_due_times_in_offset_timezones():
+    due = datetime(2026, 10, 19, 9, 30)
+    assert notifications.local_time(due, "UTC+05:00") == "2026-10-19 14:30 (UTC+05:00)"
+    assert notifications.local_time(due, "UTC-03:30") == "2026-10-19 06:00 (UTC-03:30)"
+    assert notifications.local_time(due, "Europe/Paris") == "2026-10-19 11:30 (Europe/Paris)"
+    assert notifications.local_time(due, "Mars/Olympus") == "2026-10-19 09:30 (UTC)"
+    assert notifications.local_time(due, None) == "2026-10-19 09:30 (UTC)"
+
+def test_malformed_co_owners_are_skipped(people, board, session):
+    owner, helper = people
+    session.add(Task(title="Scribbled roster", quest_log_id=board, owner_id=owner["user_id"], status=TaskStatus.todo,
+                     co_owner_ids=f"abc,{helper['user_id']}, ,7x", scheduled_time=datetime.utcnow() + timedelta(minutes=15)))
+    session.commit()
+    assert notifications.enqueue_due(session) >= 2, "One bad row does not stop the pass"
+    assert "Scribbled roster" in feed(helper)[0]["message"]
+
+def test_digests_and_retries(people, board, session, sinks, webhook):
+    owner, helper = people
+    tasks = [add_task(board, owner, f"Chore {i}", timedelta(minutes=10 + i)) for i in range(3)]
+    now = datetime.utcnow()
+    notifications.enqueue_due(session, now)
+    webhook.status = 500
+    notifications.deliver_pending(session, now)
+    assert len(digests_for(webhook, owner)) == 1
+    notifications.deliver_pending(session, now)
+    assert len(digests_for(webhook, owner)) == 1, "Failed digests back off before their retry"
+
+    webhook.status = 200
+    notifications.deliver_pending(session, now + timedelta(seconds=notifications.RETRY_BASE_SECONDS))
+    digest = digests_for(webhook, owner)[-1]
+    assert sorted(item["task_id"] for item in digest["notifications"]) == tasks
+    assert len(digests_for(webhook, owner)) == 2
+    emails = [m for m in sinks if m["To"] == owner["email"]]
+    assert len(emails) == 1 and emails[0]["Subject"] == "TaskFable: 3 task(s) coming due"
+
+    session.expire_all()
+    deliveries = session.query(NotificationDelivery).filter(NotificationDelivery.user_id == owner["user_id"]).all()
+    assert {(d.sink, d.status) for d in deliveries} == {("webhook", "sent"), ("email", "sent")}
+    assert {d.attempts for d in deliveries if d.sink == "webhook"} == {2}
+
+def test_failing_sink_gives_up(people, board, session, sinks, webhook):
+    owner, _ = people
+    add_task(board, owner, "Unreachable", timedelta(minutes=5))
+    now = datetime.utcnow()
+    notifications.enqueue_due(session, now)
+    webhook.status = 503
+    for attempt in range(notifications.MAX_ATTEMPTS):
+        notifications.deliver_pending(session, now + timedelta(days=attempt))
+    session.expire_all()
+    webhook_rows = session.query(NotificationDelivery).join(Notification).filter(
+        NotificationDelivery.user_id == owner["user_id"], NotificationDelivery.sink == "webhook",
+        Notification.message.like("'Unreachable'%")).all()
+    assert [(d.status, d.attempts) for d in webhook_rows] == [("failed", notifications.MAX_ATTEMPTS)]
+    assert "HTTPError" in webhook_rows[0].error
+
+def test_morning_spike_is_batched(people, board, session, sinks, webhook):
+    owner, _ = people
+    now = datetime.utcnow()
+    session.execute(insert(Task), [
+        {"title": f"Spike {i}", "quest_log_id": board, "owner_id": owner["user_id"], "status": TaskStatus.todo,
+         "co_owner_ids": "", "scheduled_time": now + timedelta(seconds=i)}
+        for i in range(3000)
+    ])
+    session.commit()
+    statements = []
+    listener = lambda *args: statements.append(1)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        queued = notifications.enqueue_due(session, now)
+        notifications.deliver_pending(session, now)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert queued >= 3000
+    assert len(statements) < 40, f"{len(statements)} statements"
+    spike = [item for body in digests_for(webhook, owner) for item in body["notifications"] if "'Spike" in item["message"]]
+    assert len(spike) == 3000
+    assert len(digests_for(webhook, owner)) <= 3, "One digest per user and batch"
@@ -0,0 +1,63 @@
+"""
+tests/test_profiling.py
+-----------------------
+Tests for per-request profiling:
+  - The sampler keeps only stacks running the target code, rooted at that frame.
+  - A request with an X-Profile header (or __profile flag) is profiled, and the profile is
+    listed and downloadable through the logs router.
+"""
+import sys
+import os
+import time
+import json
+import threading
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend import profiling
+
+client = TestClient(app)
+
+def busy_endpoint(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        busy_leaf()
+
+def busy_leaf():
+    return sum(range(200))
+
+def test_sampler_keeps_stacks_of_target_code():
+    profiler = profiling.SamplingProfiler(lambda: busy_endpoint.__code__, interval_ms=1).start()
+    worker = threading.Thread(target=busy_endpoint, args=(0.2,))
+    worker.start()
+    worker.join()
+    profiler.stop()
+
+    assert profiler.samples, "a 200 ms busy loop sampled every 1 ms yields samples"
+    assert all(stack[0] is busy_endpoint.__code__ for stack in profiler.samples)
+    collapsed = profiler.collapsed()
+    assert collapsed.startswith("busy_endpoint (")
+    speedscope = profiler.speedscope("busy")
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert {f["name"] for f in speedscope["shared"]["frames"]} <= {"busy_endpoint", "busy_leaf"}
+
+def test_profiled_request_is_stored_and_downloadable(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    assert "X-Profile-File" not in client.get("/server/timezone").headers
+
+    response = client.get("/server/timezone", headers={"X-Profile": "speedscope", "X-Request-ID": "../../evil"})
+    filename = response.headers["X-Profile-File"]
+    assert filename.endswith(".speedscope.json") and "/" not in filename
+
+    response = client.get("/server/timezone", params={"__profile": "1"})
+    assert response.headers["X-Profile-File"].endswith(".collapsed.txt")
+
+    listed = [p["filename"] for p in client.get("/logs/profiles").json()]
+    assert filename in listed and len(listed) == 2
+    downloaded = client.get(f"/logs/profiles/{filename}")
+    assert downloaded.status_code == 200
+    assert json.loads(downloaded.content)["exporter"] == "taskfable"
+    assert client.get("/logs/profiles/missing.collapsed.txt").status_code == 404
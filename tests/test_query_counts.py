@@ -0,0 +1,70 @@
+"""
+tests/test_query_counts.py
+--------------------------
+Query-count regression guards: listing a board must run a fixed number of SQL statements,
+however many tasks, comments and co-owners it has.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User
+from backend.db import SessionLocal
+
+client = TestClient(app)
+
+OWNER = {"identifier": "heidi_queries", "password": "password123", "email": "heidi_queries@example.com"}
+MEMBER = {"identifier": "ivan_queries", "password": "password123", "email": "ivan_queries@example.com"}
+
+@pytest.fixture(scope="module")
+def users():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, MEMBER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+def make_board(owner, member, num_tasks):
+    ql_id = client.post("/questlogs", json={"name": f"Query Board {num_tasks}", "owner_username": owner["username"]}).json()["quest_log_id"]
+    for i in range(num_tasks):
+        task_id = client.post("/tasks", json={
+            "title": f"Task {i}", "owner_username": owner["username"], "quest_log_id": ql_id,
+            "co_owners": member["username"] if i % 2 else "", "is_private": i % 3 == 0,
+        }).json()["task_id"]
+        client.post("/tasks/comment", json={"task_id": task_id, "content": f"Note {i}", "username": member["username"]})
+    return ql_id
+
+@pytest.mark.parametrize("num_tasks", [1, 30])
+def test_get_tasks_query_count_is_constant(users, query_counter, num_tasks):
+    owner, member = users
+    ql_id = make_board(owner, member, num_tasks)
+    with query_counter.at_most(5):
+        response = client.get("/tasks/", params={"viewer_username": owner["username"], "quest_log_id": ql_id})
+    tasks = response.json()
+    assert len(tasks) == num_tasks
+    assert all(t["owner_username"] == owner["username"] for t in tasks)
+    assert all(t["comments"][0]["owner_username"] == member["username"] for t in tasks)
+    assert all(t["history"][0]["status"] == "Created" for t in tasks)
+
+    client.post("/questlogs/invite/accept", json={
+        "token": client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]},
+                             json={"is_permanent": True}).json()["token"],
+        "username": member["username"], "action": "join",
+    })
+    with query_counter.at_most(5):
+        seen_by_member = client.get("/tasks/", params={"viewer_username": member["username"], "quest_log_id": ql_id}).json()
+    for i, task in enumerate(sorted(seen_by_member, key=lambda t: t["id"])):
+        hidden = i % 3 == 0 and i % 2 == 0
+        assert (task["title"] == "Solo Adventure") == hidden
+        assert task["co_owners"] == ([member["username"]] if i % 2 else [])
+    client.delete(f"/questlogs/{ql_id}?username={owner['username']}")
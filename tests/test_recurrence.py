@@ -0,0 +1,142 @@
+"""
+tests/test_recurrence.py
+------------------------
+Tests for recurring tasks (backend/recurrence.py):
+  - Occurrences are materialized up to the horizon, once: later passes only add the new
+    ones as the horizon moves.
+  - A Done task is reopened when its next occurrence comes due (To-Do, unlocked, a "To-Do"
+    history row) and rewards its next completion again; a task still in progress is left alone.
+  - After downtime, the missed occurrences collapse into one and the task is reopened once.
+  - repeat_interval is validated (seconds, at least MIN_REPEAT_INTERVAL).
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+from datetime import datetime, timedelta
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Task, TaskHistory, TaskOccurrence
+from backend.db import SessionLocal
+from backend import recurrence
+
+client = TestClient(app)
+
+OWNER = {"identifier": "yuri_recurrence", "password": "password123", "email": "yuri_recurrence@example.com"}
+HOUR = 3600
+
+@pytest.fixture(scope="module")
+def owner():
+    user = client.post("/users/login", json=OWNER).json()["user"]
+    yield user
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture(scope="module")
+def board(owner):
+    ql_id = client.post("/questlogs", json={"name": "Recurring Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    yield ql_id
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+@pytest.fixture
+def session():
+    db = SessionLocal()
+    yield db
+    db.close()
+
+def add_task(board, owner, scheduled_time, repeat_interval):
+    response = client.post("/tasks", json={"title": "Water the mandrakes", "owner_username": owner["username"],
+                                           "quest_log_id": board, "scheduled_time": scheduled_time.isoformat(),
+                                           "repeat_interval": repeat_interval})
+    assert response.status_code == 200, response.text
+    return response.json()["task_id"]
+
+def move(task_id, owner, *statuses):
+    for status in statuses:
+        assert client.put(f"/tasks/{task_id}/status", json={"new_status": status, "username": owner["username"]}).status_code == 200
+
+def occurrences(session, task_id):
+    session.expire_all()
+    return session.query(TaskOccurrence).filter(TaskOccurrence.task_id == task_id).order_by(TaskOccurrence.due_at).all()
+
+def history(session, task_id):
+    return [row.status for row in session.query(TaskHistory).filter(TaskHistory.task_id == task_id).order_by(TaskHistory.id)]
+
+def xp(session, owner):
+    session.expire_all()
+    return session.query(User).filter(User.id == owner["user_id"]).one().xp
+
+def test_materialize_up_to_horizon(owner, board, session):
+    now = datetime.utcnow()
+    start = now + timedelta(hours=1)
+    task_id = add_task(board, owner, start, HOUR)
+    assert session.get(Task, task_id).next_occurrence_at == start
+
+    recurrence.materialize(session, now, horizon_hours=5)
+    assert [o.due_at for o in occurrences(session, task_id)] == [start + timedelta(hours=i) for i in range(5)]
+    assert session.get(Task, task_id).next_occurrence_at == start + timedelta(hours=5)
+    recurrence.materialize(session, now, horizon_hours=5)
+    assert len(occurrences(session, task_id)) == 5, "A second pass adds nothing"
+    recurrence.materialize(session, now + timedelta(hours=2), horizon_hours=5)
+    assert len(occurrences(session, task_id)) == 7, "Only the occurrences the horizon moved over"
+
+def test_due_occurrence_reopens_done_task(owner, board, session):
+    now = datetime.utcnow()
+    done_task = add_task(board, owner, now + timedelta(hours=1), HOUR)
+    busy_task = add_task(board, owner, now + timedelta(hours=1), HOUR)
+    move(done_task, owner, "Doing", "Done")
+    move(busy_task, owner, "Doing")
+    recurrence.materialize(session, now, horizon_hours=3)
+    before = xp(session, owner)
+
+    assert recurrence.open_due(session, now) == 0, "Nothing is due yet"
+    recurrence.open_due(session, now + timedelta(hours=1, seconds=1))
+    task = session.get(Task, done_task)
+    session.refresh(task)
+    assert (task.status.value, task.locked) == ("To-Do", False)
+    assert history(session, done_task) == ["Created", "Doing", "Done", "To-Do"]
+    assert [o.status for o in occurrences(session, done_task)] == ["reopened", "scheduled", "scheduled"]
+    assert session.get(Task, busy_task).status.value == "Doing"
+    assert [o.status for o in occurrences(session, busy_task)] == ["merged", "scheduled", "scheduled"]
+
+    move(done_task, owner, "Doing", "Done")
+    assert xp(session, owner) > before, "Each completion of a recurring task is rewarded"
+
+def test_catch_up_after_downtime(owner, board, session):
+    now = datetime.utcnow()
+    start = now - timedelta(days=30, minutes=1)
+    task_id = add_task(board, owner, start, 24 * HOUR)
+    move(task_id, owner, "Doing", "Done")
+
+    result = recurrence.run_recurrence(session, now)
+    assert result["reopened"] >= 1
+    rows = occurrences(session, task_id)
+    assert (rows[0].due_at, rows[0].missed, rows[0].status) == (start + timedelta(days=30), 30, "reopened")
+    assert all(o.due_at > now and o.status == "scheduled" for o in rows[1:])
+    assert len(rows) == 1 + recurrence.RECURRENCE_HORIZON_HOURS // 24
+    assert history(session, task_id).count("To-Do") == 1
+
+def test_prune_processed_occurrences(owner, board, session):
+    now = datetime.utcnow()
+    task_id = add_task(board, owner, now - timedelta(days=2), 24 * HOUR)
+    recurrence.run_recurrence(session, now)
+    kept = len(occurrences(session, task_id))
+    recurrence.prune_occurrences(session, now + timedelta(days=2), retention_days=1)
+    assert len(occurrences(session, task_id)) == kept - 1, "Only the processed occurrence goes"
+
+def test_repeat_interval_validation(owner, board):
+    payload = {"title": "Too often", "owner_username": owner["username"], "quest_log_id": board}
+    assert client.post("/tasks", json={**payload, "repeat_interval": 10}).status_code == 422
+    task_id = client.post("/tasks", json={**payload, "repeat_interval": 0}).json()["task_id"]
+    session = SessionLocal()
+    task = session.get(Task, task_id)
+    assert (task.repeat_interval, task.next_occurrence_at) == (None, None)
+    session.close()
@@ -0,0 +1,114 @@
+"""
+tests/test_responses.py
+-----------------------
+Tests for fast JSON serialization and response compression:
+  - FastJSONResponse writes datetimes and enums the way FastAPI's default encoder does,
+    with or without orjson.
+  - Board tasks are typed views: the schema is published, and other users' private tasks
+    are masked through the same path.
+  - Large responses are gzip-compressed for clients that accept it; small ones and
+    already-encoded ones are left alone.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import json
+import pytest
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, TaskStatus
+from backend.db import SessionLocal
+from backend import responses, compression
+from backend.responses import FastJSONResponse
+
+client = TestClient(app)
+
+OWNER = {"identifier": "judy_responses", "password": "password123", "email": "judy_responses@example.com"}
+MEMBER = {"identifier": "kim_responses", "password": "password123", "email": "kim_responses@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, MEMBER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture(scope="module")
+def owner(people):
+    return people[0]
+
+PAYLOAD = [{
+    "id": 1, "status": TaskStatus.waiting, "title": "Zürich",
+    "created_at": datetime(2025, 3, 1, 9, 30, 15, 123456), "scheduled_time": None,
+    "history": [{"status": "Created", "timestamp": datetime(2025, 3, 1, 9, 30).isoformat()}],
+}]
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_json_matches_default_encoder(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(responses, "orjson", None)
+    elif responses.orjson is None:
+        pytest.skip("orjson is not installed")
+    body = FastJSONResponse(PAYLOAD).body
+    assert json.loads(body) == jsonable_encoder(PAYLOAD)
+    assert json.loads(body)[0]["status"] == "Waiting"
+
+def test_board_schema_and_masking(people):
+    owner, member = people
+    schema = client.get("/openapi.json").json()["components"]["schemas"]["TaskView"]
+    assert {"title", "owner_username", "co_owners", "comments", "history"} <= set(schema["properties"])
+
+    ql_id = client.post("/questlogs", json={"name": "Masked Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    client.post("/questlogs/invite/accept", json={
+        "token": client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]},
+                             json={"is_permanent": True}).json()["token"],
+        "username": member["username"], "action": "join",
+    })
+    task_id = client.post("/tasks", json={"title": "Secret", "description": "Hidden", "is_private": True,
+                                          "owner_username": owner["username"], "quest_log_id": ql_id}).json()["task_id"]
+    client.post("/tasks/comment", json={"task_id": task_id, "content": "Mine", "username": owner["username"]})
+
+    mine = client.get("/tasks/", params={"viewer_username": owner["username"], "quest_log_id": ql_id}).json()[0]
+    theirs = client.get("/tasks/", params={"viewer_username": member["username"], "quest_log_id": ql_id}).json()[0]
+    assert (mine["title"], len(mine["comments"])) == ("Secret", 1)
+    assert (theirs["title"], theirs["description"], theirs["comments"]) == ("Solo Adventure", "Solo Adventure", [])
+    assert theirs["history"] == mine["history"] and theirs["history"][0]["status"] == "Created"
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def test_large_board_is_gzipped(owner):
+    ql_id = client.post("/questlogs", json={"name": "Compressed Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    for i in range(12):
+        client.post("/tasks", json={"title": f"Compressed task {i}", "description": "Padding " * 10,
+                                    "owner_username": owner["username"], "quest_log_id": ql_id})
+    params = {"viewer_username": owner["username"], "quest_log_id": ql_id}
+
+    compressed = client.get("/tasks/", params=params, headers={"Accept-Encoding": "gzip"})
+    assert compressed.status_code == 200
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert int(compressed.headers["content-length"]) < len(compressed.content)
+    assert len(compressed.json()) == 12
+
+    plain = client.get("/tasks/", params=params, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == compressed.json()
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def test_small_and_precompressed_responses_are_not_recompressed():
+    small = client.get("/server/timezone", headers={"Accept-Encoding": "gzip"})
+    assert len(small.content) < compression.COMPRESS_MIN_SIZE
+    assert "content-encoding" not in small.headers
+
+    changelog = client.get("/other/changelog", headers={"Accept-Encoding": "gzip"})
+    assert changelog.headers["content-encoding"] == "gzip"
+    assert changelog.json().startswith("# Changelog")
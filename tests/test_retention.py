@@ -0,0 +1,141 @@
+"""
+tests/test_retention.py
+-----------------------
+Tests for retention and compaction:
+  - Consecutive duplicate history states are compacted once folded into the rollups.
+  - Finished task histories are archived once both task_flow_daily and user_xp_daily
+    have counted them.
+  - Old and orphaned activities are archived to per-month gzip files and removed.
+  - Deleting a quest log no longer leaves an orphaned "deleted" activity.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import gzip
+import json
+import pytest
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Task, TaskStatus, TaskHistory, QLActivity
+from backend.db import SessionLocal
+from backend import analytics, retention, rollups
+
+client = TestClient(app)
+
+TEST_USER = {"identifier": "frank_retention", "password": "password123", "email": "frank_retention@example.com"}
+
+@pytest.fixture(scope="module")
+def user():
+    user = client.post("/users/login", json=TEST_USER).json()["user"]
+    yield user
+    session = SessionLocal()
+    db_user = session.query(User).filter(User.username == user["username"]).first()
+    if db_user:
+        session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def session():
+    session = SessionLocal()
+    yield session
+    session.close()
+
+def test_compaction_removes_repeated_states(user, session):
+    ql_id = client.post("/questlogs", json={"name": "Compaction Board", "owner_username": user["username"]}).json()["quest_log_id"]
+    task = Task(title="Repeated", owner_id=user["user_id"], status=TaskStatus.doing, quest_log_id=ql_id)
+    session.add(task)
+    session.commit()
+    session.add_all([TaskHistory(task_id=task.id, status=s) for s in ["Created", "Doing", "Doing", "Waiting", "Doing"]])
+    session.commit()
+    rollups.refresh_all(session)
+
+    retention.compact_task_history(session)
+    statuses = [h.status for h in session.query(TaskHistory).filter(TaskHistory.task_id == task.id).order_by(TaskHistory.id)]
+    assert statuses == ["Created", "Doing", "Waiting", "Doing"]
+    client.delete(f"/questlogs/{ql_id}?username={user['username']}")
+
+def test_finished_histories_wait_for_every_rollup(user, session, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+    ql_id = client.post("/questlogs", json={"name": "Archived History Board", "owner_username": user["username"]}).json()["quest_log_id"]
+    task = Task(title="Long Done", owner_id=user["user_id"], status=TaskStatus.done, quest_log_id=ql_id)
+    session.add(task)
+    session.commit()
+    history = [TaskHistory(task_id=task.id, status=s, timestamp=datetime(2020, 3, day))
+               for day, s in [(1, "Created"), (2, "Doing"), (3, "Done")]]
+    session.add_all(history)
+    session.commit()
+    history_ids = [h.id for h in history]
+    rollups.refresh_all(session)
+
+    # task_flow_daily has counted the Done row, user_xp_daily not yet.
+    xp_mark = analytics.get_watermark(session, rollups.USER_XP_WATERMARK)
+    assert analytics.advance_watermark(session, rollups.USER_XP_WATERMARK, xp_mark, history_ids[-1] - 1)
+    session.commit()
+    assert analytics.get_watermark(session, analytics.TASK_FLOW_WATERMARK) >= history_ids[-1]
+    retention.archive_task_history(session)
+    assert session.query(TaskHistory).filter(TaskHistory.task_id == task.id).count() == 3, \
+        "Kept until user_xp_daily has counted it"
+
+    assert analytics.advance_watermark(session, rollups.USER_XP_WATERMARK, history_ids[-1] - 1, xp_mark)
+    session.commit()
+    assert retention.archive_task_history(session) >= 3
+    assert session.query(TaskHistory).filter(TaskHistory.task_id == task.id).count() == 0
+    with gzip.open(tmp_path / "task_history" / "2020-03.jsonl.gz", "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [row["id"] for row in archived if row["task_id"] == task.id] == history_ids
+    client.delete(f"/questlogs/{ql_id}?username={user['username']}")
+
+def test_old_and_orphaned_activities_are_archived(user, session, tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path))
+    ql_id = client.post("/questlogs", json={"name": "Retention Board", "owner_username": user["username"]}).json()["quest_log_id"]
+    old = QLActivity(quest_log_id=ql_id, user_id=user["user_id"], action="joined",
+                     timestamp=datetime(2020, 1, 15), details="ancient")
+    session.add(old)
+    session.commit()
+    old_id = old.id
+
+    # Created first, so it can't take the id of the quest log deleted below.
+    other_ql_id = client.post("/questlogs", json={"name": "Retention Board 2", "owner_username": user["username"]}).json()["quest_log_id"]
+
+    deleted = client.delete(f"/questlogs/{ql_id}?username={user['username']}")
+    assert deleted.status_code == 202
+    assert session.query(QLActivity).filter(QLActivity.quest_log_id == ql_id).count() == 0, \
+        "Deleting a quest log must not leave a dangling activity"
+
+    old_ql_id, ql_id = ql_id, other_ql_id
+    session.add(QLActivity(quest_log_id=ql_id, user_id=user["user_id"], action="joined",
+                           timestamp=datetime(2020, 2, 1), details="ancient"))
+    # Recent activities of the quest log deleted above, left behind (e.g. by an older release).
+    orphan = QLActivity(quest_log_id=old_ql_id, user_id=user["user_id"], action="joined", details="orphaned")
+    session.add(orphan)
+    session.commit()
+    orphan_id = orphan.id
+    rollups.refresh_all(session)
+    unfolded = QLActivity(quest_log_id=old_ql_id, user_id=user["user_id"], action="joined", details="unfolded")
+    session.add(unfolded)
+    session.commit()
+    unfolded_id = unfolded.id
+    retention.archive_activities(session)
+
+    assert session.query(QLActivity).filter(QLActivity.quest_log_id == ql_id, QLActivity.details == "ancient").count() == 0
+    assert session.query(QLActivity).filter(QLActivity.quest_log_id == ql_id, QLActivity.action == "created").count() == 1, \
+        "Recent activity stays in the hot table"
+    with gzip.open(tmp_path / "ql_activities" / "2020-02.jsonl.gz", "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert archived[0]["quest_log_id"] == ql_id and archived[0]["timestamp"].startswith("2020-02-01")
+    assert session.get(QLActivity, old_id) is None
+    session.expire_all()
+    assert session.get(QLActivity, orphan_id) is None, "Activities of a deleted quest log are archived"
+    month = datetime.utcnow().strftime("%Y-%m")
+    with gzip.open(tmp_path / "ql_activities" / f"{month}.jsonl.gz", "rt", encoding="utf-8") as f:
+        assert orphan_id in [json.loads(line)["id"] for line in f]
+    assert session.get(QLActivity, unfolded_id) is not None, "Activities the rollup has not counted yet are kept"
+    session.delete(session.get(QLActivity, unfolded_id))
+    session.commit()
+    client.delete(f"/questlogs/{ql_id}?username={user['username']}")
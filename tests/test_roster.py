@@ -0,0 +1,97 @@
+"""
+tests/test_roster.py
+--------------------
+Tests for quest log rosters and board listings:
+  - The participant roster is one joined query, then served from the roster cache until a
+    membership of that quest log changes (invite accepted, spectator upgraded).
+  - Listing a user's quest logs is a fixed number of queries, owned boards first.
+  - TTLCache expires entries and evicts the least recently used one when full.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User
+from backend.db import SessionLocal
+from backend.cache import TTLCache, MISSING
+
+client = TestClient(app)
+
+OWNER = {"identifier": "olga_roster", "password": "password123", "email": "olga_roster@example.com"}
+GUEST = {"identifier": "pete_roster", "password": "password123", "email": "pete_roster@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, GUEST)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def boards(people):
+    created = []
+    def make(owner, name):
+        ql_id = client.post("/questlogs", json={"name": name, "owner_username": owner["username"]}).json()["quest_log_id"]
+        created.append((ql_id, owner))
+        return ql_id
+    yield make
+    for ql_id, owner in created:
+        client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def join(ql_id, owner, guest, action):
+    token = client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": guest["username"], "action": action})
+
+def roster(ql_id):
+    return {p["username"]: p["role"] for p in client.get(f"/questlogs/{ql_id}/participants").json()}
+
+def test_roster_is_cached_until_membership_changes(people, boards, query_counter):
+    owner, guest = people
+    ql_id = boards(owner, "Roster Board")
+    endpoint = "GET /questlogs/{quest_log_id}/participants"
+
+    assert roster(ql_id) == {owner["username"]: "member"}
+    assert roster(ql_id) == {owner["username"]: "member"}
+    assert query_counter.queries(endpoint) == [1, 0]
+
+    join(ql_id, owner, guest, "spectate")
+    assert roster(ql_id) == {owner["username"]: "member", guest["username"]: "spectator"}
+
+    client.post(f"/questlogs/{ql_id}/upgrade", params={"username": guest["username"]})
+    assert roster(ql_id)[guest["username"]] == "member"
+    assert query_counter.queries(endpoint)[-2:] == [1, 1]
+
+def test_list_quest_logs_joins_owners(people, boards, query_counter):
+    owner, guest = people
+    joined = [boards(owner, f"Shared {i}") for i in range(3)]
+    for ql_id in joined:
+        join(ql_id, owner, guest, "join")
+    own = boards(guest, "Own Board")
+
+    with query_counter.at_most(2):
+        listed = client.get("/questlogs", params={"username": guest["username"]}).json()
+    assert [ql["id"] for ql in listed] == [own] + joined
+    assert [ql["owner_username"] for ql in listed] == [guest["username"]] + [owner["username"]] * 3
+
+def test_ttl_cache_expiry_and_eviction():
+    cache = TTLCache("test_ttl", ttl_seconds=0.05, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    time.sleep(0.06)
+    assert cache.get("a") is MISSING
@@ -0,0 +1,123 @@
+"""
+tests/test_search.py
+--------------------
+Tests for full-text search (/search):
+  - Tasks, comments and stories are found on the viewer's quest logs only; other users'
+    private tasks never match, and mirrored tasks are found on the boards they are shown on.
+  - Title matches rank above description matches; very broad queries come newest first.
+  - The index follows inserts, edits and deletions through its triggers, and a rebuild
+    from the source tables gives the same results.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, Story
+from backend.db import SessionLocal, engine
+from backend import search
+from sqlalchemy import text
+
+client = TestClient(app)
+
+OWNER = {"identifier": "uma_search", "password": "password123", "email": "uma_search@example.com"}
+MEMBER = {"identifier": "vic_search", "password": "password123", "email": "vic_search@example.com"}
+OUTSIDER = {"identifier": "wes_search", "password": "password123", "email": "wes_search@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, MEMBER, OUTSIDER)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture(scope="module")
+def board(people):
+    owner, member, _ = people
+    ql_id = client.post("/questlogs", json={"name": "Search Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    token = client.post(f"/questlogs/{ql_id}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": member["username"], "action": "join"})
+    yield ql_id
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+def add_task(ql_id, owner, title, description="", is_private=False):
+    return client.post("/tasks", json={"title": title, "description": description, "is_private": is_private,
+                                       "owner_username": owner["username"], "quest_log_id": ql_id}).json()["task_id"]
+
+def find(user, q, **params):
+    response = client.get("/search/", params={"username": user["username"], "q": q, **params})
+    assert response.status_code == 200, response.text
+    return response
+
+def hits(user, q, **params):
+    return [(r["kind"], r["task_id"]) for r in find(user, q, **params).json()]
+
+def test_visibility(people, board):
+    owner, member, outsider = people
+    public = add_task(board, owner, "Slay the wyvern", "Bring a long spear")
+    secret = add_task(board, owner, "Secret wyvern plan", is_private=True)
+    client.post("/tasks/comment", json={"task_id": public, "content": "The wyvern sleeps at noon", "username": member["username"]})
+    session = SessionLocal()
+    session.add(Story(task_id=public, owner_id=owner["user_id"], story_text="A wyvern fell", xp=1, currency=1))
+    session.commit()
+    session.close()
+
+    assert sorted(hits(member, "wyvern")) == [("comment", public), ("story", public), ("task", public)]
+    assert ("task", secret) in hits(owner, "wyvern")
+    assert hits(member, "secret") == []
+    assert hits(outsider, "wyvern") == []
+    result = find(member, "spear").json()[0]
+    assert (result["task_title"], result["quest_log_id"], result["snippet"]) == ("Slay the wyvern", board, "Bring a long [spear]")
+
+    other = client.post("/questlogs", json={"name": "Other Search Board", "owner_username": outsider["username"]}).json()["quest_log_id"]
+    add_task(other, outsider, "Wyvern elsewhere")
+    assert hits(member, "elsewhere") == []
+    assert hits(owner, "wyvern", quest_log_id=other) == []
+    client.delete(f"/questlogs/{other}", params={"username": outsider["username"]})
+
+def test_ranking_and_paging(people, board, monkeypatch):
+    owner, member, _ = people
+    in_description = add_task(board, owner, "Feed the animals", "Mind the griffin")
+    in_title = add_task(board, owner, "Griffin grooming")
+    response = find(member, "griff")
+    assert response.headers["x-search-order"] == "relevance"
+    assert hits(member, "griff") == [("task", in_title), ("task", in_description)]
+    assert hits(member, "griff", limit=1, skip=1) == [("task", in_description)]
+
+    monkeypatch.setattr(search, "RANK_LIMIT", 1)
+    response = find(member, "griff")
+    assert response.headers["x-search-order"] == "recent"
+    assert [r["task_id"] for r in response.json()] == [in_title, in_description]
+
+def test_index_follows_writes(people, board):
+    owner, member, _ = people
+    scratch = client.post("/questlogs", json={"name": "Scratch Search Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    task_id = add_task(scratch, owner, "Polish the chalice", "Silver polish")
+    assert hits(owner, "silver") == [("task", task_id)]
+    client.put(f"/tasks/{task_id}/edit", params={"username": owner["username"]}, json={"description": "Golden polish"})
+    assert hits(owner, "silver") == []
+    assert hits(owner, "golden") == [("task", task_id)]
+    assert hits(owner, 'golden" *') == [("task", task_id)], "Query syntax in user input is taken literally"
+    assert hits(owner, '"*') == []
+
+    client.post(f"/tasks/{task_id}/mirrors", json={"quest_log_id": board, "username": owner["username"]})
+    assert hits(member, "chalice", quest_log_id=board) == [("task", task_id)]
+
+    search.rebuild_search_index(engine)
+    assert hits(owner, "golden") == [("task", task_id)]
+    client.delete(f"/questlogs/{scratch}", params={"username": owner["username"]})
+    assert hits(owner, "golden") == []
+    session = SessionLocal()
+    indexed = session.execute(text(f"SELECT rowid FROM {search.SEARCH_TABLE} WHERE rowid = :rowid"), {"rowid": task_id * 4 + 1}).first()
+    session.close()
+    assert indexed is None, "Deleted tasks leave the index"
@@ -0,0 +1,232 @@
+"""
+tests/test_webhooks.py
+----------------------
+Tests for outbound webhooks (backend/webhooks.py):
+  - Only the owner manages a quest log's subscriptions; URLs and event names are validated
+    and secrets are never returned.
+  - Task, comment, invite and membership events are queued with the change and delivered,
+    signed, to a local endpoint; events a subscription did not ask for are not sent.
+  - Failed deliveries are retried with backoff and given up on after MAX_ATTEMPTS or a
+    final 4xx; an endpoint's rate limit holds deliveries back without using an attempt.
+  - Producers do not wait on a dead endpoint.
+  - Endpoints on loopback, private, link-local or reserved addresses are refused when
+    subscribing and again before each delivery.
+All test data is cleaned up after tests.
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import hashlib
+import hmac
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from fastapi.testclient import TestClient
+
+# Ensure project root is in sys.path.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backend.main import app
+from backend.models import User, WebhookDelivery, WebhookSubscription
+from backend.db import SessionLocal
+from backend import webhooks
+
+client = TestClient(app)
+
+OWNER = {"identifier": "wren_webhooks", "password": "password123", "email": "wren_webhooks@example.com"}
+GUEST = {"identifier": "otto_webhooks", "password": "password123", "email": "otto_webhooks@example.com"}
+
+@pytest.fixture(scope="module")
+def people():
+    created = [client.post("/users/login", json=data).json()["user"] for data in (OWNER, GUEST)]
+    yield created
+    session = SessionLocal()
+    for user in created:
+        db_user = session.query(User).filter(User.username == user["username"]).first()
+        if db_user:
+            session.delete(db_user)
+    session.commit()
+    session.close()
+
+@pytest.fixture
+def board(people):
+    owner = people[0]
+    ql_id = client.post("/questlogs", json={"name": "Hooked Board", "owner_username": owner["username"]}).json()["quest_log_id"]
+    yield ql_id
+    client.delete(f"/questlogs/{ql_id}", params={"username": owner["username"]})
+
+@pytest.fixture
+def session():
+    db = SessionLocal()
+    yield db
+    db.close()
+
+@pytest.fixture(autouse=True)
+def dns(monkeypatch):
+    """Fixed answers for the example hosts (the tests run without network); IP addresses resolve as usual."""
+    hosts = {"example.com": ["93.184.215.14"], "intranet.example.com": ["10.0.0.5"]}
+    real = webhooks.resolve_host
+    monkeypatch.setattr(webhooks, "resolve_host", lambda host, port: hosts[host] if host in hosts else real(host, port))
+    return hosts
+
+@pytest.fixture
+def local_targets(monkeypatch):
+    monkeypatch.setattr(webhooks, "ALLOW_PRIVATE_TARGETS", True)
+
+@pytest.fixture
+def endpoint(local_targets):
+    """A local webhook endpoint recording every request; set .status to make it fail."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            server.received.append((dict(self.headers), body))
+            self.send_response(server.status)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    server.received, server.status = [], 200
+    server.url = f"http://127.0.0.1:{server.server_port}/hook"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def subscribe(board, owner, url, **data):
+    response = client.post(f"/questlogs/{board}/webhooks", params={"username": owner["username"]}, json={"url": url, **data})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def deliver(session, now=None, limiter=None):
+    return asyncio.run(webhooks.deliver_pending(session, limiter=limiter or webhooks.RateLimiter(1000, 1000), now=now))
+
+def deliveries(session, subscription):
+    session.expire_all()
+    return session.query(WebhookDelivery).filter(WebhookDelivery.subscription_id == subscription["id"]).order_by(WebhookDelivery.id).all()
+
+def test_only_owner_manages_webhooks(people, board):
+    owner, guest = people
+    url = f"/questlogs/{board}/webhooks"
+    assert client.post(url, params={"username": guest["username"]}, json={"url": "http://example.com"}).status_code == 403
+    assert client.post(url, params={"username": owner["username"]}, json={"url": "ftp://example.com"}).status_code == 400
+    assert client.post(url, params={"username": owner["username"]},
+                       json={"url": "http://example.com", "events": ["task.deleted"]}).status_code == 400
+    hook = subscribe(board, owner, "http://example.com/hook", events=["task.created"], secret="s3cret")
+    listed = client.get(url, params={"username": owner["username"]}).json()
+    assert [(h["id"], h["events"], h["has_secret"]) for h in listed] == [(hook["id"], ["task.created"], True)]
+    assert "secret" not in listed[0]
+    assert client.delete(f"{url}/{hook['id']}", params={"username": guest["username"]}).status_code == 403
+    assert client.delete(f"{url}/{hook['id']}", params={"username": owner["username"]}).status_code == 200
+    assert client.get(url, params={"username": owner["username"]}).json() == []
+
+def test_events_are_delivered_signed(people, board, session, endpoint):
+    owner, guest = people
+    hook = subscribe(board, owner, endpoint.url, secret="s3cret")
+    only_tasks = subscribe(board, owner, endpoint.url, events=["task.created"])
+    task_id = client.post("/tasks", json={"title": "Polish the grail", "owner_username": owner["username"],
+                                          "quest_log_id": board}).json()["task_id"]
+    client.put(f"/tasks/{task_id}/status", json={"new_status": "Doing", "username": owner["username"]})
+    client.post("/tasks/comment", json={"task_id": task_id, "username": owner["username"], "content": "Shiny"})
+    token = client.post(f"/questlogs/{board}/invite", params={"username": owner["username"]}, json={}).json()["token"]
+    client.post("/questlogs/invite/accept", json={"token": token, "username": guest["username"], "action": "join"})
+    assert endpoint.received == [], "Nothing is sent before the worker runs"
+
+    counts = deliver(session)
+    assert counts["sent"] == 6
+    signed = [(h, b) for h, b in endpoint.received if "X-TaskFable-Signature" in h]
+    events = [json.loads(body) for _, body in signed]
+    assert [e["event"] for e in events] == ["task.created", "task.status_changed", "comment.added",
+                                            "invite.generated", "member.joined"]
+    assert events[1]["data"]["status"] == "Doing" and events[1]["data"]["previous_status"] == "To-Do"
+    assert events[2]["data"]["content"] == "Shiny"
+    assert events[4]["data"] == {"username": guest["username"], "role": "member"}
+    assert token not in json.dumps(events), "Invite tokens are never sent"
+    headers, body = signed[0]
+    assert headers["X-TaskFable-Signature"] == "sha256=" + hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+    assert headers["X-TaskFable-Event"] == "task.created"
+    unsigned = [json.loads(body)["event"] for h, body in endpoint.received if "X-TaskFable-Signature" not in h]
+    assert unsigned == ["task.created"]
+    assert [d.status for d in deliveries(session, hook)] == ["sent"] * 5
+    assert len(deliveries(session, only_tasks)) == 1
+
+def test_retries_with_backoff(people, board, session, endpoint):
+    owner, _ = people
+    hook = subscribe(board, owner, endpoint.url)
+    client.post("/tasks", json={"title": "Flaky", "owner_username": owner["username"], "quest_log_id": board})
+    now = datetime.utcnow()
+    endpoint.status = 503
+    assert deliver(session, now)["retry"] == 1
+    assert deliver(session, now)["retry"] == 0, "A failed delivery waits for its retry"
+    row = deliveries(session, hook)[0]
+    assert (row.status, row.attempts, row.response_status) == ("pending", 1, 503)
+    assert row.next_attempt_at >= now + timedelta(seconds=webhooks.RETRY_BASE_SECONDS)
+
+    endpoint.status = 200
+    assert deliver(session, now + timedelta(hours=1))["sent"] == 1
+    row = deliveries(session, hook)[0]
+    assert (row.status, row.attempts) == ("sent", 2)
+    assert len(endpoint.received) == 2
+
+def test_gives_up(people, board, session, endpoint):
+    owner, _ = people
+    hook = subscribe(board, owner, endpoint.url)
+    client.post("/tasks", json={"title": "Doomed", "owner_username": owner["username"], "quest_log_id": board})
+    endpoint.status = 500
+    now = datetime.utcnow()
+    for attempt in range(webhooks.MAX_ATTEMPTS):
+        deliver(session, now + timedelta(days=attempt))
+    assert [(d.status, d.attempts) for d in deliveries(session, hook)] == [("failed", webhooks.MAX_ATTEMPTS)]
+
+    endpoint.status = 410
+    client.post("/tasks", json={"title": "Gone", "owner_username": owner["username"], "quest_log_id": board})
+    assert deliver(session, now + timedelta(days=30))["failed"] == 1, "Other 4xx answers are final"
+
+def test_rate_limit_defers_without_attempts(people, board, session, endpoint):
+    owner, _ = people
+    hook = subscribe(board, owner, endpoint.url)
+    for i in range(5):
+        client.post("/tasks", json={"title": f"Burst {i}", "owner_username": owner["username"], "quest_log_id": board})
+    counts = deliver(session, limiter=webhooks.RateLimiter(rate=1, burst=2))
+    assert (counts["sent"], counts["deferred"]) == (2, 3)
+    assert sorted(d.attempts for d in deliveries(session, hook)) == [0, 0, 0, 1, 1]
+
+    limiter = webhooks.RateLimiter(rate=2, burst=1)
+    assert limiter.acquire("a", now=0) == 0
+    assert limiter.acquire("a", now=0) == pytest.approx(0.5)
+    assert limiter.acquire("b", now=0) == 0, "Endpoints are limited separately"
+    assert limiter.acquire("a", now=0.5) == 0
+
+def test_producers_do_not_wait_on_endpoints(people, board, session, local_targets):
+    owner, _ = people
+    # Nothing listens there: every delivery would fail or time out.
+    subscribe(board, owner, "http://10.255.255.1:9/hook")
+    start = time.perf_counter()
+    for i in range(20):
+        assert client.post("/tasks", json={"title": f"Quick {i}", "owner_username": owner["username"],
+                                           "quest_log_id": board}).status_code == 200
+    assert time.perf_counter() - start < 5
+    queued = session.query(WebhookDelivery).join(WebhookSubscription).filter(WebhookSubscription.quest_log_id == board).count()
+    assert queued == 20
+
+def test_private_targets_are_refused(people, board, session, dns):
+    owner, _ = people
+    url = f"/questlogs/{board}/webhooks"
+    for target in ["http://127.0.0.1:8000/users", "http://169.254.169.254/latest/meta-data/", "http://10.1.2.3/hook",
+                   "http://[::1]/hook", "http://0.0.0.0/hook", "http://intranet.example.com/hook", "http://nowhere.invalid/hook"]:
+        response = client.post(url, params={"username": owner["username"]}, json={"url": target})
+        assert response.status_code == 400, target
+
+    # The host moves to a private address after subscribing: the delivery is refused, not sent.
+    dns["hooks.example.com"] = ["93.184.215.14"]
+    hook = subscribe(board, owner, "http://hooks.example.com/hook")
+    dns["hooks.example.com"] = ["127.0.0.1"]
+    client.post("/tasks", json={"title": "Rebound", "owner_username": owner["username"], "quest_log_id": board})
+    counts = deliver(session)
+    assert (counts["sent"], counts["failed"]) == (0, 1)
+    row = deliveries(session, hook)[0]
+    assert row.status == "failed" and "non-public address" in row.error